@@ -8,6 +8,7 @@ from telegram.ext import (
     ConversationHandler,
     PicklePersistence,
     CallbackQueryHandler,
+    TypeHandler,
 )
 from dotenv import load_dotenv
 from utils import (
@@ -26,6 +27,11 @@ from utils import (
     submissions,
     status,
     ai_moderator,
+    conversation_log,
+    edit_scheduler,
+    firebase_db,
+    http_clients,
+    metrics,
 )
 from utils.aggregator_service.aggregator import Aggregator
 from utils.aggregator_service.cleaner import cleanup_task
@@ -45,6 +51,14 @@ if not API_KEY:
     raise ValueError("API_KEY not found in environment variables")
 
 
+async def start_services(application: Application):
+    """Warms in-process caches and HTTP pools, then starts background services."""
+    await http_clients.start()
+    await asyncio.to_thread(firebase_db.start_admin_listener)
+    await asyncio.to_thread(firebase_db.load_audience)
+    await start_aggregator_task(application)
+
+
 async def start_aggregator_task(application: Application):
     """Starts the Mimi Aggregator service in the background."""
     if TELEGRAM_API_ID and TELEGRAM_API_HASH:
@@ -71,15 +85,24 @@ async def start_aggregator_task(application: Application):
         print("⚠️ Aggregator skipped: Missing TELEGRAM_API_ID/HASH")
 
 
+async def shutdown_services(application: Application):
+    """Flushes write-behind buffers before the process exits."""
+    print(f"💾 Flushing {conversation_log.queue_depth()} queued chat messages...")
+    await asyncio.to_thread(conversation_log.shutdown)
+    firebase_db.stop_admin_listener()
+    await asyncio.to_thread(firebase_db.release_post_ids)
+    await edit_scheduler.stop()
+    await http_clients.close()
+
+
 persistence = PicklePersistence(filepath="bot_persistence.pickle")
 app = (
     Application.builder()
     .token(API_KEY)
     .persistence(persistence)
-    .post_init(start_aggregator_task)
-    .read_timeout(100)
-    .write_timeout(100)
-    .connect_timeout(60)
+    .post_init(start_services)
+    .post_shutdown(shutdown_services)
+    .request(http_clients.telegram_request(read_timeout=100, write_timeout=100, connect_timeout=60))
     .build()
 )
 
@@ -98,7 +121,13 @@ async def debug_message_handler(update: Update, context: ContextTypes.DEFAULT_TY
         )
 
 
+async def tag_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Labels this update's storage calls in utils/metrics (/dbstats)."""
+    metrics.set_handler(metrics.handler_name_for(update))
+
+
 # --- Command Handlers ---
+app.add_handler(TypeHandler(Update, tag_handler), group=-2)
 app.add_handler(
     MessageHandler(filters.ALL, debug_message_handler), group=-1
 )  # Run before others
@@ -138,6 +167,11 @@ app.add_handler(
 app.add_handler(CommandHandler("announce", announcer.announce))
 app.add_handler(CommandHandler("addadmin", admin_manager.add_admin))
 app.add_handler(CommandHandler("removeadmin", admin_manager.remove_admin))
+app.add_handler(CommandHandler("dbstats", admin_manager.db_stats))
+app.add_handler(CommandHandler("reloadprompts", admin_manager.reload_prompts))
+app.add_handler(CommandHandler("cachestats", admin_manager.cache_stats))
+app.add_handler(CommandHandler("llmstats", admin_manager.llm_stats))
+app.add_handler(CommandHandler("answercache", admin_manager.answer_cache_admin))
 app.add_handler(CommandHandler("sync", sync_cmd.sync))
 app.add_handler(CommandHandler("news", news_browser.news_command))
 app.add_handler(CommandHandler("reply", submissions.reply_command_handler))
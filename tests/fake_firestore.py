@@ -0,0 +1,232 @@
+"""
+Minimal in-memory stand-in for the google.cloud.firestore Client.
+
+Only the calls used by utils/firebase_db.py are implemented. Every document
+returned by get()/stream() is counted in `reads`, and every committed
+set/update/delete in `writes`, so tests can compare the Firestore bill of
+different code paths.
+"""
+
+import copy
+import uuid
+
+from google.api_core import exceptions as google_exceptions
+from google.cloud import firestore
+
+
+def _resolve(current, value):
+    if isinstance(value, firestore.Increment):
+        return (current or 0) + value.value
+    return copy.deepcopy(value)
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data, update_time=None):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self.update_time = update_time  # a write counter, standing in for the timestamp
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocRef:
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeQuery(self._store, self.path + (name,))
+
+    def get(self, transaction=None):
+        self._store.reads += 1
+        return FakeSnapshot(
+            self,
+            copy.deepcopy(self._store.docs.get(self.path)),
+            self._store.versions.get(self.path),
+        )
+
+    def set(self, data, merge=False):
+        self._store.writes += 1
+        self._apply_set(data, merge)
+
+    def update(self, data, option=None):
+        if option is not None and option != self._store.versions.get(self.path):
+            raise google_exceptions.FailedPrecondition("update_time changed")
+        self._store.writes += 1
+        self._apply_set(data, merge=True)
+
+    def create(self, data):
+        if self.path in self._store.docs:
+            raise google_exceptions.AlreadyExists("document exists")
+        self._store.writes += 1
+        self._apply_set(data, merge=False)
+
+    def delete(self):
+        self._store.writes += 1
+        self._store.docs.pop(self.path, None)
+        self._store.versions.pop(self.path, None)
+
+    def _apply_set(self, data, merge):
+        current = dict(self._store.docs.get(self.path) or {}) if merge else {}
+        for key, value in data.items():
+            if value is firestore.DELETE_FIELD:
+                current.pop(key, None)
+            else:
+                current[key] = _resolve(current.get(key), value)
+        self._store.docs[self.path] = current
+        self._store.versions[self.path] = self._store.versions.get(self.path, 0) + 1
+
+
+class FakeAggregation:
+    def __init__(self, query):
+        self._query = query
+
+    def get(self):
+        self._query._store.reads += 1
+        value = len(self._query._matches())
+
+        class _Result:
+            pass
+
+        result = _Result()
+        result.value = value
+        return [[result]]
+
+
+class FakeQuery:
+    def __init__(self, store, path, filters=(), order=None, limit=None, select=None):
+        self._store = store
+        self.path = path
+        self._filters = filters
+        self._order = order
+        self._limit = limit
+        self._select = select
+
+    def _copy(self, **changes):
+        params = dict(
+            filters=self._filters,
+            order=self._order,
+            limit=self._limit,
+            select=self._select,
+        )
+        params.update(changes)
+        return FakeQuery(self._store, self.path, **params)
+
+    def document(self, doc_id=None):
+        return FakeDocRef(self._store, self.path + (doc_id or uuid.uuid4().hex[:20],))
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(order=(field, direction))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, fields):
+        return self._copy(select=list(fields))
+
+    def count(self):
+        return FakeAggregation(self)
+
+    def _matches(self):
+        depth = len(self.path) + 1
+        rows = [
+            (path, data)
+            for path, data in self._store.docs.items()
+            if len(path) == depth and path[:-1] == self.path
+        ]
+        for field, op, value in self._filters:
+            if op == "==":
+                rows = [r for r in rows if r[1].get(field) == value]
+            elif op == "in":
+                rows = [r for r in rows if r[1].get(field) in value]
+            elif op == "!=":
+                rows = [r for r in rows if r[1].get(field) != value]
+            elif op == "<=":
+                rows = [r for r in rows if r[1].get(field) is not None and r[1][field] <= value]
+            elif op == "<":
+                rows = [r for r in rows if r[1].get(field) is not None and r[1][field] < value]
+        if self._order:
+            field, direction = self._order
+            rows.sort(
+                key=lambda r: r[1].get(field),
+                reverse=str(direction).upper().endswith("DESCENDING"),
+            )
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        return rows
+
+    def stream(self):
+        rows = self._matches()
+        self._store.reads += len(rows)
+        for path, data in rows:
+            if self._select is not None:
+                data = {k: v for k, v in data.items() if k in self._select}
+            yield FakeSnapshot(FakeDocRef(self._store, path), copy.deepcopy(data))
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self._store = store
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(("set", ref, data, merge))
+
+    def update(self, ref, data):
+        self._ops.append(("set", ref, data, True))
+
+    def delete(self, ref):
+        self._ops.append(("delete", ref, None, None))
+
+    def commit(self):
+        self._store.commits += 1
+        for op, ref, data, merge in self._ops:
+            if op == "set":
+                ref.set(data, merge=merge)
+            else:
+                ref.delete()
+        self._ops = []
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.versions = {}  # {path: write count}, the fake's update_time
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    def collection(self, name):
+        return FakeQuery(self, (name,))
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def write_option(self, last_update_time):
+        return last_update_time
+
+    def reset_counters(self):
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
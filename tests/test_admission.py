@@ -0,0 +1,187 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import admission
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    admission._active = 0
+    admission._queue.clear()
+    admission._virtual = 0.0
+    admission._user_tags.clear()
+    admission._chat_tags.clear()
+    for key in admission.stats:
+        admission.stats[key] = 0
+    with patch.object(admission, "MAX_ACTIVE", 1):
+        yield
+
+
+async def _hold(release, user_id=0, chat_id=0, priority="direct"):
+    async with admission.slot(user_id, chat_id, priority):
+        await release.wait()
+
+
+async def _run_in_order(requests):
+    """Fills the only slot, queues `requests`, then returns their run order."""
+    order = []
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(release))
+    await asyncio.sleep(0)
+
+    async def one(name, user_id, chat_id, priority):
+        try:
+            async with admission.slot(user_id, chat_id, priority):
+                order.append(name)
+        except admission.Rejected:
+            order.append(f"{name}:shed")
+
+    tasks = []
+    for req in requests:
+        tasks.append(asyncio.create_task(one(*req)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+class TestOrdering:
+    def test_mentions_and_dms_go_before_interjections(self):
+        order = asyncio.run(_run_in_order([
+            ("jump-in", 1, -10, "interjection"),
+            ("mention", 2, -10, "mention"),
+            ("dm", 3, 3, "direct"),
+        ]))
+        assert order == ["mention", "dm", "jump-in"]
+
+    def test_fair_across_users_in_a_chat(self):
+        # User 1 fires three questions before user 2 asks one
+        order = asyncio.run(_run_in_order([
+            ("u1-a", 1, 1, "direct"),
+            ("u1-b", 1, 1, "direct"),
+            ("u1-c", 1, 1, "direct"),
+            ("u2-a", 2, 2, "direct"),
+        ]))
+        assert order.index("u2-a") < order.index("u1-b")
+
+    def test_one_busy_group_does_not_starve_a_dm(self):
+        order = asyncio.run(_run_in_order(
+            [(f"g{i}", 100 + i, -500, "mention") for i in range(4)] + [("dm", 7, 7, "direct")]
+        ))
+        assert order.index("dm") <= 1
+
+
+class TestPriority:
+    def test_uses_the_trigger_flags(self):
+        assert admission.priority_for("private") == "direct"
+        assert admission.priority_for("group", is_mention=True) == "mention"
+        assert admission.priority_for("supergroup", is_reply_to_bot=True) == "mention"
+        assert admission.priority_for("group") == "interjection"
+
+
+class TestShedding:
+    def test_interjections_are_shed_when_saturated(self):
+        async def scenario():
+            release = asyncio.Event()
+            holder = asyncio.create_task(_hold(release))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(_hold(release, 2, 2, "direct"))
+            await asyncio.sleep(0)
+            with pytest.raises(admission.Rejected):
+                async with admission.slot(3, -1, "interjection"):
+                    pass
+            release.set()
+            await asyncio.gather(holder, waiter)
+
+        asyncio.run(scenario())
+        assert admission.stats["shed"] == 1
+
+    def test_full_queue_evicts_interjection_for_a_mention(self):
+        with patch.object(admission, "MAX_QUEUE", 1):
+            order = asyncio.run(_run_in_order([
+                ("jump-in", 1, -10, "interjection"),
+                ("mention", 2, -10, "mention"),
+            ]))
+        assert order == ["jump-in:shed", "mention"]
+
+    def test_interjection_wait_is_short(self):
+        async def scenario():
+            release = asyncio.Event()
+            holder = asyncio.create_task(_hold(release))
+            await asyncio.sleep(0)
+            with pytest.raises(admission.Rejected):
+                async with admission.slot(3, -1, "interjection"):
+                    pass
+            release.set()
+            await holder
+
+        with patch.object(admission, "INTERJECTION_MAX_WAIT", 0.05):
+            asyncio.run(scenario())
+        assert admission._active == 0 and not admission._queue
+
+
+class TestPositions:
+    def test_position_updates_while_waiting(self):
+        seen = {"a": [], "b": []}
+
+        async def scenario():
+            release = asyncio.Event()
+            holder = asyncio.create_task(_hold(release))
+            await asyncio.sleep(0)
+
+            async def wait(name, user_id):
+                async with admission.slot(user_id, user_id, "direct", seen[name].append):
+                    await asyncio.sleep(0.01)
+
+            a = asyncio.create_task(wait("a", 1))
+            await asyncio.sleep(0)
+            b = asyncio.create_task(wait("b", 2))
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(holder, a, b)
+
+        asyncio.run(scenario())
+        assert seen["a"] == [1]
+        assert seen["b"] == [2, 1]
+
+    def test_cancelled_waiter_leaves_queue(self):
+        async def scenario():
+            release = asyncio.Event()
+            holder = asyncio.create_task(_hold(release))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(_hold(release, 2, 2))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0.01)
+            assert not admission._queue
+            release.set()
+            await holder
+
+        asyncio.run(scenario())
+        assert admission._active == 0
+
+    def test_requests_that_never_run_are_not_charged(self):
+        async def scenario():
+            release = asyncio.Event()
+            holder = asyncio.create_task(_hold(release))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(_hold(release, 2, 2))
+            await asyncio.sleep(0)
+            assert 2 in admission._user_tags
+            waiter.cancel()
+            await asyncio.sleep(0.01)
+            with patch.object(admission, "QUEUE_TIMEOUT", 0.01), pytest.raises(admission.Rejected):
+                async with admission.slot(3, 3, "direct"):
+                    pass
+            release.set()
+            await holder
+
+        asyncio.run(scenario())
+        assert 2 not in admission._user_tags and 3 not in admission._user_tags
+        assert 2 not in admission._chat_tags and 3 not in admission._chat_tags
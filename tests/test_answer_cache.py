@@ -0,0 +1,112 @@
+import math
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import answer_cache
+
+# Toy embeddings: questions about the same topic point the same way
+TOPICS = {
+    "henderson": [1.0, 0.0, 0.0],
+    "kirchhoff": [0.0, 1.0, 0.0],
+}
+
+
+def fake_embed(text):
+    for word, vector in TOPICS.items():
+        if word in text:
+            wobble = (len(text) % 5) * 0.01  # near-duplicates aren't identical
+            v = [x + wobble for x in vector]
+            norm = math.sqrt(sum(x * x for x in v))
+            return [x / norm for x in v]
+    return None
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    answer_cache.clear()
+    for key in answer_cache.stats:
+        answer_cache.stats[key] = 0
+    with patch.object(answer_cache, "_embed", fake_embed):
+        yield
+    answer_cache.clear()
+
+
+def _update(text, photo=None, reply=None):
+    message = SimpleNamespace(text=text, photo=photo, document=None, reply_to_message=reply)
+    return SimpleNamespace(effective_message=message)
+
+
+class TestKeys:
+    def test_normalize(self):
+        assert answer_cache.normalize("  How do I use @MimiBot Henderson-Hasselbalch?? ") == (
+            "how do i use henderson-hasselbalch"
+        )
+
+    def test_only_plain_standalone_questions(self):
+        q = "How do I use Henderson-Hasselbalch?"
+        assert answer_cache.question_for(_update(q), q) == "how do i use henderson-hasselbalch"
+        assert answer_cache.question_for(_update(q, photo=[1]), q) is None
+        assert answer_cache.question_for(_update(q, reply=object()), q) is None
+        assert answer_cache.question_for(_update(q), "The user shared a PDF...") is None
+        assert answer_cache.question_for(_update("hi"), "hi") is None
+
+
+class TestLookup:
+    def test_similar_question_hits_in_same_scope_only(self):
+        scope = answer_cache.scope_for("private", 4)
+        answer, vector = answer_cache.lookup(scope, "how do i use henderson-hasselbalch")
+        assert answer is None and vector is not None
+        answer_cache.store(scope, "how do i use henderson-hasselbalch", vector,
+                           "Sure Ali! pH = pKa + log([A-]/[HA])", asker_name="Ali")
+
+        answer, _ = answer_cache.lookup(scope, "henderson equation how to use it")
+        assert answer_cache.personalize(answer, "Siti") == "Sure Siti! pH = pKa + log([A-]/[HA])"
+        assert answer_cache.lookup(answer_cache.scope_for("group", 4), "henderson equation")[0] is None
+        assert answer_cache.lookup(answer_cache.scope_for("private", 5), "henderson equation")[0] is None
+        assert answer_cache.lookup(scope, "kirchhoff loop rule")[0] is None
+
+    def test_name_placeholder_matches_whole_words_only(self):
+        scope = "private:w4"
+        _, vector = answer_cache.lookup(scope, "henderson ionic strength question")
+        answer_cache.store(scope, "henderson ionic strength question", vector,
+                           "Ion, ionic strength matters. Ionic species too, Ion!", asker_name="Ion")
+        answer, _ = answer_cache.lookup(scope, "henderson ionic strength question")
+        assert answer_cache.personalize(answer, "Siti") == (
+            "Siti, ionic strength matters. Ionic species too, Siti!"
+        )
+
+    def test_exact_hit_skips_embedding(self):
+        scope = "private:w4"
+        _, vector = answer_cache.lookup(scope, "kirchhoff loop rule")
+        answer_cache.store(scope, "kirchhoff loop rule", vector, "Sum of EMFs = sum of IR")
+        with patch.object(answer_cache, "_embed", lambda text: pytest.fail("embedded")):
+            assert answer_cache.lookup(scope, "kirchhoff loop rule")[0] == "Sum of EMFs = sum of IR"
+        assert answer_cache.get_stats()["exact_hits"] == 1
+
+    def test_ttl_expiry(self):
+        _, vector = answer_cache.lookup("private:w4", "henderson question")
+        with patch.object(answer_cache, "TTL", -1):
+            answer_cache.store("private:w4", "henderson question", vector, "old answer")
+        assert answer_cache.lookup("private:w4", "henderson question again")[0] is None
+        assert answer_cache.get_stats()["expired"] == 1
+
+
+class TestInvalidation:
+    def test_forget_and_clear(self):
+        for scope in ("private:w4", "group:w4"):
+            _, vector = answer_cache.lookup(scope, "henderson question")
+            answer_cache.store(scope, "henderson question", vector, "a")
+        _, vector = answer_cache.lookup("private:w4", "kirchhoff question")
+        answer_cache.store("private:w4", "kirchhoff question", vector, "b")
+
+        assert answer_cache.forget("Henderson thing?") == 2
+        assert answer_cache.clear() == 1
+        stats = answer_cache.get_stats()
+        assert stats["entries"] == 0 and stats["invalidated"] == 3
+        assert "hit rate" in answer_cache.format_stats()
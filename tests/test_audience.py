@@ -0,0 +1,75 @@
+import datetime
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import audience
+from utils.storage.sqlite_backend import SQLiteBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    store = SQLiteBackend(str(tmp_path / "mimi.db"))
+    audience._members.clear()
+    audience._touched_at.clear()
+    with patch.object(audience, "_backend", lambda: store), patch.object(
+        audience, "_loaded_at", None
+    ), patch.object(audience, "PAGE_SIZE", 3):
+        yield store
+
+
+def _seed_users(store, n):
+    for i in range(n):
+        store.merge_user(
+            1000 + i,
+            {
+                "name": f"user {i}",
+                "debate_state": {"topic": "x" * 200},
+                "last_active": datetime.datetime(2025, 1, 1, 0, i),
+            },
+        )
+
+
+class TestAudienceIndex:
+    def test_first_load_builds_index_from_users(self, backend):
+        _seed_users(backend, 8)
+        assert audience.load() == 8
+        # Persisted, so the next load pages the compact index instead
+        assert len(backend.audience_page(100)) == 8
+        assert sorted(audience.all_ids()) == [str(1000 + i) for i in range(8)]
+
+    def test_reads_come_from_memory_while_fresh(self, backend):
+        _seed_users(backend, 4)
+        audience.load()
+        with patch.object(backend, "audience_page", side_effect=AssertionError):
+            assert len(audience.all_ids()) == 4
+            picks = audience.sample(5, exclude=1000)
+        assert "1000" not in picks and len(picks) == 3
+
+    def test_stale_copy_is_reloaded(self, backend):
+        _seed_users(backend, 2)
+        audience.load()
+        backend.put_audience([("9999", None)])
+        with patch.object(audience, "REFRESH_TTL", -1):
+            assert "9999" in audience.all_ids()
+
+    def test_touch_writes_new_users_and_throttles_known_ones(self, backend):
+        audience.load()
+        now = datetime.datetime.now()
+        audience.touch(42, now)
+        assert backend.audience_page(10) == [("42", now)]
+
+        later = now + datetime.timedelta(minutes=5)
+        audience.touch(42, later)
+        assert backend.audience_page(10) == [("42", now)]  # within TOUCH_INTERVAL
+        with patch.object(audience, "TOUCH_INTERVAL", 0):
+            audience.touch(42, later)
+        assert backend.audience_page(10) == [("42", later)]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
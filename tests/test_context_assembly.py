@@ -0,0 +1,59 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import context_assembly
+from utils.context_assembly import Source
+
+
+async def _after(seconds, value):
+    await asyncio.sleep(seconds)
+    return value
+
+
+async def _boom():
+    raise RuntimeError("embedding API down")
+
+
+class TestGather:
+    def test_sources_run_concurrently(self):
+        start = time.perf_counter()
+        values, timings = asyncio.run(
+            context_assembly.gather(
+                Source("prompt", _after(0.1, "P")),
+                Source("history", _after(0.1, ["h"]), deadline=1, default=[]),
+                Source("session", _after(0.1, "S")),
+            )
+        )
+        assert time.perf_counter() - start < 0.25
+        assert values == {"prompt": "P", "history": ["h"], "session": "S"}
+        assert all(t["status"] == "ok" for t in timings.values())
+
+    def test_slow_optional_source_is_skipped(self):
+        start = time.perf_counter()
+        values, timings = asyncio.run(
+            context_assembly.gather(
+                Source("prompt", _after(0.01, "P")),
+                Source("reminiscence", _after(5, "late"), deadline=0.05, default=""),
+            )
+        )
+        assert time.perf_counter() - start < 1
+        assert values["reminiscence"] == ""
+        assert timings["reminiscence"]["status"] == "timeout"
+        assert "reminiscence=" in context_assembly.format_timings(timings)
+        assert "(timeout)" in context_assembly.format_timings(timings)
+
+    def test_optional_errors_fall_back_required_errors_raise(self):
+        values, timings = asyncio.run(
+            context_assembly.gather(Source("reminiscence", _boom(), deadline=1, default=""))
+        )
+        assert values["reminiscence"] == ""
+        assert timings["reminiscence"]["status"] == "error"
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(context_assembly.gather(Source("session", _boom())))
@@ -0,0 +1,71 @@
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import context_window
+
+
+def _history(n, words=50):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"msg{i} " + "word " * words}
+        for i in range(n)
+    ]
+
+
+class TestEstimate:
+    def test_ascii_and_cjk(self):
+        assert context_window.estimate_tokens("") == 0
+        assert context_window.estimate_tokens("a" * 100) == 30
+        assert context_window.estimate_tokens("好" * 100) == 60
+
+    def test_clip_marks_truncation(self):
+        text = "x" * 10000
+        clipped = context_window.clip(text, 500)
+        assert "truncated" in clipped
+        assert context_window.estimate_tokens(clipped) < 520
+        assert context_window.clip("short", 500) == "short"
+
+
+class TestBuild:
+    def test_within_budget_is_untouched(self):
+        history = _history(4)
+        turn = [{"role": "user", "content": "hi"}]
+        messages, b = context_window.build("sys", history, turn, "deepseek-chat")
+        assert messages == [{"role": "system", "content": "sys"}, *history, *turn]
+        assert b["history_kept"] == 4 and b["clipped"] == 0
+        assert b["total"] <= b["budget"]
+
+    def test_oldest_history_goes_first(self):
+        history = _history(20, words=400)
+        turn = [{"role": "user", "content": "latest question"}]
+        with patch.dict(context_window.MODEL_BUDGETS, {"deepseek-chat": 2000}):
+            messages, b = context_window.build("sys", history, turn, "deepseek-chat")
+        assert b["total"] <= 2000
+        assert messages[-1] == turn[0]
+        assert messages[-2]["content"] == history[-1]["content"]  # newest kept whole
+        assert all("msg0 " not in m["content"] for m in messages)
+        assert b["history_kept"] < 20
+        assert history[0]["content"].startswith("msg0 word")  # caller's list untouched
+
+    def test_tool_results_clipped_before_user_message(self):
+        user = {"role": "user", "content": "question " * 1000}
+        turn = [
+            user,
+            {"role": "assistant", "content": None, "tool_calls": [
+                {"id": "1", "type": "function", "function": {"name": "web_fetch", "arguments": "{}"}}
+            ]},
+            {"role": "tool", "tool_call_id": "1", "name": "web_fetch", "content": "page " * 8000},
+        ]
+        with patch.dict(context_window.MODEL_BUDGETS, {"deepseek-reasoner": 4000}):
+            messages, b = context_window.build("sys", [], turn, "deepseek-reasoner")
+        assert b["total"] <= 4000
+        assert messages[1] == user
+        assert "truncated" in messages[3]["content"]
+        assert messages[2]["tool_calls"] == turn[1]["tool_calls"]
+
+    def test_breakdown_format(self):
+        _, b = context_window.build("sys", _history(2), [{"role": "user", "content": "q"}], "other")
+        line = context_window.format_breakdown(b)
+        assert line.startswith("other: system") and "2/2 msgs" in line
@@ -0,0 +1,291 @@
+import datetime
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.fake_firestore import FakeFirestore
+
+
+@pytest.fixture
+def fake_db():
+    from utils import firebase_db, conversation_log, history_cache
+    from utils.storage.firestore_backend import FirestoreBackend
+
+    # The fake store isn't thread-safe and the tests count commits, so no
+    # background flusher may run: stop one left over from an earlier test
+    # and keep enqueue() from starting another. Only explicit flush() writes.
+    _stop_flusher(conversation_log)
+    _clear_queues(conversation_log)
+    fake = FakeFirestore()
+    with patch.object(firebase_db, "backend", FirestoreBackend(client=fake)), patch.object(
+        conversation_log, "_ensure_flusher", lambda: None
+    ):
+        yield fake
+    _clear_queues(conversation_log)
+    history_cache.clear()
+
+
+def _clear_queues(conversation_log):
+    for state in ("_pending", "_inflight", "_discarded", "_retries", "_parked"):
+        getattr(conversation_log, state).clear()
+
+
+def _stop_flusher(conversation_log):
+    if conversation_log._flusher is None:
+        return
+    conversation_log._stopping = True
+    conversation_log._wakeup.set()
+    conversation_log._flusher.join()
+    conversation_log._flusher = None
+    conversation_log._stopping = False
+
+
+def _seed_chat(chat_id, count):
+    """Logs `count` messages through the normal write path and flushes them."""
+    from utils import firebase_db, conversation_log
+
+    for i in range(count):
+        firebase_db.log_conversation(111, "user", f"message {i}", chat_id=chat_id)
+    conversation_log.flush()
+
+
+def _legacy_prune_reads(fake, chat_id):
+    """Reads spent by the old prune_conversation: streaming the whole history to count it."""
+    fake.reset_counters()
+    conv_ref = fake.collection("chats").document(str(chat_id)).collection("messages")
+    len(list(conv_ref.stream()))
+    return fake.reads
+
+
+class TestMessageCounter:
+    def test_flush_keeps_counter_in_sync(self, fake_db):
+        _seed_chat(-100, 7)
+        chat = fake_db.collection("chats").document("-100").get().to_dict()
+        assert chat["message_count"] == 7
+        assert fake_db.commits == 1
+
+    def test_prune_deletes_oldest_in_one_batch(self, fake_db):
+        from utils import firebase_db
+
+        _seed_chat(-200, 60)
+        fake_db.reset_counters()
+        firebase_db.prune_conversation(111, chat_id=-200, max_messages=50, delete_count=25)
+
+        conv_ref = fake_db.collection("chats").document("-200").collection("messages")
+        remaining = [d.to_dict()["content"] for d in conv_ref.order_by("timestamp").stream()]
+        assert len(remaining) == 35
+        assert remaining[0] == "message 25"
+        assert fake_db.collection("chats").document("-200").get().to_dict()["message_count"] == 35
+        assert fake_db.commits == 1
+
+    def test_legacy_chat_is_counted_once(self, fake_db):
+        from utils import firebase_db
+
+        conv_ref = fake_db.collection("chats").document("-300").collection("messages")
+        for i in range(10):
+            conv_ref.add({"content": str(i), "timestamp": datetime.datetime.now()})
+
+        firebase_db.prune_conversation(111, chat_id=-300)
+        fake_db.reset_counters()
+        firebase_db.prune_conversation(111, chat_id=-300)
+        assert fake_db.reads == 1
+
+    def test_legacy_chat_logged_to_before_first_prune(self, fake_db):
+        from utils import firebase_db
+
+        conv_ref = fake_db.collection("chats").document("-400").collection("messages")
+        for i in range(60):
+            conv_ref.add({"content": str(i), "timestamp": datetime.datetime(2025, 1, 1, 0, i)})
+        # The first batch after deploy creates message_count from 2 messages only
+        _seed_chat(-400, 2)
+
+        firebase_db.prune_conversation(111, chat_id=-400, max_messages=50, delete_count=25)
+        chat = fake_db.collection("chats").document("-400").get().to_dict()
+        assert chat["message_count"] == 37
+        assert len(list(conv_ref.stream())) == 37
+
+    def test_flush_during_seeding_is_not_overwritten(self, fake_db):
+        from utils import firebase_db
+
+        conv_ref = fake_db.collection("chats").document("-410").collection("messages")
+        for i in range(5):
+            conv_ref.add({"content": str(i), "timestamp": datetime.datetime(2025, 1, 1, 0, i)})
+        _seed_chat(-410, 1)
+
+        backend = firebase_db.backend
+        real_count = type(backend)._count_stored
+        flushed = []
+
+        def count_then_flush(self, ref):
+            total = real_count(self, ref)
+            if not flushed:  # a batch commits between the count and the seed
+                flushed.append(True)
+                _seed_chat(-410, 1)
+            return total
+
+        with patch.object(type(backend), "_count_stored", count_then_flush):
+            assert backend.count_messages(-410) == 7
+        chat = fake_db.collection("chats").document("-410").get().to_dict()
+        assert chat["message_count"] == 7 and chat["counted"]
+
+
+class TestWriteBehind:
+    def test_batch_in_flight_stays_visible_and_flushes_serialize(self, fake_db):
+        from utils import conversation_log, firebase_db
+
+        backend = firebase_db.backend
+        entered, release = threading.Event(), threading.Event()
+        calls = []
+        real_append = backend.append_messages
+
+        def slow_append(batches):
+            calls.append(sum(len(m) for _, m in batches))
+            entered.set()
+            release.wait(5)
+            return real_append(batches)
+
+        firebase_db.log_conversation(111, "user", "in flight", chat_id=-500)
+        with patch.object(backend, "append_messages", slow_append):
+            first = threading.Thread(target=conversation_log.flush)
+            first.start()
+            assert entered.wait(5)
+            # Neither queued nor stored, but still part of the chat's history
+            assert [m["content"] for m in firebase_db.get_recent_context(111, chat_id=-500)] == [
+                "in flight"
+            ]
+            firebase_db.log_conversation(111, "user", "next", chat_id=-500)
+            second = threading.Thread(target=conversation_log.flush)
+            second.start()
+            second.join(0.1)
+            assert second.is_alive() and calls == [1]  # waits for the first flush
+            release.set()
+            first.join(5)
+            second.join(5)
+        assert calls == [1, 1]
+        assert conversation_log.pending_for_chat(-500) == ([], [])
+
+    def test_reset_during_failed_flush_is_not_requeued(self, fake_db):
+        from utils import conversation_log, firebase_db
+
+        entered, release = threading.Event(), threading.Event()
+
+        def failing_append(batches):
+            entered.set()
+            release.wait(5)
+            raise RuntimeError("commit failed")
+
+        firebase_db.log_conversation(111, "user", "before reset", chat_id=-510)
+        with patch.object(firebase_db.backend, "append_messages", failing_append):
+            flusher = threading.Thread(target=conversation_log.flush)
+            flusher.start()
+            assert entered.wait(5)
+            conversation_log.discard(-510)
+            release.set()
+            flusher.join(5)
+        assert conversation_log.pending_for_chat(-510) == ([], [])
+
+    def test_failing_chat_backs_off_then_is_parked(self, fake_db):
+        from utils import conversation_log, firebase_db
+
+        real_append = firebase_db.backend.append_messages
+
+        def append_failing_chat(batches):
+            failed = [(c, m) for c, msgs in batches if c == "-520" for m in msgs]
+            real_append([(c, msgs) for c, msgs in batches if c != "-520"])
+            return failed
+
+        parked = conversation_log.get_stats()["parked"]
+        firebase_db.log_conversation(111, "user", "poison", chat_id=-520)
+        with patch.object(firebase_db.backend, "append_messages", append_failing_chat):
+            conversation_log.flush()
+            attempts, retry_at = conversation_log._retries["-520"]
+            assert attempts == 1
+            # The flusher thread leaves the chat alone until its retry time
+            assert conversation_log._flush(now=retry_at - 0.1) == 0
+            for _ in range(conversation_log.MAX_ATTEMPTS - 1):
+                conversation_log.flush()
+        assert conversation_log.pending_for_chat(-520) == ([], [])
+        assert conversation_log.get_stats()["parked"] == parked + 1
+
+        # Later messages for the chat are no longer stuck behind it
+        firebase_db.log_conversation(111, "user", "next", chat_id=-520)
+        assert conversation_log.flush() == 1
+
+    def test_shutdown_counts_lost_messages(self, fake_db):
+        from utils import conversation_log, firebase_db
+
+        lost = conversation_log.get_stats()["lost"]
+        firebase_db.log_conversation(111, "user", "last words", chat_id=-530)
+        with patch.object(
+            firebase_db.backend, "append_messages", lambda batches: [("-530", {})]
+        ), patch.object(conversation_log, "_stopping", True):
+            conversation_log.flush()
+        assert conversation_log.get_stats()["lost"] == lost + 1
+        assert conversation_log.queue_depth() == 0
+
+
+class TestBulkReset:
+    def test_reset_deletes_in_pages(self, fake_db):
+        from utils import bulk_delete, firebase_db
+
+        _seed_chat(111, 1000)
+        fake_db.reset_counters()
+        progress = []
+        deleted = firebase_db.clear_user_conversations(111, on_progress=progress.append)
+
+        assert deleted == 1000
+        assert progress == [400, 800, 1000]
+        assert fake_db.commits == 3  # one batch per page, not one RPC per message
+        chat = fake_db.collection("chats").document("111").get().to_dict()
+        assert chat["message_count"] == 0
+        assert bulk_delete.purge_cutoff(111) is None
+
+    def test_messages_after_reset_survive_the_purge(self, fake_db):
+        from utils import bulk_delete, conversation_log, firebase_db
+
+        _seed_chat(111, 30)
+        cutoff = firebase_db.forget_conversation(111)
+        # Old history is hidden while the purge is still pending
+        assert firebase_db.get_recent_context(111, limit=20) == []
+
+        firebase_db.log_conversation(111, "user", "after reset", chat_id=111)
+        conversation_log.flush()
+        bulk_delete.purge_conversations(111, cutoff)
+
+        conv_ref = fake_db.collection("chats").document("111").collection("messages")
+        assert [d.to_dict()["content"] for d in conv_ref.stream()] == ["after reset"]
+        assert fake_db.collection("chats").document("111").get().to_dict()["message_count"] == 1
+
+
+class TestPruneBenchmark:
+    """Reads per reply: counter lookup vs. streaming the history."""
+
+    @pytest.mark.parametrize("history", [10, 30, 50])
+    def test_reads_saved_per_turn(self, fake_db, history):
+        from utils import firebase_db
+
+        chat_id = -1000 - history
+        _seed_chat(chat_id, history)
+
+        legacy_reads = _legacy_prune_reads(fake_db, chat_id)
+        firebase_db.prune_conversation(111, chat_id=chat_id)  # seeds the counter once
+
+        fake_db.reset_counters()
+        firebase_db.prune_conversation(111, chat_id=chat_id)
+        counter_reads = fake_db.reads
+
+        print(
+            f"\n[Bench] history={history}: legacy={legacy_reads} reads, "
+            f"counter={counter_reads} reads, saved={legacy_reads - counter_reads}/turn"
+        )
+        assert counter_reads == 1
+        assert legacy_reads == history
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
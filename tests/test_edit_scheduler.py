@@ -0,0 +1,140 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import edit_scheduler
+
+
+class RetryAfter(Exception):
+    """Stand-in for telegram.error.RetryAfter."""
+
+    def __init__(self, seconds):
+        super().__init__(f"Flood control exceeded. Retry in {seconds} seconds")
+        self.retry_after = seconds
+
+
+class FakeMessage:
+    def __init__(self, chat_id, message_id=1, fail=None, delay=0.0):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.edits = []  # (text, parse_mode)
+        self.fail = list(fail or [])
+        self.delay = delay
+
+    async def edit_text(self, text, parse_mode=None):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise self.fail.pop(0)
+        self.edits.append((text, parse_mode))
+
+
+@pytest.fixture(autouse=True)
+def fast_intervals():
+    with patch.object(edit_scheduler, "PRIVATE_INTERVAL", 0.05), patch.object(
+        edit_scheduler, "GROUP_INTERVAL", 0.15
+    ), patch.object(edit_scheduler, "_stretch", 1.0):
+        yield
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await edit_scheduler.stop()
+
+    return asyncio.run(main())
+
+
+class TestCoalescing:
+    def test_latest_preview_wins(self):
+        msg = FakeMessage(42)
+
+        async def scenario():
+            edit_scheduler.submit(msg, "a")
+            await asyncio.sleep(0.01)  # "a" goes out, the chat's slot is taken
+            for text in ["b", "c", "d"]:
+                edit_scheduler.submit(msg, text)
+            await asyncio.sleep(0.1)
+
+        run(scenario())
+        assert [text for text, _ in msg.edits] == ["a", "d"]
+
+    def test_final_edit_is_never_overtaken_by_a_preview(self):
+        msg = FakeMessage(42, delay=0.02)
+
+        async def scenario():
+            edit_scheduler.submit(msg, "preview", parse_mode="HTML")
+            await asyncio.sleep(0.005)  # preview is on the wire
+            edit_scheduler.submit(msg, "stale preview", parse_mode="HTML")
+            await edit_scheduler.finish(msg, "final", parse_mode="HTML")
+            await asyncio.sleep(0.1)
+
+        run(scenario())
+        assert msg.edits[-1] == ("final", "HTML")
+        assert ("stale preview", "HTML") not in msg.edits
+
+
+class TestBudgets:
+    def test_group_chats_are_paced_slower_than_private(self):
+        private, group = FakeMessage(42), FakeMessage(-100)
+
+        async def scenario():
+            for i in range(40):
+                edit_scheduler.submit(private, f"p{i}")
+                edit_scheduler.submit(group, f"g{i}")
+                await asyncio.sleep(0.01)
+
+        run(scenario())
+        assert 4 <= len(private.edits) <= 10
+        assert 2 <= len(group.edits) <= 4
+
+    def test_global_budget_caps_all_chats(self):
+        messages = [FakeMessage(chat_id) for chat_id in range(1, 41)]
+
+        async def scenario():
+            for msg in messages:
+                edit_scheduler.submit(msg, "x")
+            await asyncio.sleep(0.25)
+
+        with patch.object(edit_scheduler, "GLOBAL_RATE", 20.0):
+            run(scenario())
+        sent = sum(len(msg.edits) for msg in messages)
+        # One second's worth as a burst, then a token per 50ms
+        assert 22 <= sent <= 27
+
+
+class TestErrors:
+    def test_retry_after_defers_chat_and_stretches_intervals(self):
+        msg = FakeMessage(42, fail=[RetryAfter(0.1)])
+
+        async def scenario():
+            edit_scheduler.submit(msg, "a")
+            await asyncio.sleep(0.05)
+            assert msg.edits == []  # still waiting out the flood limit
+            await asyncio.sleep(0.15)
+
+        run(scenario())
+        assert msg.edits == [("a", None)]
+        assert edit_scheduler._stretch > 1.0
+
+    def test_final_waits_out_retry_after(self):
+        msg = FakeMessage(-100, fail=[RetryAfter(0.05)])
+        run(edit_scheduler.finish(msg, "done"))
+        assert msg.edits == [("done", None)]
+
+    def test_unparseable_html_falls_back_to_plain_text(self):
+        msg = FakeMessage(42, fail=[Exception("Can't parse entities")])
+        run(edit_scheduler.finish(msg, "<b>oops", parse_mode="HTML"))
+        assert msg.edits == [("<b>oops", None)]
+
+    def test_not_modified_is_not_retried(self):
+        msg = FakeMessage(42, fail=[Exception("Message is not modified")])
+        run(edit_scheduler.finish(msg, "same", parse_mode="HTML"))
+        assert msg.edits == []
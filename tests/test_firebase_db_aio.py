@@ -0,0 +1,193 @@
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RPC_LATENCY = 0.05
+
+
+class SlowAsyncDoc:
+    """AsyncDocumentReference stand-in whose get() takes RPC_LATENCY seconds."""
+
+    def __init__(self, doc_id, events):
+        self.id = doc_id
+        self._events = events
+
+    async def get(self):
+        self._events.append(("start", self.id))
+        await asyncio.sleep(RPC_LATENCY)
+        self._events.append(("end", self.id))
+
+        class _Snapshot:
+            exists = True
+
+            def to_dict(_self):
+                return {"name": f"user {self.id}"}
+
+        return _Snapshot()
+
+
+class SlowAsyncClient:
+    def __init__(self):
+        self.events = []
+
+    def collection(self, name):
+        client = self
+
+        class _Collection:
+            def document(self, doc_id):
+                return SlowAsyncDoc(doc_id, client.events)
+
+        return _Collection()
+
+
+def _async_backend(client):
+    from utils import metrics
+    from utils.storage.firestore_backend import FirestoreAsyncBackend
+
+    return metrics.InstrumentedAsyncBackend(FirestoreAsyncBackend(None, client=client))
+
+
+class TestAsyncHandlersInterleave:
+    def test_concurrent_reads_overlap(self):
+        """Ten handlers reading profiles should take ~1 RPC, not 10."""
+        from utils import firebase_db_aio
+
+        client = SlowAsyncClient()
+
+        async def handler(uid):
+            return await firebase_db_aio.get_user_profile(uid)
+
+        async def run():
+            return await asyncio.gather(*(handler(i) for i in range(10)))
+
+        with patch.object(firebase_db_aio, "backend", _async_backend(client)):
+            start = time.perf_counter()
+            profiles = asyncio.run(run())
+            elapsed = time.perf_counter() - start
+
+        assert [p["name"] for p in profiles] == [f"user {i}" for i in range(10)]
+        # Every request started before the first one finished
+        first_end = next(i for i, e in enumerate(client.events) if e[0] == "end")
+        assert first_end == 10
+        assert elapsed < RPC_LATENCY * 5
+
+    def test_event_loop_stays_responsive(self):
+        """A ticker keeps running while Firestore reads are in flight."""
+        from utils import firebase_db_aio
+
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(RPC_LATENCY / 5)
+
+        async def run():
+            await asyncio.gather(
+                firebase_db_aio.get_user_profile(1),
+                firebase_db_aio.get_user_profile(2),
+                ticker(),
+            )
+
+        with patch.object(firebase_db_aio, "backend", _async_backend(SlowAsyncClient())):
+            asyncio.run(run())
+
+        assert len(ticks) == 5
+        assert ticks[-1] - ticks[0] < RPC_LATENCY * 2
+
+
+
+class TestThreadedBackend:
+    """On non-Firestore backends the async layer runs the sync backend in threads."""
+
+    @pytest.fixture
+    def sqlite_aio(self, tmp_path):
+        from utils import firebase_db_aio, metrics, news_feed, post_index
+        from utils.storage.sqlite_backend import SQLiteBackend
+
+        sync = SQLiteBackend(str(tmp_path / "mimi.db"))
+        news_feed.invalidate()
+        with patch.object(
+            firebase_db_aio, "backend", metrics.InstrumentedAsyncBackend(sync.aio())
+        ):
+            yield sync
+        news_feed.invalidate()
+        post_index.clear()
+
+    def test_results_match_the_sync_layer(self, sqlite_aio):
+        from utils import firebase_db_aio
+        from utils.storage import StoredDoc
+
+        sqlite_aio.save_post("p1", {"post_id": 7, "status": "trusted", "timestamp": "2025-01-01"})
+
+        async def run():
+            news = await firebase_db_aio.get_latest_news(limit=5)
+            post = await firebase_db_aio.get_post_by_id(7)
+            return news, post
+
+        news, post = asyncio.run(run())
+        assert [type(d) for d in news] == [StoredDoc] and news[0].id == "p1"
+        assert post.id == "p1" and sqlite_aio.get_post_index(7)["doc_id"] == "p1"
+
+    def test_index_skips_posts_without_a_doc_id(self, sqlite_aio):
+        from utils import firebase_db_aio
+
+        asyncio.run(firebase_db_aio._index_post(None, 8))
+        assert sqlite_aio.get_post_index(8) is None
+
+
+
+class _LegacyChat:
+    """An async chat document with 3 messages stored before message_count existed."""
+
+    def __init__(self):
+        self.writes = []
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        return self
+
+    async def get(self):
+        class _Snapshot:
+            exists = False
+            update_time = None
+
+            def to_dict(_self):
+                return None
+
+        return _Snapshot()
+
+    def count(self):
+        raise RuntimeError("aggregation queries unavailable")
+
+    def select(self, fields):
+        return self
+
+    async def stream(self):
+        for i in range(3):
+            yield i
+
+    async def create(self, data):
+        self.writes.append(data)
+
+
+class TestAsyncSeeding:
+    def test_count_falls_back_to_streaming_ids(self):
+        from utils.storage.firestore_backend import FirestoreAsyncBackend
+
+        client = _LegacyChat()
+        backend = FirestoreAsyncBackend(None, client=client)
+        assert asyncio.run(backend.count_messages(-1)) == 3
+        assert client.writes == [{"message_count": 3, "counted": True}]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,97 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import history_cache
+
+
+def _msg(i, chat="c"):
+    return {"role": "user", "content": f"{chat}:{i}", "user_id": "1", "user_name": "A"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    history_cache.clear()
+    for key in history_cache.stats:
+        history_cache.stats[key] = 0
+    yield
+    history_cache.clear()
+
+
+class TestHistoryCache:
+    def test_cold_chat_is_a_miss_and_ignores_appends(self):
+        history_cache.append("c", _msg(0))
+        assert history_cache.get("c", 5) is None
+
+    def test_warm_then_append(self):
+        history_cache.begin_warm("c")
+        history_cache.warm("c", [history_cache.shape(_msg(i)) for i in range(3)])
+        history_cache.append("c", _msg(3))
+        assert [m["content"] for m in history_cache.get("c", 2)] == ["c:2", "c:3"]
+        assert history_cache.get_stats()["hits"] == 1
+
+    def test_messages_logged_during_warm_are_kept(self):
+        history_cache.begin_warm("c")
+        history_cache.append("c", _msg(1))  # lands while the storage read is in flight
+        history_cache.append("c", _msg(2))
+        # The read saw message 1 (already flushed) but not message 2
+        history_cache.warm("c", [history_cache.shape(_msg(0)), history_cache.shape(_msg(1))])
+        assert [m["content"] for m in history_cache.get("c", 10)] == ["c:0", "c:1", "c:2"]
+
+    def test_repeated_messages_logged_during_warm_are_kept(self):
+        ok = {"role": "user", "content": "ok", "user_id": "1", "user_name": "A"}
+        history_cache.begin_warm("c")
+        history_cache.append("c", _msg(1))
+        history_cache.append("c", ok)
+        # The read predates both; an earlier "ok" in storage is a different message
+        history_cache.warm("c", [history_cache.shape(ok), history_cache.shape(_msg(0))])
+        assert [m["content"] for m in history_cache.get("c", 10)] == ["ok", "c:0", "c:1", "ok"]
+
+    def test_failed_read_does_not_block_later_warms(self, tmp_path):
+        from utils import firebase_db
+        from utils.storage.sqlite_backend import SQLiteBackend
+
+        backend = SQLiteBackend(str(tmp_path / "mimi.db"))
+        with patch.object(firebase_db, "backend", backend), patch.object(
+            backend, "recent_messages", side_effect=RuntimeError("unavailable")
+        ), pytest.raises(RuntimeError):
+            firebase_db.get_recent_context(1, chat_id="c")
+        assert "c" not in history_cache._warming
+
+    def test_reset_during_warm_does_not_resurrect_history(self):
+        history_cache.begin_warm("c")
+        history_cache.discard("c")
+        history_cache.warm("c", [history_cache.shape(_msg(0))])
+        assert history_cache.get("c", 5) is None
+
+    def test_ring_buffer_is_bounded(self):
+        with patch.object(history_cache, "PER_CHAT", 5):
+            history_cache.begin_warm("c")
+            history_cache.warm("c", [])
+            for i in range(12):
+                history_cache.append("c", _msg(i))
+            assert [m["content"] for m in history_cache.get("c", 5)] == [
+                f"c:{i}" for i in range(7, 12)
+            ]
+            # Windows larger than the buffer must go to storage
+            assert history_cache.get("c", 6) is None
+
+    def test_lru_eviction_across_chats(self):
+        with patch.object(history_cache, "MAX_CHATS", 2):
+            for chat in ("a", "b"):
+                history_cache.begin_warm(chat)
+                history_cache.warm(chat, [])
+            history_cache.get("a", 1)  # a is now most recently used
+            history_cache.begin_warm("c")
+            history_cache.warm("c", [])
+            assert history_cache.get("b", 1) is None
+            assert history_cache.get("a", 1) == []
+            assert history_cache.get_stats()["evictions"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("httpx")
+
+from utils import http_clients
+
+
+class TestHttpClients:
+    def test_one_pool_per_host(self):
+        async def run():
+            a = http_clients.get_client("https://openrouter.ai/api/v1/chat/completions")
+            b = http_clients.get_client("https://openrouter.ai/api/v1/embeddings")
+            c = http_clients.get_client("https://api.deepseek.com")
+            assert a is b
+            assert a is not c
+            await http_clients.close()
+            assert a.is_closed and c.is_closed
+
+        asyncio.run(run())
+
+    def test_new_loop_gets_new_client(self):
+        async def grab():
+            return http_clients.get_client("https://api.telegram.org/botX/sendMessage")
+
+        first = asyncio.run(grab())
+        second = asyncio.run(grab())
+        assert first is not second
+        asyncio.run(http_clients.close())
+        assert first.is_closed and second.is_closed  # the replaced pool isn't leaked
+
+    def test_shared_session(self):
+        assert http_clients.get_session() is http_clients.get_session()
+        asyncio.run(http_clients.close())
+
+    def test_telegram_request_uses_pool_limits(self):
+        pytest.importorskip("telegram")
+        request = http_clients.telegram_request(read_timeout=100, connect_timeout=60)
+        limits = request._client_kwargs["limits"]
+        assert limits.max_connections == http_clients.MAX_CONNECTIONS
+        assert limits.max_keepalive_connections == http_clients.KEEPALIVE_CONNECTIONS
+        assert request.read_timeout == 100
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import llm_usage
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+
+@pytest.fixture(autouse=True)
+def fresh_counters():
+    llm_usage.reset()
+    yield
+    llm_usage.reset()
+
+
+class TestRecord:
+    def test_cache_hit_accounting(self):
+        llm_usage.record(
+            "deepseek-chat",
+            {"prompt_tokens": 1000, "prompt_cache_hit_tokens": 900,
+             "prompt_cache_miss_tokens": 100, "completion_tokens": 50},
+            first_token_seconds=0.4, seconds=2.0, prefix="stable",
+        )
+        llm_usage.record(
+            "deepseek-chat",
+            {"prompt_tokens": 1000, "prompt_cache_hit_tokens": 0, "completion_tokens": 50},
+            first_token_seconds=1.5, seconds=3.0, prefix="stable",
+        )
+        m = llm_usage.snapshot()["models"]["deepseek-chat"]
+        assert m["requests"] == 2
+        assert m["hit"] == 900 and m["miss"] == 1100
+        assert m["hit_rate"] == pytest.approx(0.45)
+        assert m["first_token_warm"] == 0.4 and m["first_token_cold"] == 1.5
+        assert m["prefixes"] == 1
+
+    def test_missing_usage_still_counts_the_request(self):
+        llm_usage.record("deepseek-reasoner", None, seconds=1.0, prefix="a")
+        llm_usage.record("deepseek-reasoner", None, seconds=1.0, prefix="b")
+        m = llm_usage.snapshot()["models"]["deepseek-reasoner"]
+        assert m["requests"] == 2 and m["prompt"] == 0
+        assert m["prefixes"] == 2
+
+    def test_report(self):
+        assert "no requests" in llm_usage.format_report()
+        llm_usage.record("deepseek-chat", {"prompt_tokens": 10, "prompt_cache_hit_tokens": 5})
+        report = llm_usage.format_report()
+        assert "deepseek-chat: 1 requests" in report and "50% from cache" in report
+
+
+class TestStablePrefix:
+    @pytest.mark.parametrize("name", ["global_grounding.md", "system_prompt_private.md",
+                                      "system_prompt_group.md"])
+    def test_prompt_files_have_no_per_request_placeholders(self, name):
+        # Anything rendered per request in these files breaks DeepSeek's prefix
+        # cache; time and other volatile data belong in build_dynamic_context.
+        with open(os.path.join(PROMPTS_DIR, name), encoding="utf-8") as f:
+            assert "{{" not in f.read()
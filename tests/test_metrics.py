@@ -0,0 +1,102 @@
+import asyncio
+import datetime
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import metrics
+from utils.storage.sqlite_backend import SQLiteBackend
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return metrics.InstrumentedBackend(SQLiteBackend(str(tmp_path / "mimi.db")))
+
+
+def _msg(i):
+    return {
+        "role": "user",
+        "content": f"message {i}",
+        "timestamp": datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=i),
+    }
+
+
+class TestPercentiles:
+    def test_nearest_rank(self):
+        samples = list(range(1, 101))
+        assert metrics.percentile(samples, 50) == 50
+        assert metrics.percentile(samples, 95) == 95
+        assert metrics.percentile(samples, 99) == 99
+        assert metrics.percentile([], 50) == 0.0
+        assert metrics.percentile([7], 99) == 7
+
+
+class TestHandlerNames:
+    def test_commands_callbacks_and_messages(self):
+        def update(text=None, data=None):
+            return SimpleNamespace(
+                callback_query=SimpleNamespace(data=data) if data else None,
+                effective_message=SimpleNamespace(text=text),
+            )
+
+        assert metrics.handler_name_for(update("/news@MimiBot more")) == "/news"
+        assert metrics.handler_name_for(update(data="news_more_abc")) == "callback:news"
+        assert metrics.handler_name_for(update("hello mimi")) == "message"
+
+
+class TestInstrumentedBackend:
+    def test_records_ops_per_handler(self, backend):
+        token = metrics.set_handler("/news")
+        try:
+            backend.merge_user("1", {"name": "A"})
+            backend.get_user("1")
+            backend.append_messages([("c1", [_msg(i) for i in range(3)])])
+            assert len(backend.recent_messages("c1", 10)) == 3
+        finally:
+            metrics.current_handler.reset(token)
+        backend.get_user("2")  # outside any update
+
+        snap = metrics.snapshot()
+        news = snap["handlers"]["/news"]
+        assert news["ops"] == {
+            "write:users": 1,
+            "read:users": 1,
+            "write:messages": 1,
+            "query:messages": 1,
+        }
+        assert news["docs"]["write:messages"] == 3
+        assert news["docs"]["query:messages"] == 3
+        assert news["latency"]["count"] == 4
+        assert snap["handlers"]["background"]["docs"]["read:users"] == 0
+        assert snap["operations"]["read:users"]["count"] == 2
+
+    def test_passthrough_and_errors(self, backend):
+        assert backend.name == "sqlite"
+        with pytest.raises(Exception):
+            backend.append_messages(None)
+        assert metrics.snapshot()["handlers"]["background"]["errors"] == 1
+
+    def test_context_follows_to_thread(self, backend):
+        async def handler():
+            metrics.set_handler("/profile")
+            await asyncio.to_thread(backend.get_user, "1")
+
+        asyncio.run(handler())
+        assert "/profile" in metrics.snapshot()["handlers"]
+
+    def test_report_lists_busiest_handler(self, backend):
+        metrics.set_handler("/announce")
+        backend.put_audience([(str(i), None) for i in range(5)])
+        report = metrics.format_report()
+        assert "/announce: 1 calls, 0 docs read, 5 written" in report
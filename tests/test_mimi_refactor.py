@@ -195,10 +195,10 @@ class TestAIResponse:
 
     def test_clean_output_removes_links(self):
         """clean_output should strip links from text"""
-        from utils import ai_tutor
+        from utils import stream_renderer
 
         test_text = "Check https://example.com for more info"
-        cleaned = ai_tutor.clean_output(test_text)
+        cleaned = stream_renderer.clean_output(test_text)
         assert "[Link Removed]" in cleaned or "https://example.com" not in cleaned
 
     def test_get_sliding_window_context(self):
@@ -283,17 +283,17 @@ class TestAIResponseMocked:
 
     def test_clean_output_handles_empty_text(self):
         """clean_output should handle empty text gracefully"""
-        from utils import ai_tutor
+        from utils import stream_renderer
 
-        result = ai_tutor.clean_output("")
+        result = stream_renderer.clean_output("")
         assert result == ""
 
     def test_clean_output_preserves_non_link_content(self):
         """clean_output should preserve non-link content"""
-        from utils import ai_tutor
+        from utils import stream_renderer
 
         test_text = "The answer is 42"
-        result = ai_tutor.clean_output(test_text)
+        result = stream_renderer.clean_output(test_text)
         assert "42" in result
 
 
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import model_router
+
+
+def _data(content):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": content}}]})
+
+
+class FakeResponse:
+    def __init__(self, status_code, lines, delay):
+        self.status_code = status_code
+        self._lines = lines
+        self._delay = delay
+
+    async def aiter_lines(self):
+        await asyncio.sleep(self._delay)
+        for line in self._lines:
+            yield line
+
+
+class FakeRequest:
+    def __init__(self, response, log, name):
+        self.response = response
+        self.log = log
+        self.name = name
+
+    async def __aenter__(self):
+        self.log.append(("open", self.name))
+        return self.response
+
+    async def __aexit__(self, *exc):
+        self.log.append(("close", self.name))
+
+
+def fake_backends(behaviour):
+    """behaviour: {route name: (status, first-token delay)}"""
+    log = []
+
+    def connect(route, payload):
+        status, delay = behaviour[route.name]
+        lines = ['data: {"choices": [{"delta": {"role": "assistant", "content": ""}}]}',
+                 _data(f"hi from {route.name}"), "data: [DONE]"]
+        return FakeRequest(FakeResponse(status, lines, delay), log, route.name)
+
+    return connect, log
+
+
+@pytest.fixture(autouse=True)
+def fresh_routes(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "k")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "k")
+    for route in model_router.ROUTES.values():
+        route.outcomes.clear()
+        route.opened_at = None
+        route.probing = False
+    yield
+
+
+async def _collect(stream):
+    async with stream:
+        return [line async for line in stream.lines()]
+
+
+class TestOpenStream:
+    def test_healthy_primary_streams_everything(self):
+        connect, log = fake_backends({"reasoner": (200, 0.0)})
+        with patch.object(model_router, "_connect", connect):
+            async def go():
+                stream = await model_router.open_stream("reasoning", {})
+                return stream.route.name, await _collect(stream)
+
+            name, lines = asyncio.run(go())
+        assert name == "reasoner"
+        assert lines[1] == _data("hi from reasoner") and lines[-1] == "data: [DONE]"
+        assert log == [("open", "reasoner"), ("close", "reasoner")]
+
+    def test_error_falls_through_to_next_route(self):
+        connect, log = fake_backends({"chat": (503, 0.0), "fallback": (200, 0.0)})
+        with patch.object(model_router, "_connect", connect):
+            stream = asyncio.run(model_router.open_stream("chat", {}))
+        assert stream.route.name == "fallback"
+        assert model_router.ROUTES["chat"].outcomes[-1] == (False, None)
+
+    def test_rejected_request_is_not_retried_or_scored(self):
+        connect, log = fake_backends({"chat": (400, 0.0), "fallback": (200, 0.0)})
+        with patch.object(model_router, "_connect", connect):
+            with pytest.raises(model_router.RequestError):
+                asyncio.run(model_router.open_stream("chat", {}))
+        assert ("open", "fallback") not in log
+        assert not model_router.ROUTES["chat"].outcomes
+
+    def test_rate_limit_still_falls_through(self):
+        connect, _ = fake_backends({"chat": (429, 0.0), "fallback": (200, 0.0)})
+        with patch.object(model_router, "_connect", connect):
+            stream = asyncio.run(model_router.open_stream("chat", {}))
+        assert stream.route.name == "fallback"
+
+    def test_broken_stream_counts_as_one_failure(self):
+        connect, _ = fake_backends({"chat": (200, 0.0)})
+        with patch.object(model_router, "_connect", connect):
+            stream = asyncio.run(model_router.open_stream("chat", {}))
+        model_router.report_failure(stream)
+        assert list(model_router.ROUTES["chat"].outcomes) == [(False, None)]
+
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        connect, log = fake_backends({"chat": (200, 1.0), "fallback": (200, 0.01)})
+        with patch.object(model_router, "_connect", connect), patch.object(
+            model_router, "HEDGE_DELAY", 0.05
+        ):
+            async def go():
+                stream = await model_router.open_stream("chat", {})
+                return stream.route.name, await _collect(stream)
+
+            name, lines = asyncio.run(go())
+        assert name == "fallback"
+        assert _data("hi from fallback") in lines
+        assert ("close", "chat") in log  # loser was cancelled and closed
+        assert not model_router.ROUTES["chat"].outcomes  # and not scored as a success
+
+    def test_no_hedge_when_disabled(self):
+        connect, log = fake_backends({"chat": (200, 0.1), "fallback": (200, 0.0)})
+        with patch.object(model_router, "_connect", connect), patch.object(
+            model_router, "HEDGE_DELAY", 0
+        ):
+            stream = asyncio.run(model_router.open_stream("chat", {}))
+        assert stream.route.name == "chat"
+        assert ("open", "fallback") not in log
+
+
+class TestBreaker:
+    def test_errors_open_the_breaker_and_route_around(self):
+        reasoner = model_router.ROUTES["reasoner"]
+        for _ in range(model_router.MIN_SAMPLES):
+            reasoner.record(False)
+        assert reasoner.opened_at is not None
+        assert [r.name for r in model_router.plan("reasoning")] == ["chat", "fallback"]
+
+    def test_slow_first_tokens_open_the_breaker(self):
+        chat = model_router.ROUTES["chat"]
+        for _ in range(model_router.MIN_SAMPLES):
+            chat.record(True, model_router.SLOW_FIRST_TOKEN + 5)
+        assert "open" in chat.describe()
+
+    def test_half_open_probe_closes_on_success(self):
+        reasoner = model_router.ROUTES["reasoner"]
+        for _ in range(model_router.MIN_SAMPLES):
+            reasoner.record(False)
+        with patch.object(model_router, "COOLDOWN", 0):
+            assert reasoner.available()
+            connect, _ = fake_backends({"reasoner": (200, 0.0)})
+            with patch.object(model_router, "_connect", connect):
+                stream = asyncio.run(model_router.open_stream("reasoning", {}))
+        assert stream.route is reasoner
+        assert reasoner.opened_at is None
+
+    def test_all_tripped_still_tries_preferred(self):
+        for route in model_router.ROUTES.values():
+            route.opened_at = 10**12
+        assert [r.name for r in model_router.plan("chat")] == ["chat"]
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import news_feed
+from utils.storage.sqlite_backend import SQLiteBackend
+
+
+class CountingNewsDb:
+    """firebase_db_aio stand-in over a SQLite backend that counts storage reads."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.queries = 0
+
+    async def get_latest_news(self, limit=5, last_timestamp=None):
+        self.queries += 1
+        return self.backend.latest_posts(news_feed.NEWS_STATUSES, limit, last_timestamp)
+
+    async def get_post(self, doc_id):
+        self.queries += 1
+        return self.backend.get_post(doc_id)
+
+
+@pytest.fixture
+def news_db(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "mimi.db"))
+    for i in range(40):
+        backend.save_post(
+            f"post{i:02d}",
+            {"post_id": 100 + i, "status": "trusted", "timestamp": f"2025-01-01T00:{i:02d}:00"},
+        )
+    db = CountingNewsDb(backend)
+    news_feed.invalidate()
+    with patch.object(news_feed, "_db", lambda: db), patch.object(news_feed, "FEED_SIZE", 10):
+        yield db
+    news_feed.invalidate()
+
+
+def _ids(docs):
+    return [d.id for d in docs]
+
+
+class TestNewsFeed:
+    def test_first_page_is_served_from_memory(self, news_db):
+        async def run():
+            for _ in range(5):
+                docs, cursor = await news_feed.get_page()
+            return docs, cursor
+
+        docs, cursor = asyncio.run(run())
+        assert _ids(docs) == ["post39", "post38", "post37", "post36", "post35"]
+        assert cursor == "post35"
+        assert news_db.queries == 1
+
+    def test_cursor_walks_past_the_cached_window(self, news_db):
+        async def run():
+            seen = []
+            docs, cursor = await news_feed.get_page()
+            while cursor:
+                seen += _ids(docs)
+                docs, cursor = await news_feed.get_page(cursor)
+            return seen + _ids(docs)
+
+        seen = asyncio.run(run())
+        assert seen == [f"post{i:02d}" for i in range(39, -1, -1)]
+
+    def test_prefetch_fills_the_next_page(self, news_db):
+        async def run():
+            await news_feed.get_page()
+            # post30 is the last post in the 10-post window
+            news_feed.prefetch("post30")
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            queries = news_db.queries
+            docs, _ = await news_feed.get_page("post30")
+            return docs, queries
+
+        docs, queries = asyncio.run(run())
+        assert _ids(docs) == ["post29", "post28", "post27", "post26", "post25"]
+        assert news_db.queries == queries  # served from the prefetch
+
+    def test_saves_update_or_invalidate(self, news_db):
+        async def first_page():
+            return (await news_feed.get_page())[0]
+
+        asyncio.run(first_page())
+        news_feed.note_saved("post39", {"summary": "edited"})
+        assert asyncio.run(first_page())[0].get("summary") == "edited"
+        assert news_db.queries == 1
+
+        news_db.backend.save_post(
+            "post40", {"status": "trusted", "timestamp": "2025-01-01T00:40:00"}
+        )
+        news_feed.note_saved("post40", {"status": "trusted"})
+        assert _ids(asyncio.run(first_page()))[0] == "post40"
+        assert news_db.queries == 2
+
+    def test_legacy_timestamp_cursor(self, news_db):
+        docs, _ = asyncio.run(news_feed.get_page("2025-01-01T00:05:00"))
+        assert _ids(docs) == ["post04", "post03", "post02", "post01", "post00"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
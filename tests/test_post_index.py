@@ -0,0 +1,51 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import post_index
+from utils.storage.sqlite_backend import SQLiteBackend
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    post_index.clear()
+    yield
+    post_index.clear()
+
+
+class TestPostIndex:
+    def test_remember_reports_only_changes(self):
+        assert post_index.remember(101, "docA") == {"doc_id": "docA", "dest_msg_id": None}
+        assert post_index.remember(101, "docA") is None
+        assert post_index.remember(101, "docA", 555) == {"doc_id": "docA", "dest_msg_id": 555}
+        # A later save without dest_msg_id keeps the known one
+        assert post_index.remember(101, "docA") is None
+        assert post_index.lookup("101") == {"doc_id": "docA", "dest_msg_id": 555}
+
+    def test_reverse_lookup_for_dest_updates(self):
+        post_index.remember(102, "docB")
+        assert post_index.post_id_for("docB") == "102"
+        assert post_index.post_id_for("missing") is None
+
+    def test_lru_bound(self):
+        with patch.object(post_index, "MAX_ENTRIES", 3):
+            for i in range(5):
+                post_index.remember(i, f"doc{i}")
+            assert post_index.lookup(0) is None
+            assert post_index.post_id_for("doc0") is None
+            assert post_index.lookup(4)["doc_id"] == "doc4"
+
+    def test_lookup_documents_round_trip(self, tmp_path):
+        backend = SQLiteBackend(str(tmp_path / "mimi.db"))
+        entry = post_index.remember(103, "docC", 777)
+        backend.put_post_index(103, entry)
+        assert backend.get_post_index("103") == {"doc_id": "docC", "dest_msg_id": 777}
+        assert backend.get_post_index(999) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,82 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import prompt_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    prompt_cache.reload()
+    yield
+    prompt_cache.reload()
+
+
+def _write(path, text, mtime):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+class TestTemplate:
+    def test_single_pass_render(self):
+        t = prompt_cache.Template("Date: {{current_date}}\nHi {{user}}, {{user}}! {{unknown}}")
+        assert t.fields == ["current_date", "user", "user", "unknown"]
+        out = t.render(current_date="2026-01-01", user="{{current_date}}")
+        # Values are not re-scanned for placeholders; unknown ones are kept
+        assert out == "Date: 2026-01-01\nHi {{current_date}}, {{current_date}}! {{unknown}}"
+
+
+class TestFileCache:
+    def test_reads_once_and_reloads_on_mtime_change(self, tmp_path):
+        path = tmp_path / "prompt.md"
+        _write(path, "v1 {{user}}", 1000)
+        with patch.object(prompt_cache, "CHECK_INTERVAL", 0):
+            reads = prompt_cache.stats["reads"]
+            assert prompt_cache.get_template(str(path)).render(user="A") == "v1 A"
+            assert prompt_cache.get_template(str(path)).render(user="B") == "v1 B"
+            assert prompt_cache.stats["reads"] == reads + 1
+
+            _write(path, "v2 {{user}}", 2000)
+            assert prompt_cache.get_template(str(path)).render(user="A") == "v2 A"
+
+    def test_check_interval_skips_stat(self, tmp_path):
+        path = tmp_path / "prompt.md"
+        _write(path, "old", 1000)
+        assert prompt_cache.get_text(str(path)) == "old"
+        _write(path, "new", 2000)
+        with patch.object(prompt_cache, "CHECK_INTERVAL", 3600):
+            assert prompt_cache.get_text(str(path)) == "old"
+        prompt_cache.reload()
+        assert prompt_cache.get_text(str(path)) == "new"
+
+    def test_missing_and_json_defaults(self, tmp_path):
+        assert prompt_cache.get_text(str(tmp_path / "nope.md"), "fallback") == "fallback"
+        bad = tmp_path / "bad.json"
+        bad.write_text("{not json", encoding="utf-8")
+        assert prompt_cache.get_json(str(bad), default={}) == {}
+        good = tmp_path / "lore.json"
+        good.write_text('[{"content": "x"}]', encoding="utf-8")
+        assert prompt_cache.get_json(str(good)) == [{"content": "x"}]
+
+    def test_compose_rebuilds_only_on_change(self, tmp_path):
+        a, b = tmp_path / "a.md", tmp_path / "b.md"
+        _write(a, "A", 1000)
+        _write(b, "B {{user}}", 1000)
+        builds = []
+
+        def build(texts):
+            builds.append(texts)
+            return "\n".join(texts)
+
+        with patch.object(prompt_cache, "CHECK_INTERVAL", 0):
+            for _ in range(3):
+                t = prompt_cache.compose("k", [str(a), str(b)], build)
+            assert t.render(user="Z") == "A\nB Z"
+            assert len(builds) == 1
+            _write(b, "B2", 2000)
+            assert prompt_cache.compose("k", [str(a), str(b)], build).render() == "A\nB2"
+            assert len(builds) == 2
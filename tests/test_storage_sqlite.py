@@ -0,0 +1,156 @@
+import datetime
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.storage.sqlite_backend import SQLiteBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / "mimi.db"))
+
+
+def _msg(i, base=None):
+    base = base or datetime.datetime(2025, 1, 1)
+    return {
+        "role": "user",
+        "content": f"message {i}",
+        "timestamp": base + datetime.timedelta(seconds=i),
+        "user_id": "111",
+        "user_name": "Tester",
+    }
+
+
+class TestUsers:
+    def test_merge_increment_and_delete(self, backend):
+        backend.merge_user(1, {"name": "A", "favourability": 50, "debate_state": {"x": 1}})
+        backend.merge_user(1, {"username": "a"}, increments={"favourability": -3})
+        backend.merge_user(1, {}, delete_fields=["debate_state"])
+
+        user = backend.get_user(1)
+        assert user == {"name": "A", "username": "a", "favourability": 47}
+        assert backend.list_user_ids() == ["1"]
+        assert backend.list_users()[0]["id"] == "1"
+
+    def test_datetimes_round_trip(self, backend):
+        now = datetime.datetime(2025, 5, 1, 12, 30)
+        backend.merge_user(2, {"last_active": now})
+        assert backend.get_user(2)["last_active"] == now
+
+
+class TestMessages:
+    def test_append_counts_and_orders(self, backend):
+        failed = backend.append_messages([("-100", [_msg(i) for i in range(7)])])
+        assert failed == []
+        assert backend.get_message_count("-100") == 7
+        recent = backend.recent_messages("-100", 3)
+        assert [m["content"] for m in recent] == ["message 4", "message 5", "message 6"]
+
+    def test_prune_and_reset(self, backend):
+        backend.append_messages([("-200", [_msg(i) for i in range(60)])])
+        assert backend.delete_oldest_messages("-200", 25) == 25
+        assert backend.get_message_count("-200") == 35
+        assert backend.recent_messages("-200", 1)[0]["content"] == "message 59"
+
+        assert backend.delete_messages("-200") == 35
+        assert backend.get_message_count("-200") == 0
+        assert backend.recent_messages("-200", 5) == []
+
+    def test_paged_delete_respects_cutoff(self, backend):
+        backend.append_messages([("-250", [_msg(i) for i in range(25)])])
+        cutoff = datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=19)
+        pages = []
+        deleted = backend.delete_messages(
+            "-250", before=cutoff, page_size=8, on_progress=pages.append
+        )
+        assert deleted == 20
+        assert pages == [8, 8, 4]
+        assert backend.get_message_count("-250") == 5
+        assert backend.recent_messages("-250", 1)[0]["content"] == "message 24"
+
+    def test_uncounted_chat_is_seeded(self, backend):
+        assert backend.get_message_count("-300") is None
+        backend.append_messages([("-300", [_msg(0)])])
+        backend._conn().execute("UPDATE chats SET message_count = NULL")
+        assert backend.count_messages("-300") == 1
+        assert backend.get_message_count("-300") == 1
+
+
+class TestPostsAndSettings:
+    def test_post_queries(self, backend):
+        for i, status in enumerate(["trusted", "rejected", "confession"]):
+            backend.save_post(
+                f"p{i}",
+                {"post_id": 101 + i, "status": status, "timestamp": f"2025-01-0{i + 1}T00:00:00"},
+            )
+        assert backend.find_post(post_id=102).id == "p1"
+        assert backend.find_post(post_id=999) is None
+
+        latest = backend.latest_posts(["trusted", "confession"], 5)
+        assert [d.id for d in latest] == ["p2", "p0"]
+        older = backend.latest_posts(["trusted", "confession"], 5, latest[0].get("timestamp"))
+        assert [d.id for d in older] == ["p0"]
+
+    def test_local_file_cleanup_query(self, backend):
+        old = datetime.datetime.now() - datetime.timedelta(days=5)
+        backend.save_post("a", {"created_at": old, "local_path": "/tmp/a.jpg"})
+        backend.save_post("b", {"created_at": old, "local_path": None})
+        backend.save_post("c", {"created_at": datetime.datetime.now(), "local_path": "/tmp/c.jpg"})
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=3)
+        assert [d.id for d in backend.posts_with_local_files(cutoff)] == ["a"]
+
+    def test_counter_lease_and_release(self, backend):
+        assert backend.lease_counter("post_id", 20) == (101, 120)
+        assert backend.lease_counter("post_id", 20) == (121, 140)
+        assert backend.release_counter("post_id", 125, 140) is True
+        assert backend.get_setting("counters") == {"post_id": 124}
+        assert backend.release_counter("post_id", 101, 120) is False
+
+    def test_admin_setting(self, backend):
+        backend.merge_setting("admins", {"1": True, "2": True})
+        backend.merge_setting("admins", {}, delete_fields=["1"])
+        assert backend.get_setting("admins") == {"2": True}
+        assert backend.watch_setting("admins", lambda data: None) is None
+
+
+class TestConcurrency:
+    def test_threads_share_the_file(self, backend):
+        """The flusher thread writes while handler threads read (WAL mode)."""
+
+        def writer(n):
+            backend.append_messages([("-400", [_msg(n * 10 + i) for i in range(10)])])
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert backend.get_message_count("-400") == 80
+        assert len(backend.recent_messages("-400", 100)) == 80
+
+
+class TestSQLiteBenchmark:
+    def test_hot_path_latency(self, backend):
+        """Per-turn reads (profile, counter, context) stay well under a millisecond each."""
+        backend.merge_user(1, {"name": "A", "favourability": 50})
+        backend.append_messages([("1", [_msg(i) for i in range(50)])])
+
+        turns = 200
+        start = time.perf_counter()
+        for _ in range(turns):
+            backend.get_user(1)
+            backend.get_message_count("1")
+            backend.recent_messages("1", 5)
+        per_turn = (time.perf_counter() - start) / turns
+        print(f"\nSQLite hot path: {per_turn * 1000:.3f} ms per turn")
+        assert per_turn < 0.01
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
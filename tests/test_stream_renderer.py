@@ -0,0 +1,121 @@
+import os
+import random
+import re
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.stream_renderer import StreamRenderer, clean_output
+
+
+def legacy_clean_output(text, escape=True):
+    """clean_output as it was before StreamRenderer (placeholder-based escaping)."""
+    patterns = [
+        (r"https?://\S+", "[Link Removed]"),
+        (r"\[.+?\]\(.+?\)", "[Link Removed]"),
+        (r"www\.\S+", "[Link Removed]"),
+        (r"\.(com|org|edu|gov|net|io)\S*", "[Link Removed]"),
+        (r"(?i)khanacademy\.org", "[Link Removed]"),
+        (r"(?i)wikipedia\.org", "[Link Removed]"),
+        (r"(?i)youtube\.com", "[Link Removed]"),
+    ]
+    for pattern, replacement in patterns:
+        text = re.sub(pattern, replacement, text)
+    if not escape:
+        return text.strip()
+
+    valid_tags = ["b", "strong", "i", "em", "u", "ins", "s", "strike", "del",
+                  "code", "pre", "blockquote", "tg-spoiler", "a"]
+    tag_pattern = r"<(/?(" + "|".join(valid_tags) + r")(?:\s+[^>]*)?)>"
+    text = text.replace("&", "&amp;")
+    placeholders = []
+
+    def save_tag(match):
+        placeholders.append(match.group(0))
+        return f"__HTML_TAG_{len(placeholders) - 1}__"
+
+    text = re.sub(tag_pattern, save_tag, text, flags=re.IGNORECASE)
+    text = text.replace("<", "&lt;").replace(">", "&gt;")
+    for i, tag in enumerate(placeholders):
+        text = text.replace(f"__HTML_TAG_{i}__", tag)
+    return text.strip()
+
+
+ATOMS = [
+    "a", "b", " ", "  ", "\n", "\n\n", "\t", "<", ">", "<b>", "</b>", "<a href=",
+    "<code>", "</code", "[", "]", "(", ")", "](", "http://x", "https://", "www.",
+    ".com", ".org", "khanacademy.org", "YouTube.com", "&", "word ",
+]
+
+
+def _answer(chars, seed=7):
+    """A long tutoring-style answer with tags, links and stray brackets."""
+    rng = random.Random(seed)
+    lines = []
+    while sum(len(line) + 1 for line in lines) < chars:
+        words = [rng.choice(["the", "buffer", "pH", "x < 5", "<b>Ka</b>", "<i>note</i>",
+                             "see", "https://example.com/a", "[docs](http://d.io)",
+                             "a > b", "Q&A", "<code>x=1</code>", "www.test.org"])
+                 for _ in range(rng.randint(4, 14))]
+        lines.append(" ".join(words))
+    return "\n".join(lines)[:chars]
+
+
+def _chunks(text, rng):
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 12)
+        yield text[i : i + size]
+        i += size
+
+
+class TestEquivalence:
+    def test_matches_legacy_on_random_streams(self):
+        rng = random.Random(1)
+        for _ in range(2000):
+            text = "".join(rng.choice(ATOMS) for _ in range(rng.randint(0, 40)))
+            renderer = StreamRenderer()
+            seen = ""
+            for chunk in _chunks(text, rng):
+                renderer.feed(chunk)
+                seen += chunk
+                assert renderer.render() == legacy_clean_output(seen), repr(seen)
+            assert clean_output(text) == legacy_clean_output(text)
+            assert renderer.text == text
+
+    def test_without_escaping(self):
+        renderer = StreamRenderer(escape=False)
+        for chunk in ["see <b>", "https://x.io/a ", "and [a](b)\nok"]:
+            renderer.feed(chunk)
+        assert renderer.render() == legacy_clean_output(renderer.text, escape=False)
+
+
+class TestBenchmark:
+    @pytest.mark.parametrize("chars", [4000, 8000])
+    def test_incremental_beats_full_rescan(self, chars):
+        text = _answer(chars)
+        chunks = list(_chunks(text, random.Random(3)))
+
+        start = time.perf_counter()
+        buffer = ""
+        for chunk in chunks:
+            buffer += chunk
+            full = legacy_clean_output(buffer)
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        renderer = StreamRenderer()
+        for chunk in chunks:
+            renderer.feed(chunk)
+            incremental = renderer.render()
+        incremental_seconds = time.perf_counter() - start
+
+        assert incremental == full
+        print(
+            f"\n{chars} chars, {len(chunks)} renders: full rescan "
+            f"{legacy_seconds * 1000:.1f}ms, incremental {incremental_seconds * 1000:.1f}ms"
+        )
+        assert incremental_seconds < legacy_seconds
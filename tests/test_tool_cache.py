@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import tool_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    tool_cache.clear()
+    for key in tool_cache.stats:
+        tool_cache.stats[key] = 0
+    yield
+    tool_cache.clear()
+
+
+class TestKeys:
+    def test_query_normalization(self):
+        assert tool_cache.normalize_query("  Kirchhoff's   RULES\n") == "kirchhoff's rules"
+
+    def test_canonical_url(self):
+        a = tool_cache.canonical_url("HTTPS://Example.COM:443/wiki/Kirchhoff/?b=2&a=1&utm_source=x#top")
+        b = tool_cache.canonical_url("https://example.com/wiki/Kirchhoff?a=1&b=2")
+        assert a == b == "https://example.com/wiki/Kirchhoff?a=1&b=2"
+        assert tool_cache.canonical_url("http://x.io:8080") == "http://x.io:8080/"
+
+
+class TestCachedTool:
+    def test_hits_and_error_results_not_stored(self):
+        calls = []
+
+        @tool_cache.cached("web_search", tool_cache.normalize_query, lambda r: not r.startswith("Search error"))
+        def search(query):
+            calls.append(query)
+            return "Search error: rate limited" if "fail" in query else f"results for {query}"
+
+        assert search("Ksp") == "results for Ksp"
+        assert search("  ksp ") == "results for Ksp"
+        search("fail")
+        search("fail")
+        assert calls == ["Ksp", "fail", "fail"]
+        stats = tool_cache.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 3
+
+    def test_single_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        @tool_cache.cached("web_fetch", tool_cache.canonical_url)
+        def fetch(url):
+            calls.append(url)
+            started.set()
+            release.wait(2)
+            return "page"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(fetch("https://a.io/x")))
+        leader.start()
+        started.wait(2)
+        followers = [
+            threading.Thread(target=lambda: results.append(fetch("https://A.io/x/")))
+            for _ in range(3)
+        ]
+        for t in followers:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in [leader, *followers]:
+            t.join(2)
+        assert results == ["page"] * 4
+        assert len(calls) == 1
+        assert tool_cache.get_stats()["coalesced"] == 3
+
+    def test_ttl_expiry(self):
+        @tool_cache.cached("web_search", tool_cache.normalize_query)
+        def search(query):
+            return f"r{time.monotonic()}"
+
+        with patch.dict(tool_cache.TTLS, {"web_search": 0.01}):
+            first = search("q")
+            time.sleep(0.02)
+            assert search("q") != first
+
+
+class TestTiers:
+    def test_lru_by_bytes(self):
+        with patch.object(tool_cache, "MAX_BYTES", 10):
+            tool_cache.put("a", "xxxx", 60)
+            tool_cache.put("b", "yyyy", 60)
+            tool_cache.get("a")  # a is now most recent
+            tool_cache.put("c", "zzzz", 60)
+            assert tool_cache.get("b") is None
+            assert tool_cache.get("a") == "xxxx"
+            assert tool_cache.get_stats()["bytes"] <= 10
+
+    def test_disk_tier_survives_memory_clear(self, tmp_path):
+        with patch.object(tool_cache, "DISK_DIR", str(tmp_path)):
+            tool_cache.put("web_fetch:https://a.io/", "page", 60)
+            tool_cache.clear()
+            assert tool_cache.get("web_fetch:https://a.io/") == "page"
+            assert tool_cache.get_stats()["disk_hits"] == 1
+            assert "hit rate" in tool_cache.format_stats()
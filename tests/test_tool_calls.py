@@ -0,0 +1,57 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ai_agent = pytest.importorskip("utils.ai_agent")
+
+
+class TestToolTimeouts:
+    def test_timeout_becomes_error_result(self):
+        async def slow_tool(name, args, user_id=None):
+            await asyncio.sleep(5)
+            return "late"
+
+        with patch.object(ai_agent, "execute_tool", slow_tool), patch.dict(
+            ai_agent.TOOL_TIMEOUTS, {"web_fetch": 0.05}
+        ):
+            result = asyncio.run(ai_agent.execute_tool_with_timeout("web_fetch", {}))
+        assert result.startswith("Error: web_fetch timed out")
+
+    def test_fast_tool_result_passes_through(self):
+        async def fast_tool(name, args, user_id=None):
+            return f"{name}:{args['q']}"
+
+        with patch.object(ai_agent, "execute_tool", fast_tool):
+            result = asyncio.run(
+                ai_agent.execute_tool_with_timeout("search_memory", {"q": "ksp"})
+            )
+        assert result == "search_memory:ksp"
+
+
+class TestConcurrentToolCalls:
+    def test_calls_overlap_up_to_limit_and_keep_order(self):
+        delays = {"a": 0.2, "b": 0.05, "c": 0.1, "d": 0.01, "e": 0.0}
+        calls = [{"id": name} for name in delays]
+        running = []
+        peak = []
+        finished = []
+
+        async def run_call(tc):
+            running.append(tc["id"])
+            peak.append(len(running))
+            await asyncio.sleep(delays[tc["id"]])
+            running.remove(tc["id"])
+            finished.append(tc["id"])
+            return f"result {tc['id']}"
+
+        with patch.object(ai_agent, "TOOL_CONCURRENCY", 3):
+            results = asyncio.run(ai_agent.run_tool_calls(calls, run_call))
+
+        assert max(peak) == 3  # concurrent, but never more than the limit
+        assert finished[0] != "a"  # the slow first call didn't hold up the rest
+        assert results == [f"result {name}" for name in delays]
@@ -1,6 +1,8 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from utils import firebase_db
+from utils import admission, answer_cache, firebase_db_aio, llm_usage, metrics, model_router, prompt_cache, tool_cache
+import asyncio
+import html
 import os
 
 ADMIN_NOTES = os.getenv("ADMIN_NOTES", "0")
@@ -10,7 +12,7 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
 
     # Only existing admins can add other admins
-    if not firebase_db.is_admin(user.id):
+    if not await firebase_db_aio.is_admin(user.id):
         await update.message.reply_text("🔒 Only admins can add new admins.")
         return
 
@@ -19,7 +21,7 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     new_admin_id = context.args[0]
-    firebase_db.add_admin(new_admin_id)
+    await firebase_db_aio.add_admin(new_admin_id)
     await update.message.reply_text(f"✅ User {new_admin_id} is now an Admin.")
 
 
@@ -27,7 +29,7 @@ async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
 
     # Only existing admins can remove admins
-    if not firebase_db.is_admin(user.id):
+    if not await firebase_db_aio.is_admin(user.id):
         await update.message.reply_text("🔒 Only admins can remove other admins.")
         return
 
@@ -36,5 +38,93 @@ async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     target_id = context.args[0]
-    firebase_db.remove_admin(target_id)
+    await firebase_db_aio.remove_admin(target_id)
     await update.message.reply_text(f"🗑️ User {target_id} removed from Admins.")
+
+
+async def db_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Dumps storage op counts and latency percentiles per handler (/dbstats [reset])."""
+    user = update.effective_user
+
+    if not await firebase_db_aio.is_admin(user.id):
+        await update.message.reply_text("🔒 Only admins can view storage stats.")
+        return
+
+    report = metrics.format_report()
+    if context.args and context.args[0].lower() == "reset":
+        metrics.reset()
+        report += "\n\nCounters reset."
+    await update.message.reply_text(
+        f"<pre>{html.escape(report[-4000:])}</pre>", parse_mode="HTML"
+    )
+
+
+async def reload_prompts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Drops cached prompt files so edits apply before the mtime check notices."""
+    user = update.effective_user
+
+    if not await firebase_db_aio.is_admin(user.id):
+        await update.message.reply_text("🔒 Only admins can reload prompts.")
+        return
+
+    count = prompt_cache.reload()
+    await update.message.reply_text(f"🔄 Cleared {count} cached prompt files.")
+
+
+async def cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Shows hit rates for the shared result caches."""
+    user = update.effective_user
+
+    if not await firebase_db_aio.is_admin(user.id):
+        await update.message.reply_text("🔒 Only admins can view cache stats.")
+        return
+
+    await update.message.reply_text(
+        f"{tool_cache.format_stats()}\n\n{answer_cache.format_stats()}"
+    )
+
+
+async def answer_cache_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Invalidates cached answers (/answercache clear | /answercache forget <question>)."""
+    user = update.effective_user
+
+    if not await firebase_db_aio.is_admin(user.id):
+        await update.message.reply_text("🔒 Only admins can manage the answer cache.")
+        return
+
+    action = context.args[0].lower() if context.args else ""
+    if action == "clear":
+        count = answer_cache.clear()
+        await update.message.reply_text(f"🧹 Dropped {count} cached answers.")
+    elif action == "forget" and len(context.args) > 1:
+        question = " ".join(context.args[1:])
+        count = await asyncio.to_thread(answer_cache.forget, question)
+        await update.message.reply_text(f"🧹 Dropped {count} cached answers like that one.")
+    else:
+        await update.message.reply_text(
+            f"{answer_cache.format_stats()}\n\n"
+            "Usage: /answercache clear | /answercache forget <question>"
+        )
+
+
+async def llm_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Prompt cache hit rate, tokens, latency and route health per model (/llmstats [reset])."""
+    user = update.effective_user
+
+    if not await firebase_db_aio.is_admin(user.id):
+        await update.message.reply_text("🔒 Only admins can view LLM stats.")
+        return
+
+    report = (
+        llm_usage.format_report()
+        + "\n\nRoutes\n"
+        + model_router.format_status()
+        + "\n\n"
+        + admission.format_status()
+    )
+    if context.args and context.args[0].lower() == "reset":
+        llm_usage.reset()
+        report += "\n\nCounters reset."
+    await update.message.reply_text(
+        f"<pre>{html.escape(report[-4000:])}</pre>", parse_mode="HTML"
+    )
@@ -0,0 +1,214 @@
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+
+# Admission control for LLM work (agent turns, vision and PDF questions).
+# At most MAX_ACTIVE requests run at once; the rest wait in a queue ordered
+# first by class (DMs and mentions ahead of random interjections) and then
+# by start-time fair queuing over users *and* chats: a request starts at
+# max(virtual time, its user's last finish, its chat's last finish) and
+# finishes 1/weight later, so one chatty user or one busy group can't crowd
+# out everyone else.
+# Interjections are optional: they are refused when the bot is already
+# saturated, evicted first when the queue is full, and only wait a few
+# seconds. Waiters get their queue position through `on_position`.
+MAX_ACTIVE = int(os.getenv("LLM_MAX_ACTIVE", 8))
+MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 64))
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 120))
+INTERJECTION_MAX_WAIT = 5.0
+
+RANKS = {"direct": 0, "mention": 0, "interjection": 1}
+WEIGHTS = {"direct": 2.0, "mention": 2.0, "interjection": 1.0}
+
+_active = 0
+_queue = []  # _Waiter, unordered; _ordered() sorts
+_virtual = 0.0
+_user_tags = {}  # {user_id: finish tag of their latest request}
+_chat_tags = {}  # {chat_id: finish tag}
+_seq = itertools.count()
+
+stats = {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0, "max_depth": 0}
+
+
+class Rejected(Exception):
+    """The request was shed (or waited too long) and should not run."""
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "tag", "charge", "seq", "on_position", "position")
+
+    def __init__(self, priority, tag, charge, on_position):
+        self.future = asyncio.get_running_loop().create_future()
+        self.priority = priority
+        self.tag = tag
+        self.charge = charge
+        self.seq = next(_seq)
+        self.on_position = on_position
+        self.position = None
+
+
+def priority_for(chat_type, is_mention=False, is_reply_to_bot=False):
+    """
+    direct (DM), mention (mention or reply to the bot) or interjection.
+    Takes the trigger flags pipe_question already worked out.
+    """
+    if chat_type == "private":
+        return "direct"
+    if is_mention or is_reply_to_bot:
+        return "mention"
+    return "interjection"
+
+
+def _start_tag(user_id, chat_id):
+    return max(_virtual, _user_tags.get(user_id, 0.0), _chat_tags.get(chat_id, 0.0))
+
+
+def _charge(user_id, chat_id, priority, start):
+    """
+    Charges an admitted or queued request to its user and chat. Returns
+    what to pass to _refund if it never runs, or None. Interjections are
+    the bot's own idea, so they don't count against anyone's share.
+    """
+    if priority == "interjection":
+        return None
+    finish = start + 1.0 / WEIGHTS[priority]
+    charge = (user_id, chat_id, finish, _user_tags.get(user_id), _chat_tags.get(chat_id))
+    _user_tags[user_id] = finish
+    _chat_tags[chat_id] = finish
+    if len(_user_tags) > 4096 or len(_chat_tags) > 4096:
+        # Tags at or below virtual time carry no history any more
+        for tags in (_user_tags, _chat_tags):
+            for key in [k for k, t in tags.items() if t <= _virtual]:
+                del tags[key]
+    return charge
+
+
+def _refund(charge):
+    """
+    Undoes _charge for a request that timed out or was cancelled. If a
+    later request has already been tagged after it, the charge stays.
+    """
+    if charge is None:
+        return
+    user_id, chat_id, finish, prev_user, prev_chat = charge
+    for tags, key, prev in ((_user_tags, user_id, prev_user), (_chat_tags, chat_id, prev_chat)):
+        if tags.get(key) == finish:
+            if prev is None:
+                del tags[key]
+            else:
+                tags[key] = prev
+
+
+def _ordered():
+    return sorted(_queue, key=lambda w: (RANKS[w.priority], w.tag, w.seq))
+
+
+def _notify_positions():
+    for position, waiter in enumerate(_ordered(), 1):
+        if waiter.position != position:
+            waiter.position = position
+            if waiter.on_position:
+                waiter.on_position(position)
+
+
+def _dispatch():
+    global _active, _virtual
+    changed = False
+    while _active < MAX_ACTIVE and _queue:
+        waiter = _ordered()[0]
+        _queue.remove(waiter)
+        _active += 1
+        _virtual = max(_virtual, waiter.tag)
+        waiter.future.set_result(True)
+        changed = True
+    if changed:
+        _notify_positions()
+
+
+def _shed(waiter):
+    _queue.remove(waiter)
+    stats["shed"] += 1
+    waiter.future.set_exception(Rejected("evicted for a higher-priority request"))
+
+
+async def _acquire(user_id, chat_id, priority, on_position):
+    global _active, _virtual
+    tag = _start_tag(user_id, chat_id)
+    if _active < MAX_ACTIVE and not _queue:
+        _charge(user_id, chat_id, priority, tag)
+        _active += 1
+        _virtual = max(_virtual, tag)
+        stats["admitted"] += 1
+        return
+
+    if priority == "interjection" and _active >= MAX_ACTIVE and len(_queue) >= MAX_ACTIVE:
+        stats["shed"] += 1
+        raise Rejected("busy; interjection shed")
+    if len(_queue) >= MAX_QUEUE:
+        interjections = [w for w in _queue if w.priority == "interjection"]
+        if priority == "interjection" or not interjections:
+            stats["shed"] += 1
+            raise Rejected("queue full")
+        _shed(max(interjections, key=lambda w: w.seq))
+
+    waiter = _Waiter(priority, tag, _charge(user_id, chat_id, priority, tag), on_position)
+    _queue.append(waiter)
+    stats["queued"] += 1
+    stats["max_depth"] = max(stats["max_depth"], len(_queue))
+    _notify_positions()
+
+    timeout = INTERJECTION_MAX_WAIT if priority == "interjection" else QUEUE_TIMEOUT
+    try:
+        await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+    except asyncio.TimeoutError:
+        if waiter in _queue:
+            _queue.remove(waiter)
+            _refund(waiter.charge)
+            stats["timed_out"] += 1
+            _notify_positions()
+            raise Rejected("waited too long")
+        # Admitted in the same instant the wait expired
+    except asyncio.CancelledError:
+        if waiter in _queue:
+            _queue.remove(waiter)
+            _refund(waiter.charge)
+            _notify_positions()
+        elif waiter.future.done() and not waiter.future.exception():
+            _release()
+        raise
+    stats["admitted"] += 1
+
+
+def _release():
+    global _active
+    _active -= 1
+    _dispatch()
+
+
+@asynccontextmanager
+async def slot(user_id, chat_id, priority, on_position=None):
+    """
+    Holds one of the MAX_ACTIVE slots for the body. Raises Rejected if the
+    request is shed. `on_position(n)` is called (synchronously) whenever the
+    request's place in the queue changes while it waits.
+    """
+    started = time.monotonic()
+    await _acquire(user_id, chat_id, priority, on_position)
+    waited = time.monotonic() - started
+    if waited > 1:
+        print(f"DEBUG: Admission: {priority} for {user_id} in {chat_id} waited {waited:.1f}s")
+    try:
+        yield
+    finally:
+        _release()
+
+
+def format_status():
+    return (
+        f"Admission: {_active}/{MAX_ACTIVE} active, {len(_queue)} queued "
+        f"(max {stats['max_depth']}); {stats['admitted']} admitted, "
+        f"{stats['queued']} had to wait, {stats['shed']} shed, "
+        f"{stats['timed_out']} timed out"
+    )
@@ -1,7 +1,6 @@
 import os
 import yaml
 import imagehash
-import httpx
 import logging
 import asyncio
 import re
@@ -12,7 +11,7 @@ from PIL import Image
 from telethon import TelegramClient, events, types
 from telethon.tl.functions.messages import GetForumTopicsRequest
 from telethon.tl.types import Message
-from utils import firebase_db, globals as g
+from utils import firebase_db_aio, http_clients, metrics, globals as g
 
 # from .firebase_mgr import FirebaseManager
 from utils.aggregator_service.ai_mgr import AIManager
@@ -38,7 +37,7 @@ class Aggregator:
         confessions_id: int,
     ):
         self.client = TelegramClient(session_name, api_id, api_hash)
-        self.fb = firebase_db
+        self.fb = firebase_db_aio
         self.ai = AIManager()
         self.sources: Dict[int, Any] = self.load_config()
         self.topic_cache: Dict[str, str] = {}
@@ -92,10 +91,10 @@ class Aggregator:
             }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, data=data)
-                if response.status_code != 200:
-                    logger.error(f"❌ Edit failed: {response.text}")
+            client = http_clients.get_client(url)
+            response = await client.post(url, data=data)
+            if response.status_code != 200:
+                logger.error(f"❌ Edit failed: {response.text}")
         except Exception as e:
             logger.error(f"❌ Bot Editing Error: {e}")
 
@@ -106,16 +105,16 @@ class Aggregator:
 
         url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
         try:
-            async with httpx.AsyncClient() as client:
-                data = {
-                    "chat_id": self.dest_id,
-                    "text": text,
-                    "parse_mode": "HTML",
-                }
-                response = await client.post(url, data=data)
-                if response.status_code == 200:
-                    return response.json()["result"]["message_id"]
-                return None
+            client = http_clients.get_client(url)
+            data = {
+                "chat_id": self.dest_id,
+                "text": text,
+                "parse_mode": "HTML",
+            }
+            response = await client.post(url, data=data)
+            if response.status_code == 200:
+                return response.json()["result"]["message_id"]
+            return None
         except Exception as e:
             logger.error(f"❌ Bot Text Forwarding Error: {e}")
             return None
@@ -133,19 +132,19 @@ class Aggregator:
             field = "document"
 
         try:
-            async with httpx.AsyncClient() as client:
-                with open(path, "rb") as f:
-                    data = {
-                        "chat_id": self.dest_id,
-                        "caption": caption,
-                        "parse_mode": "HTML",
-                    }
-                    response = await client.post(url, files={field: f}, data=data)
-                    return (
-                        response.json()["result"]["message_id"]
-                        if response.status_code == 200
-                        else None
-                    )
+            client = http_clients.get_client(url)
+            with open(path, "rb") as f:
+                data = {
+                    "chat_id": self.dest_id,
+                    "caption": caption,
+                    "parse_mode": "HTML",
+                }
+                response = await client.post(url, files={field: f}, data=data)
+                return (
+                    response.json()["result"]["message_id"]
+                    if response.status_code == 200
+                    else None
+                )
         except Exception as e:
             logger.error(f"❌ Single Media Send Error: {e}")
             return None
@@ -178,16 +177,16 @@ class Aggregator:
             files[f"file{i}"] = open(path, "rb")
 
         try:
-            async with httpx.AsyncClient() as client:
-                data = {"chat_id": self.dest_id, "media": json.dumps(media)}
-                response = await client.post(url, data=data, files=files, timeout=60.0)
+            client = http_clients.get_client(url)
+            data = {"chat_id": self.dest_id, "media": json.dumps(media)}
+            response = await client.post(url, data=data, files=files, timeout=60.0)
 
-                for f in files.values():
-                    f.close()
+            for f in files.values():
+                f.close()
 
-                if response.status_code == 200:
-                    return response.json()["result"][0]["message_id"]
-                return None
+            if response.status_code == 200:
+                return response.json()["result"][0]["message_id"]
+            return None
         except Exception as e:
             logger.error(f"❌ Bot Media Group Error: {e}")
             return None
@@ -241,7 +240,7 @@ class Aggregator:
                 return
 
             # 2. Check Database for this grouped_id (persistence)
-            if self.fb.is_album_processed(gid):
+            if await self.fb.is_album_processed(gid):
                 self.processed_grouped_ids.add(gid)
                 return
 
@@ -280,14 +279,14 @@ class Aggregator:
         is_confession = chat_id == self.confessions_id
 
         if not is_edit:
-            existing = self.fb.get_post_by_source(chat_id, message.id)
+            existing = await self.fb.get_post_by_source(chat_id, message.id)
             if existing:
                 return
 
         parent_dest_msg_id: Optional[int] = None
         parent_doc: Any = None
         if message.is_reply:
-            parent_post = self.fb.get_post_by_source(chat_id, message.reply_to_msg_id)
+            parent_post = await self.fb.get_post_by_source(chat_id, message.reply_to_msg_id)
             if parent_post:
                 parent_doc = parent_post
                 parent_data = parent_doc.to_dict()
@@ -310,7 +309,7 @@ class Aggregator:
         if local_paths:
             if not album_messages and media_type == "photo":
                 content_hash = self._generate_content_hash(local_paths[0])
-                if not is_edit and self.fb.check_duplicate(content_hash):
+                if not is_edit and await self.fb.check_duplicate(content_hash):
                     os.remove(local_paths[0])
                     return
             else:
@@ -320,7 +319,7 @@ class Aggregator:
             import hashlib
 
             content_hash = hashlib.md5(content.encode()).hexdigest()
-            if not is_edit and self.fb.check_duplicate(content_hash):
+            if not is_edit and await self.fb.check_duplicate(content_hash):
                 return
 
         content = message.message or ""
@@ -368,7 +367,7 @@ class Aggregator:
             "grouped_id": str(message.grouped_id)
             if hasattr(message, "grouped_id")
             else None,
-            "post_id": self.fb.get_next_post_id(),
+            "post_id": await self.fb.get_next_post_id(),
             "editorial_content": analysis.get("editorial_version", content),
             "original_caption": content,
             "tags": analysis.get("tags", []),
@@ -387,10 +386,10 @@ class Aggregator:
 
         if main_media_path:
             remote_path = f"aggregated/{os.path.basename(main_media_path)}"
-            post_data["image_url"] = self.fb.upload_image(main_media_path, remote_path)
+            post_data["image_url"] = await self.fb.upload_image(main_media_path, remote_path)
 
         if is_edit:
-            post = self.fb.get_post_by_source(chat_id, message.id)
+            post = await self.fb.get_post_by_source(chat_id, message.id)
             if post:
                 post_dict = post.to_dict()
                 if post_dict:
@@ -402,7 +401,7 @@ class Aggregator:
                             d_msg_id, mimi_caption, photo_path=main_media_path
                         )
                         post_data["doc_id"] = post.id
-                        self.fb.save_post(post_data)
+                        await self.fb.save_post(post_data)
         elif parent_dest_msg_id:
             if parent_doc:
                 parent_data = parent_doc.to_dict()
@@ -414,9 +413,9 @@ class Aggregator:
                         local_paths[0] if local_paths else None,
                     )
                     post_data["dest_msg_id"] = parent_dest_msg_id
-                    self.fb.save_post(post_data)
+                    await self.fb.save_post(post_data)
         else:
-            doc_id = self.fb.save_post(post_data)
+            doc_id = await self.fb.save_post(post_data)
             mimi_caption = self.format_mimi_caption(post_data)
             d_id = None
             if len(local_paths) > 1:
@@ -428,7 +427,7 @@ class Aggregator:
             else:
                 d_id = await self.forward_text_to_mimi(mimi_caption)
             if d_id:
-                self.fb.update_dest_msg(doc_id, d_id)
+                await self.fb.update_dest_msg(doc_id, d_id)
 
         logger.info(f"✅ Processed: {source_name} | {message.id}")
 
@@ -455,7 +454,7 @@ class Aggregator:
         await self.edit_mimi_message(dest_msg_id, mimi_caption, photo_path=local_path)
 
         # Save update to Firebase
-        self.fb.save_aggregated_post(
+        await self.fb.save_aggregated_post(
             {"doc_id": parent_post.id, "editorial_content": new_editorial}
         )
 
@@ -535,6 +534,9 @@ class Aggregator:
         logger.info("🎯 History sync complete.")
 
     async def start(self):
+        # Storage calls from this task (and its event handlers) count as "aggregator"
+        metrics.set_handler("aggregator")
+
         # Start User Client (Scraper)
         await self.client.start()
         logger.info("📡 User Client: Populating entity cache...")
@@ -1,10 +1,10 @@
-import requests
 import os
 import base64
 import json
 import re
 import logging
 from dotenv import load_dotenv
+from utils import http_clients
 
 load_dotenv()
 
@@ -48,7 +48,9 @@ class AIManager:
             "temperature": 0.1,
         }
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=35)
+            resp = http_clients.get_session().post(
+                url, headers=headers, json=payload, timeout=35
+            )
             if resp.status_code == 200:
                 return resp.json()["choices"][0]["message"]["content"]
             else:
@@ -174,7 +176,11 @@ Be as thorough as possible - missing details could cause AI to misunderstand use
             import asyncio
 
             response = await asyncio.to_thread(
-                requests.post, self.deepseek_url, headers=headers, json=payload, timeout=30.0
+                http_clients.get_session().post,
+                self.deepseek_url,
+                headers=headers,
+                json=payload,
+                timeout=30.0,
             )
             result = response.json()
 
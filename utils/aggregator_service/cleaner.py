@@ -1,21 +1,15 @@
 import os
-import datetime
 import time
-from utils import firebase_db
+from utils import firebase_db, metrics
 # from .firebase_mgr import FirebaseManager
 
 
 def cleanup_task():
     print("🧹 Starting 3-day local cache cleanup...")
+    metrics.set_handler("cleaner")
     fb = firebase_db
-    # old_posts = fb.get_old_posts(days=3) # We need to implement this in firebase_db if missing
-    # For now, let's just implement get_old_posts logic using existing db ref
-    cutoff = datetime.datetime.now() - datetime.timedelta(days=3)
     try:
-        old_posts = fb.db.collection("aggregated_posts") \
-            .where("created_at", "<", cutoff) \
-            .where("local_path", "!=", None) \
-            .stream()
+        old_posts = fb.get_old_local_posts(days=3)
     except Exception as e:
         print(f"Cleanup error: {e}")
         return
@@ -28,8 +22,7 @@ def cleanup_task():
         if path and os.path.exists(path):
             try:
                 os.remove(path)
-                # fb.mark_cleaned(doc.id)
-                doc.reference.update({"local_path": None})
+                fb.clear_local_path(doc.id)
                 count += 1
             except Exception as e:
                 print(f"❌ Failed to delete {path}: {e}")
@@ -3,6 +3,7 @@ from firebase_admin import credentials, firestore, storage
 import os
 import datetime
 import logging
+from utils import metrics
 
 logger = logging.getLogger("FirebaseMgr")
 
@@ -39,6 +40,7 @@ class FirebaseManager:
             logger.error(f"⚠️  Storage initialization failed: {e}")
             self.bucket = None
 
+    @metrics.timed("query", "aggregated_posts")
     def is_album_processed(self, grouped_id: int) -> bool:
         """Checks if a grouped_id has already been processed."""
         if not grouped_id:
@@ -51,6 +53,7 @@ class FirebaseManager:
         )
         return any(docs)
 
+    @metrics.timed("write", "aggregated_posts")
     def save_post(self, data):
         """Saves post metadata to Firestore with auto post_id generation."""
         doc_id = data.get("doc_id") or None
@@ -68,6 +71,7 @@ class FirebaseManager:
         doc_ref.set(data, merge=True)
         return doc_ref.id
 
+    @metrics.timed("query", "aggregated_posts")
     def get_post_by_source(self, source_id, source_msg_id):
         """Finds a post by its source group and message ID."""
         docs = (
@@ -81,6 +85,7 @@ class FirebaseManager:
             return docs[0]
         return None
 
+    @metrics.timed("query", "aggregated_posts")
     def get_post_by_id(self, post_id):
         """Find a post by post_id (user submissions) or source_msg_id (source posts)."""
         # Try post_id first (user submissions)
@@ -109,6 +114,7 @@ class FirebaseManager:
 
         return None
 
+    @metrics.timed("query", "aggregated_posts")
     def get_next_post_id(self) -> int:
         """Get next sequential post ID."""
         docs = (
@@ -122,6 +128,7 @@ class FirebaseManager:
             return docs[0].to_dict().get("post_id", 0) + 1
         return 1
 
+    @metrics.timed("write", "aggregated_posts")
     def update_dest_msg(self, doc_id, dest_msg_id):
         """Updates the destination message ID for a post."""
         self.db.collection("aggregated_posts").document(doc_id).update(
@@ -141,6 +148,7 @@ class FirebaseManager:
             print(f"❌ Storage Upload Error: {e}")
             return None
 
+    @metrics.timed("query", "aggregated_posts")
     def get_old_posts(self, days=3):
         """Retrieves posts older than N days with local paths."""
         cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
@@ -152,12 +160,14 @@ class FirebaseManager:
         )
         return docs
 
+    @metrics.timed("write", "aggregated_posts")
     def mark_cleaned(self, doc_id):
         """Updates doc to reflect local file was deleted."""
         self.db.collection("aggregated_posts").document(doc_id).update(
             {"local_path": None}
         )
 
+    @metrics.timed("query", "aggregated_posts")
     def check_duplicate(self, content_hash):
         """Checks if a content hash already exists recently."""
         if not content_hash:
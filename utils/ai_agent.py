@@ -1,27 +1,50 @@
 import os
-import httpx
 import json
 import asyncio
 import logging
 import random
+import time
 from datetime import datetime
 import pytz
 from dotenv import load_dotenv
-from utils import firebase_db, memory_sync, tools, validator, ai_tutor
+from utils import firebase_db, firebase_db_aio, memory_sync, tools, validator, context_assembly, context_window, prompt_cache, edit_scheduler, llm_usage, model_router, answer_cache
+from utils.user_state import UserStateSession
+from utils.stream_renderer import StreamRenderer, clean_output
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-BASE_URL = "https://api.deepseek.com"
-
-# Models
+# Models (endpoints, keys and fallbacks live in utils/model_router)
 CHAT_MODEL_FAST = "deepseek-chat"  # V3: Fast, standard tool calling
 CHAT_MODEL_REASONING = "deepseek-reasoner"  # R1: Slow, deep reasoning
 
 KL_TZ = pytz.timezone("Asia/Kuala_Lumpur")
 KUUMIN_ID = "1088951045"
 
+# Tools whose results are about the asker; turns using them aren't answer-cached
+PERSONAL_TOOLS = {"save_memory", "search_memory", "visualize_math"}
+# Debate styles that answer the question straight; Socratic and Contrarian
+# replies are shaped around the asker and aren't answer-cached either
+NEUTRAL_STYLES = {"Specialist"}
+
+# Tool calls from one assistant message run concurrently, up to this many at once
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", 4))
+# Per-tool deadlines in seconds. A timed-out thread is left to finish on its
+# own; the model gets an error result and carries on.
+TOOL_TIMEOUTS = {
+    "web_search": 20,
+    "web_batch_search": 40,
+    "web_fetch": 20,
+    "web_batch_fetch": 45,
+    "save_memory": 15,
+    "search_memory": 10,
+    "visualize_math": 30,
+}
+DEFAULT_TOOL_TIMEOUT = 30
+
+# Fire-and-forget writes (state commits, pruning); the loop only holds tasks weakly
+_background = set()
+
 # Reduced Tools Schema (No Memory Tools)
 TOOLS_SCHEMA = [
     {
@@ -148,37 +171,33 @@ TOOLS_SCHEMA = [
 ]
 
 
-def build_system_prompt(user_name, telegram_id, chat_type="private"):
-    # Load Global Grounding
-    try:
-        with open("prompts/global_grounding.md", "r") as f:
-            global_grounding = f.read()
-    except:
-        global_grounding = ""
-
+def build_system_prompt(telegram_id, chat_type="private"):
+    """
+    The stable part of the system prompt: byte-identical for every turn with
+    the same chat type and creator flag, so DeepSeek can serve it from its
+    prefix cache. Per-turn context goes in build_dynamic_context.
+    """
+    is_creator = str(telegram_id) == KUUMIN_ID
     # Select prompt based on chat type
     prompt_file = (
         "prompts/system_prompt_private.md"
         if chat_type == "private"
         else "prompts/system_prompt_group.md"
     )
+    template = prompt_cache.compose(
+        ("agent", chat_type, is_creator),
+        ["prompts/global_grounding.md", prompt_file],
+        lambda texts: _system_prompt_template(texts, chat_type, is_creator),
+    )
+    return template.render()
 
-    try:
-        with open(prompt_file, "r") as f:
-            base_prompt = f.read()
-    except:
-        base_prompt = "You are Mimi, a helpful tutor."
 
-    # Dynamic Replacements
-    now = datetime.now(KL_TZ)
-    base_prompt = base_prompt.replace("{{current_date}}", now.strftime("%Y-%m-%d"))
-    base_prompt = base_prompt.replace("{{current_time}}", now.strftime("%H:%M"))
-    base_prompt = base_prompt.replace("{{user}}", user_name)
+def _system_prompt_template(texts, chat_type, is_creator):
+    """The static part of the system prompt for one (chat_type, is_creator) pair."""
+    global_grounding = texts[0] or ""
+    base_prompt = texts[1] if texts[1] is not None else "You are Mimi, a helpful tutor."
 
     # Security & Context Logic
-    security_protocol = ""
-    is_creator = str(telegram_id) == KUUMIN_ID
-
     if not is_creator:
         security_protocol = (
             "\nSECURITY PROTOCOL:\n"
@@ -192,7 +211,32 @@ def build_system_prompt(user_name, telegram_id, chat_type="private"):
     if chat_type != "private":
         env_context += " Prioritize the community."
 
-    return f"{global_grounding}\n\n{base_prompt}\n{security_protocol}\n{env_context}"
+    formatting_check = (
+        "\n\n=== FINAL FORMATTING CHECK ===\n"
+        "Your output MUST be valid HTML. Markdown is strictly FORBIDDEN.\n"
+        "CORRECT: <i>actions</i>, <b>bold</b>, <code>code</code>\n"
+        "WRONG: *actions*, **bold**, `code`\n"
+        "ESCAPE: Use &lt; for < and &gt; for > (e.g. x &lt; 5)."
+    )
+
+    return f"{global_grounding}\n\n{base_prompt}\n{security_protocol}\n{env_context}{formatting_check}"
+
+
+def build_dynamic_context(telegram_id, session, reminiscence):
+    """The per-turn tail of the system prompt: time, debate roll, academics, memories."""
+    now = datetime.now(KL_TZ)
+    dynamic = f"\n\n=== CURRENT CONTEXT ===\nDate: {now:%Y-%m-%d}\nTime: {now:%H:%M}"
+
+    # Inject Debate/Personality Instructions
+    dynamic += get_debate_instructions(telegram_id, session)
+
+    # Inject Academic Context
+    dynamic += f"\n\n=== ACADEMIC CONTEXT ===\n{get_academic_context()}"
+
+    # Reminiscence (Optional - kept for context but disabled tools)
+    if reminiscence:
+        dynamic += f"\n\n{reminiscence}"
+    return dynamic
 
 
 import re
@@ -200,12 +244,11 @@ import re
 # ... (Existing Imports)
 
 
-def get_academic_context():
+def get_academic_week():
     """
-    Calculates the current academic week and topics for PASUM Semester II.
+    Current week of PASUM Semester II.
     Sem II Start: Dec 29, 2025.
     Breaks: Feb 16-22 (CNY/Mid-Sem Break).
-    Today: Jan 23, 2026.
     """
     start_date = datetime(2025, 12, 29, tzinfo=KL_TZ)
     now = datetime.now(KL_TZ)
@@ -215,7 +258,12 @@ def get_academic_context():
     # Simple Week Calculation (ignoring breaks for MVP, or handle break logic)
     # Week 1 started Dec 29.
     # Jan 23 is day 25. 25 // 7 = 3. So it is Week 4 (0-based index 3 -> Week 4).
-    week_num = (delta_days // 7) + 1
+    return (delta_days // 7) + 1
+
+
+def get_academic_context():
+    """Calculates the current academic week and topics for PASUM Semester II."""
+    week_num = get_academic_week()
 
     # Topic Mapping (Hardcoded from Vault Data for MVP reliability)
     topics = {
@@ -248,21 +296,26 @@ def get_academic_context():
     return f"ACADEMIC STATUS: Semester II, Week {week_num}."
 
 
-def get_debate_instructions(telegram_id):
+def get_debate_instructions(telegram_id, session=None):
     """
     Rolls logic for Mimi's debate personality.
     Incorporates Favourability Score.
-    Returns: (instruction_string, state_dict)
+    Reads and updates the turn's UserStateSession; nothing is written here
+    unless no session is passed in.
+    Returns: instruction_string
     """
     is_creator = str(telegram_id) == KUUMIN_ID
+    owns_session = session is None
+    if owns_session:
+        session = UserStateSession.load(telegram_id)
 
     # 0. Get Favourability
-    favourability = firebase_db.get_user_favourability(telegram_id)
+    favourability = session.favourability
     if is_creator:
         favourability = 100
 
     # 1. Retrieve or Initialize State
-    state = firebase_db.get_debate_state(telegram_id)
+    state = session.debate_state
     if not state:
         state = {"value": 50, "style": "Socratic", "turns": 0, "persona": "Normal"}
 
@@ -304,8 +357,10 @@ def get_debate_instructions(telegram_id):
     else:
         state["turns"] -= 1
 
-    # 3. Save State
-    firebase_db.update_debate_state(telegram_id, state)
+    # 3. Save State (committed with the rest of the turn)
+    session.set_debate_state(state)
+    if owns_session:
+        session.commit()
 
     # 4. Generate Instructions
     instructions = "\n\n=== DEBATE & PERSONALITY MODE ===\n"
@@ -358,6 +413,30 @@ def get_debate_instructions(telegram_id):
     return instructions
 
 
+async def execute_tool_with_timeout(name, args, user_id=None):
+    """execute_tool with the tool's deadline; a timeout becomes an error result."""
+    timeout = TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT)
+    try:
+        return await asyncio.wait_for(execute_tool(name, args, user_id), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Tool {name} timed out after {timeout:g}s")
+        return f"Error: {name} timed out after {timeout:g}s. Answer with what you have."
+
+
+async def run_tool_calls(tool_calls, run_call):
+    """
+    Runs run_call(tc) for one assistant message's tool calls concurrently,
+    at most TOOL_CONCURRENCY at a time. Results come back in tool_call order.
+    """
+    limiter = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+    async def limited(tc):
+        async with limiter:
+            return await run_call(tc)
+
+    return await asyncio.gather(*(limited(tc) for tc in tool_calls))
+
+
 async def execute_tool(name, args, user_id=None):
     # Wrap synchronous tool calls in asyncio.to_thread
     if name == "web_search":
@@ -390,43 +469,149 @@ async def execute_tool(name, args, user_id=None):
     return "Error: Unknown tool or disabled."
 
 
-async def stream_ai_response(update, context, status_msg, user_message, chat_id=None):
+async def _assemble_context(update, status_msg, user_message, chat_id):
+    """
+    Starts everything the turn needs before the first LLM byte at once:
+    the splash message (if still being sent), the user's state, prompt
+    files, history and reminiscence. Reminiscence and history have deadlines
+    (see utils/context_assembly) and are dropped rather than waited on.
+    """
     telegram_id = update.effective_user.id
-    user_name = update.effective_user.first_name or "Student"
-
-    # Default to user_id if chat_id not provided
     target_chat_id = chat_id if chat_id else telegram_id
     chat_type = update.effective_chat.type if update.effective_chat else "private"
 
-    # 1. Prepare Context
-    system_prompt = build_system_prompt(user_name, telegram_id, chat_type)
+    sources = [
+        context_assembly.Source("session", UserStateSession.aload(telegram_id)),
+        context_assembly.Source(
+            "prompt",
+            asyncio.to_thread(build_system_prompt, telegram_id, chat_type),
+        ),
+        context_assembly.Source(
+            "history",
+            firebase_db_aio.get_recent_context(
+                telegram_id, chat_id=target_chat_id, limit=20
+            ),
+            deadline=context_assembly.HISTORY_DEADLINE,
+            default=[],
+        ),
+        context_assembly.Source(
+            "reminiscence",
+            asyncio.to_thread(
+                memory_sync.get_proactive_reminiscence, telegram_id, user_message
+            ),
+            deadline=context_assembly.REMINISCENCE_DEADLINE,
+            default="",
+        ),
+    ]
+    # Opt-in answer cache: looked up alongside everything else, never waited on long.
+    # DMs only; group answers are written around other students' messages.
+    question = None
+    if answer_cache.ENABLED and chat_type == "private":
+        question = answer_cache.question_for(update, user_message)
+    answer_key = None
+    if question:
+        answer_key = (answer_cache.scope_for(chat_type, get_academic_week()), question)
+        sources.append(
+            context_assembly.Source(
+                "answer",
+                asyncio.to_thread(answer_cache.lookup, *answer_key),
+                deadline=answer_cache.LOOKUP_DEADLINE,
+                default=(None, None),
+            )
+        )
+    if asyncio.isfuture(status_msg):
+        sources.append(context_assembly.Source("status", status_msg))
+    values, timings = await context_assembly.gather(*sources)
+    values.setdefault("status", status_msg)
+    values.setdefault("answer", (None, None))
+    values["answer_key"] = answer_key
+    print(f"DEBUG: Context for {telegram_id}: {context_assembly.format_timings(timings)}")
+    return values
 
-    # Inject Debate/Personality Instructions
-    debate_instructions = get_debate_instructions(telegram_id)
-    system_prompt += debate_instructions
 
-    # Inject Academic Context
-    academic_context = get_academic_context()
-    system_prompt += f"\n\n=== ACADEMIC CONTEXT ===\n{academic_context}"
+async def stream_ai_response(update, context, status_msg, user_message, chat_id=None):
+    """
+    Runs one agent turn. The user's document is read once up front and all
+    state changes from the turn are committed in a single write afterwards.
+    `status_msg` may be the splash message or a task still sending it.
+    """
+    user = update.effective_user
+    assembled = await _assemble_context(update, status_msg, user_message, chat_id)
+    session = assembled["session"]
+    session.touch(name=user.full_name, username=user.username)
+    try:
+        cached, _ = assembled["answer"]
+        if cached:
+            answer = answer_cache.personalize(cached, user.first_name or "Student")
+            await edit_scheduler.finish(assembled["status"], answer, parse_mode="HTML")
+            _log_turn(update, chat_id, user_message, answer)
+            return
+        await _run_agent_turn(
+            update, context, assembled["status"], user_message, chat_id, session, assembled
+        )
+    finally:
+        _spawn(session.acommit())
 
-    # Reminiscence (Optional - kept for context but disabled tools)
-    reminiscence = memory_sync.get_proactive_reminiscence(telegram_id, user_message)
-    if reminiscence:
-        system_prompt += f"\n\n{reminiscence}"
 
-    system_prompt += (
-        "\n\n=== FINAL FORMATTING CHECK ===\n"
-        "Your output MUST be valid HTML. Markdown is strictly FORBIDDEN.\n"
-        "CORRECT: <i>actions</i>, <b>bold</b>, <code>code</code>\n"
-        "WRONG: *actions*, **bold**, `code`\n"
-        "ESCAPE: Use &lt; for < and &gt; for > (e.g. x &lt; 5)."
+def _neutral_persona(session):
+    """
+    True if this turn's debate roll (see get_debate_instructions) was neutral:
+    normal persona, balanced intensity, a straight-answer style and a bond
+    in the unbiased 30-75 range.
+    """
+    state = session.debate_state
+    return (
+        state.get("persona", "Normal") == "Normal"
+        and 30 < state.get("value", 50) <= 70
+        and state.get("style") in NEUTRAL_STYLES
+        and 30 <= session.favourability <= 75
     )
 
-    # Load recent history (INCREASED TO 20)
-    history = firebase_db.get_recent_context(
-        telegram_id, chat_id=target_chat_id, limit=20
+
+def _spawn(coro):
+    """Runs `coro` in the background, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def _log_turn(update, chat_id, user_message, answer):
+    """Logs the question and answer to the chat's scope (pruning runs in the background)."""
+    telegram_id = update.effective_user.id
+    target_chat_id = chat_id if chat_id else telegram_id
+    _spawn(firebase_db_aio.prune_conversation(telegram_id, chat_id=target_chat_id))
+    firebase_db.log_conversation(
+        telegram_id,
+        "user",
+        user_message,
+        chat_id=target_chat_id,
+        user_name=update.effective_user.first_name or "Student",
+    )
+    firebase_db.log_conversation(
+        telegram_id, "assistant", answer, chat_id=target_chat_id, user_name="Mimi"
+    )
+
+
+async def _run_agent_turn(
+    update, context, status_msg, user_message, chat_id, session, assembled
+):
+    telegram_id = update.effective_user.id
+    user_name = update.effective_user.first_name or "Student"
+
+    # Default to user_id if chat_id not provided
+    target_chat_id = chat_id if chat_id else telegram_id
+
+    # 1. Prepare Context (prompt, history and reminiscence come from _assemble_context).
+    # Stable prefix first, volatile block last, so the prefix cache keeps hitting.
+    stable_prompt = assembled["prompt"]
+    system_prompt = stable_prompt + build_dynamic_context(
+        telegram_id, session, assembled["reminiscence"]
     )
-    messages = [{"role": "system", "content": system_prompt}]
+
+    # Recent history (INCREASED TO 20); trimmed to the model's token budget
+    # by context_window.build on every request
+    history = assembled["history"]
+    history_messages = []
     for h in history:
         role = h.get("role", "user")
         name = h.get("user_name")
@@ -439,201 +624,222 @@ async def stream_ai_response(update, context, status_msg, user_message, chat_id=
         else:
             formatted_content = content
 
-        messages.append({"role": role, "content": formatted_content})
-    messages.append(
+        history_messages.append({"role": role, "content": formatted_content})
+    # This turn: the user's message, then assistant tool calls and results
+    turn_messages = [
         {
             "role": "user",
             "content": f"[{user_name}] (ID: {telegram_id}): {user_message}",
         }
-    )
+    ]
 
     # 2. API Call Loop
     final_response = ""
 
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
     current_turn = 0
     max_turns = 5  # Increased Limit: 5 turns for deeper research
     search_count = 0
+    used_tools = set()
 
     # Start with FAST model for conversation/routing
     current_model = CHAT_MODEL_FAST
 
     while current_turn <= max_turns:
+        messages, breakdown = context_window.build(
+            system_prompt, history_messages, turn_messages, current_model
+        )
+        print(f"DEBUG: Context {context_window.format_breakdown(breakdown)}")
         payload = {
             "model": current_model,
             "messages": messages,
             "tools": TOOLS_SCHEMA,
             "stream": True,
+            "stream_options": {"include_usage": True},
             "temperature": 0.6,
         }
 
         buffer = ""
+        renderer = StreamRenderer()  # sanitized preview of `buffer`, built incrementally
         tool_calls = []
         current_tool_id = None
         current_tool_name = None
         current_tool_args = ""
 
         is_thinking = False
-        thinking_buffer = ""
+        thinking_parts = []
+        thinking_chars = 0
         is_tool_streaming = False
 
         # UI State
         last_ui_update = 0
 
+        # Usage arrives in the last chunk (prompt_cache_hit/miss_tokens)
+        usage = None
+        started = time.perf_counter()
+        first_token_at = None
+
+        # The router picks a healthy model/endpoint for this step, hedging
+        # to the next one if the first token is slow
+        step = "reasoning" if current_model == CHAT_MODEL_REASONING else "chat"
+        try:
+            stream = await model_router.open_stream(step, payload)
+        except Exception as e:
+            logger.error(f"All model routes failed: {e}")
+            await edit_scheduler.finish(status_msg, "Brain Error: my models are unreachable right now.")
+            return
+        if stream.route.model != current_model:
+            print(f"DEBUG: Routed {current_model} -> {stream.route.name} ({stream.route.model})")
+
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                async with client.stream(
-                    "POST",
-                    f"{BASE_URL}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                ) as response:
-                    if response.status_code != 200:
-                        await status_msg.edit_text(
-                            f"Brain Error: {response.status_code}"
-                        )
-                        return
-
-                    async for line in response.aiter_lines():
-                        if not line.startswith("data: "):
+            async with stream:
+                async for line in stream.lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[6:]
+                    if data == "[DONE]":
+                        break
+
+                    try:
+                        chunk = json.loads(data)
+                        if chunk.get("usage"):
+                            usage = chunk["usage"]
+                        if not chunk.get("choices"):
+                            continue
+                        delta = chunk["choices"][0].get("delta", {})
+                        if first_token_at is None and delta:
+                            first_token_at = time.perf_counter()
+
+                        # 1. Reasoning Phase (Only for R1 model)
+                        reasoning = delta.get("reasoning_content")
+                        if reasoning:
+                            is_thinking = True
+                            thinking_parts.append(reasoning)
+                            thinking_chars += len(reasoning)
+                            now = asyncio.get_event_loop().time()
+                            if now - last_ui_update > edit_scheduler.PREVIEW_INTERVAL:
+                                edit_scheduler.submit(
+                                    status_msg,
+                                    f"🧠 Thinking... ({thinking_chars // 10} tokens)",
+                                )
+                                last_ui_update = now
                             continue
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
 
-                        try:
-                            chunk = json.loads(data)
-                            delta = chunk["choices"][0].get("delta", {})
-
-                            # 1. Reasoning Phase (Only for R1 model)
-                            reasoning = delta.get("reasoning_content")
-                            if reasoning:
-                                is_thinking = True
-                                thinking_buffer += reasoning
-                                now = asyncio.get_event_loop().time()
-                                if now - last_ui_update > 2.0:
-                                    await status_msg.edit_text(
-                                        f"🧠 Thinking... ({len(thinking_buffer) // 10} tokens)"
-                                    )
-                                    last_ui_update = now
+                        # 2. Content Phase
+                        content = delta.get("content")
+                        if content:
+                            if is_thinking:
+                                is_thinking = False
+                                edit_scheduler.submit(status_msg, "💡")
+
+                            buffer += content
+                            renderer.feed(content)
+
+                            if is_tool_streaming:
                                 continue
 
-                            # 2. Content Phase
-                            content = delta.get("content")
-                            if content:
-                                if is_thinking:
-                                    is_thinking = False
-                                    await status_msg.edit_text("💡")
-
-                                buffer += content
-
-                                if is_tool_streaming:
-                                    continue
-
-                                # Update UI for content
-                                now = asyncio.get_event_loop().time()
-                                if now - last_ui_update > 1.5:
-                                    # Use smart escaping for HTML
-                                    clean = ai_tutor.clean_output(buffer, escape=True)
-                                    # Append cursor
-                                    try:
-                                        await status_msg.edit_text(
-                                            clean + "▌", parse_mode="HTML"
+                            # Update UI for content
+                            now = asyncio.get_event_loop().time()
+                            if now - last_ui_update > edit_scheduler.PREVIEW_INTERVAL:
+                                # Use smart escaping for HTML, append cursor;
+                                # the scheduler decides when it actually goes out
+                                clean = renderer.render()
+                                edit_scheduler.submit(
+                                    status_msg, clean + "▌", parse_mode="HTML"
+                                )
+                                last_ui_update = now
+
+                        # 3. Tool Call Phase
+                        if "tool_calls" in delta:
+                            if not is_tool_streaming:
+                                is_tool_streaming = True
+                                edit_scheduler.submit(status_msg, "⚙️ Working...")
+
+                            for tc in delta["tool_calls"]:
+                                if "id" in tc:
+                                    if current_tool_id:
+                                        tool_calls.append(
+                                            {
+                                                "id": current_tool_id,
+                                                "type": "function",
+                                                "function": {
+                                                    "name": current_tool_name,
+                                                    "arguments": current_tool_args,
+                                                },
+                                            }
                                         )
-                                    except Exception:
-                                        # Fallback to plain text if parsing still fails
-                                        try:
-                                            await status_msg.edit_text(clean + "▌")
-                                        except:
-                                            pass
-                                    last_ui_update = now
-
-                            # 3. Tool Call Phase
-                            if "tool_calls" in delta:
-                                if not is_tool_streaming:
-                                    is_tool_streaming = True
-                                    await status_msg.edit_text("⚙️ Working...")
-
-                                for tc in delta["tool_calls"]:
-                                    if "id" in tc:
-                                        if current_tool_id:
-                                            tool_calls.append(
-                                                {
-                                                    "id": current_tool_id,
-                                                    "type": "function",
-                                                    "function": {
-                                                        "name": current_tool_name,
-                                                        "arguments": current_tool_args,
-                                                    },
-                                                }
-                                            )
-                                        current_tool_id = tc["id"]
-                                        current_tool_name = tc["function"]["name"]
-                                        current_tool_args = ""
-
-                                    if (
-                                        "function" in tc
-                                        and "arguments" in tc["function"]
-                                    ):
-                                        current_tool_args += tc["function"]["arguments"]
-
-                        except Exception:
-                            pass
-
-                    # Flush last tool
-                    if current_tool_id:
-                        tool_calls.append(
-                            {
-                                "id": current_tool_id,
-                                "type": "function",
-                                "function": {
-                                    "name": current_tool_name,
-                                    "arguments": current_tool_args,
-                                },
-                            }
-                        )
+                                    current_tool_id = tc["id"]
+                                    current_tool_name = tc["function"]["name"]
+                                    current_tool_args = ""
+
+                                if (
+                                    "function" in tc
+                                    and "arguments" in tc["function"]
+                                ):
+                                    current_tool_args += tc["function"]["arguments"]
+
+                    except Exception:
+                        pass
+
+                # Flush last tool
+                if current_tool_id:
+                    tool_calls.append(
+                        {
+                            "id": current_tool_id,
+                            "type": "function",
+                            "function": {
+                                "name": current_tool_name,
+                                "arguments": current_tool_args,
+                            },
+                        }
+                    )
 
         except Exception as e:
             logger.error(f"Stream error: {e}")
-            await status_msg.edit_text("Connection glitch.")
+            model_router.report_failure(stream)
+            await edit_scheduler.finish(status_msg, "Connection glitch.")
             return
 
+        llm_usage.record(
+            stream.route.model,
+            usage,
+            first_token_seconds=first_token_at - started if first_token_at else None,
+            seconds=time.perf_counter() - started,
+            prefix=stable_prompt,
+        )
+
         # Handle Results
         if tool_calls:
-            messages.append(
+            turn_messages.append(
                 {
                     "role": "assistant",
                     "content": buffer if buffer else None,
-                    "reasoning_content": thinking_buffer if thinking_buffer else "",
+                    "reasoning_content": "".join(thinking_parts),
                     "tool_calls": tool_calls,
                 }
             )
 
-            # Check Search Limit
+            # Check Search Limit (decided in call order, before anything runs)
+            blocked = {}
             for tc in tool_calls:
                 fn_name = tc["function"]["name"]
 
                 # Search Limiter
                 if "web_search" in fn_name or "batch_search" in fn_name:
                     if search_count >= 1:
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": tc["id"],
-                                "name": fn_name,
-                                "content": "Error: Search limit reached (Max 1 per query). Use web_fetch or answer now.",
-                            }
-                        )
+                        blocked[tc["id"]] = "Error: Search limit reached (Max 1 per query). Use web_fetch or answer now."
                         continue
                     search_count += 1
 
+            async def run_call(tc):
+                fn_name = tc["function"]["name"]
+                if tc["id"] in blocked:
+                    return blocked[tc["id"]]
+
                 try:
                     args = json.loads(tc["function"]["arguments"])
-                    result = await execute_tool(fn_name, args, user_id=telegram_id)
+                    result = await execute_tool_with_timeout(
+                        fn_name, args, user_id=telegram_id
+                    )
 
                     # Handle visualizer image delivery
                     if (
@@ -643,8 +849,8 @@ async def stream_ai_response(update, context, status_msg, user_message, chat_id=
                     ):
                         try:
                             # Use original status message context for feedback
-                            await status_msg.edit_text(
-                                "🖌️ Sketching complete! Delivering..."
+                            edit_scheduler.submit(
+                                status_msg, "🖌️ Sketching complete! Delivering..."
                             )
 
                             with open(result, "rb") as photo:
@@ -665,13 +871,19 @@ async def stream_ai_response(update, context, status_msg, user_message, chat_id=
 
                 except Exception as e:
                     result = f"Error: {e}"
+                return str(result)
 
-                messages.append(
+            results = await run_tool_calls(tool_calls, run_call)
+
+            # Results go back in tool_call order
+            used_tools.update(tc["function"]["name"] for tc in tool_calls)
+            for tc, result in zip(tool_calls, results):
+                turn_messages.append(
                     {
                         "role": "tool",
                         "tool_call_id": tc["id"],
-                        "name": fn_name,
-                        "content": str(result),
+                        "name": tc["function"]["name"],
+                        "content": context_window.cap_tool_result(result),
                     }
                 )
 
@@ -685,7 +897,7 @@ async def stream_ai_response(update, context, status_msg, user_message, chat_id=
             break
 
     # Final Cleanup
-    cleaned = ai_tutor.clean_output(final_response, escape=True)
+    cleaned = clean_output(final_response, escape=True)
 
     # Process Bond Tags
     bond_change = 0
@@ -697,37 +909,27 @@ async def stream_ai_response(update, context, status_msg, user_message, chat_id=
         cleaned = cleaned.replace("[BOND: -5]", "")
 
     if bond_change != 0:
-        firebase_db.update_user_favourability(telegram_id, bond_change)
+        session.adjust_favourability(bond_change)
 
     cleaned = cleaned.strip()
 
     if cleaned:
-        try:
-            await status_msg.edit_text(cleaned, parse_mode="HTML")
-        except Exception:
-            # Fallback to plain text if parsing still fails
-            try:
-                await status_msg.edit_text(cleaned)
-            except:
-                pass
-        # Log to correct Chat Scope
-        firebase_db.prune_conversation(telegram_id, chat_id=target_chat_id)
-        firebase_db.log_conversation(
-            telegram_id,
-            "user",
-            user_message,
-            chat_id=target_chat_id,
-            user_name=user_name,
-        )
-        firebase_db.log_conversation(
-            telegram_id, "assistant", cleaned, chat_id=target_chat_id, user_name="Mimi"
-        )
+        # Falls back to plain text if parsing still fails
+        await edit_scheduler.finish(status_msg, cleaned, parse_mode="HTML")
+        _log_turn(update, chat_id, user_message, cleaned)
+
+        # Only impersonal answers are reused for other students
+        answer_key = assembled["answer_key"]
+        if (
+            answer_key
+            and not used_tools & PERSONAL_TOOLS
+            and not assembled["reminiscence"]
+            and str(telegram_id) != KUUMIN_ID
+            and _neutral_persona(session)
+        ):
+            answer_cache.store(
+                *answer_key, assembled["answer"][1], cleaned, asker_name=user_name
+            )
     else:
         fallback = "🤔 (I pondered this deeply but found no words. Ask me to clarify?)"
-        try:
-            await status_msg.edit_text(fallback, parse_mode="HTML")
-        except:
-            try:
-                await status_msg.edit_text(fallback)
-            except:
-                pass
+        await edit_scheduler.finish(status_msg, fallback, parse_mode="HTML")
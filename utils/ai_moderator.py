@@ -1,8 +1,8 @@
-import httpx
 import os
 import base64
 import json
 from dotenv import load_dotenv
+from utils import http_clients
 
 load_dotenv()
 
@@ -72,14 +72,14 @@ Output JSON: {"transcription": "..."}"""
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.url, headers=headers, json=payload, timeout=60.0
-                )
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                data = json.loads(content)
-                return data.get("transcription", "")
+            client = http_clients.get_client(self.url)
+            response = await client.post(
+                self.url, headers=headers, json=payload, timeout=60.0
+            )
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+            data = json.loads(content)
+            return data.get("transcription", "")
         except Exception as e:
             print(f"❌ Vision Error: {e}")
             return ""
@@ -132,13 +132,13 @@ Output JSON: {"transcription": "..."}"""
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.url, headers=headers, json=payload, timeout=40.0
-                )
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                return json.loads(content)
+            client = http_clients.get_client(self.url)
+            response = await client.post(
+                self.url, headers=headers, json=payload, timeout=40.0
+            )
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+            return json.loads(content)
         except Exception as e:
             print(f"❌ AI Moderation Error: {e}")
             return {
@@ -165,13 +165,13 @@ Output JSON: {"transcription": "..."}"""
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.url, headers=headers, json=payload, timeout=40.0
-                )
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                return json.loads(content)
+            client = http_clients.get_client(self.url)
+            response = await client.post(
+                self.url, headers=headers, json=payload, timeout=40.0
+            )
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+            return json.loads(content)
         except Exception as e:
             print(f"❌ AI Moderation Error: {e}")
             return {
@@ -1,13 +1,12 @@
 import os
-import httpx
 import json
 import pytz
-import re
 import asyncio
 import time
 from datetime import datetime
 from dotenv import load_dotenv
-from . import firebase_db
+from . import edit_scheduler, firebase_db, http_clients, prompt_cache
+from .stream_renderer import StreamRenderer
 
 load_dotenv()
 
@@ -23,97 +22,31 @@ PERSONA_PROMPT_FILE = os.path.join(PROMPTS_DIR, "system_prompt.md")
 
 
 def load_file(path):
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return f.read().strip()
-        except:
-            pass
-    return ""
-
-
-def build_system_prompt(user_name="Student"):
-    global_rules = load_file(GLOBAL_PROMPT_FILE)
-    persona = load_file(PERSONA_PROMPT_FILE)
+    return prompt_cache.get_text(path).strip()
 
-    now = datetime.now(KL_TZ)
-    time_context = f"Current: {now.strftime('%H:%M')} | {now.strftime('%A')}"
 
+def _tutor_prompt_template(texts):
+    global_rules, persona = ((text or "").strip() for text in texts)
     no_links = (
         "ABSOLUTE PRIORITY: NEVER output links/URLs/web addresses.\n"
         "Explain concepts yourself. No http://, https://, www., markdown links.\n"
     )
-
-    persona = persona.replace("{{user}}", user_name)
-    persona = persona.replace("{{current_date}}", now.strftime("%Y-%m-%d"))
-    persona = persona.replace("{{current_time}}", now.strftime("%H:%M"))
-
+    time_context = "Current: {{current_time}} | {{current_day}}"
     format_note = "\nUse HTML: <b>bold</b>, <i>italics</i>, <code>code</code>"
-
     return f"{no_links}\n{time_context}\n\n{global_rules}\n\n{persona}\n\n{format_note}"
 
 
-def clean_output(text, escape=True):
-    patterns = [
-        (r"https?://\S+", "[Link Removed]"),
-        (r"\[.+?\]\(.+?\)", "[Link Removed]"),
-        (r"www\.\S+", "[Link Removed]"),
-        (r"\.(com|org|edu|gov|net|io)\S*", "[Link Removed]"),
-        (r"(?i)khanacademy\.org", "[Link Removed]"),
-        (r"(?i)wikipedia\.org", "[Link Removed]"),
-        (r"(?i)youtube\.com", "[Link Removed]"),
-    ]
-    for pattern, replacement in patterns:
-        text = re.sub(pattern, replacement, text)
-
-    if escape:
-        return escape_html(text).strip()
-    return text.strip()
-
-
-def escape_html(text):
-    """
-    Smart HTML escaping: Escapes stray < and > characters but preserves
-    supported Telegram HTML tags.
-    """
-    valid_tags = [
-        "b",
-        "strong",
-        "i",
-        "em",
-        "u",
-        "ins",
-        "s",
-        "strike",
-        "del",
-        "code",
-        "pre",
-        "blockquote",
-        "tg-spoiler",
-        "a",
-    ]
-    tag_pattern = r"<(/?(" + "|".join(valid_tags) + r")(?:\s+[^>]*)?)>"
-
-    # 1. Escape all & first
-    text = text.replace("&", "&amp;")
-
-    # 2. Protect valid tags using placeholders
-    placeholders = []
-
-    def save_tag(match):
-        placeholders.append(match.group(0))
-        return f"__HTML_TAG_{len(placeholders) - 1}__"
-
-    protected_text = re.sub(tag_pattern, save_tag, text, flags=re.IGNORECASE)
-
-    # 3. Escape remaining stray brackets
-    escaped_text = protected_text.replace("<", "&lt;").replace(">", "&gt;")
-
-    # 4. Restore valid tags
-    for i, tag in enumerate(placeholders):
-        escaped_text = escaped_text.replace(f"__HTML_TAG_{i}__", tag)
-
-    return escaped_text
+def build_system_prompt(user_name="Student"):
+    template = prompt_cache.compose(
+        "tutor", [GLOBAL_PROMPT_FILE, PERSONA_PROMPT_FILE], _tutor_prompt_template
+    )
+    now = datetime.now(KL_TZ)
+    return template.render(
+        user=user_name,
+        current_date=now.strftime("%Y-%m-%d"),
+        current_time=now.strftime("%H:%M"),
+        current_day=now.strftime("%A"),
+    )
 
 
 def get_sliding_window_context(telegram_id, limit=10):
@@ -172,56 +105,58 @@ async def stream_ai_response(update, context, status_msg, user_message):
 
     try:
         print(f"DEBUG: Calling OpenRouter API (streaming) with model: {CHAT_MODEL}")
-        async with httpx.AsyncClient(timeout=90.0) as client:
-            async with client.stream(
-                "POST", CHAT_ENDPOINT, headers=headers, json=payload
-            ) as response:
-                print(f"DEBUG: API Response status: {response.status_code}")
-
-                if response.status_code != 200:
-                    await status_msg.edit_text(f"API Error: {response.status_code}")
-                    return
-
-                await status_msg.edit_text("▌")
-                buffer = ""
-                last_visible = ""
-                last_update_time = asyncio.get_event_loop().time()
-                UPDATE_INTERVAL = 1.0  # Update every 1 second
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            if "choices" in chunk and len(chunk["choices"]) > 0:
-                                delta = chunk["choices"][0].get("delta", {})
-                                content = delta.get("content", "")
-                                if content:
-                                    buffer += content
-                        except json.JSONDecodeError:
-                            pass
-
-                    current_time = asyncio.get_event_loop().time()
-                    visible = clean_output(buffer) + "▌"
-                    if (
-                        visible != last_visible
-                        and (current_time - last_update_time) >= UPDATE_INTERVAL
-                    ):
-                        last_visible = visible
-                        last_update_time = current_time
-                        await status_msg.edit_text(visible, parse_mode="HTML")
-
-        final = clean_output(buffer)
+        client = http_clients.get_client(CHAT_ENDPOINT)
+        async with client.stream(
+            "POST", CHAT_ENDPOINT, headers=headers, json=payload, timeout=90.0
+        ) as response:
+            print(f"DEBUG: API Response status: {response.status_code}")
+
+            if response.status_code != 200:
+                await edit_scheduler.finish(
+                    status_msg, f"API Error: {response.status_code}"
+                )
+                return
+
+            edit_scheduler.submit(status_msg, "▌")
+            renderer = StreamRenderer()
+            last_visible = ""
+            last_update_time = asyncio.get_event_loop().time()
+
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    data = line[6:]
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        if "choices" in chunk and len(chunk["choices"]) > 0:
+                            delta = chunk["choices"][0].get("delta", {})
+                            content = delta.get("content", "")
+                            if content:
+                                renderer.feed(content)
+                    except json.JSONDecodeError:
+                        pass
+
+                current_time = asyncio.get_event_loop().time()
+                visible = renderer.render() + "▌"
+                if (
+                    visible != last_visible
+                    and (current_time - last_update_time)
+                    >= edit_scheduler.PREVIEW_INTERVAL
+                ):
+                    last_visible = visible
+                    last_update_time = current_time
+                    edit_scheduler.submit(status_msg, visible, parse_mode="HTML")
+
+        final = renderer.render()
 
         if final:
-            if final != last_visible.rstrip("▌"):
-                await status_msg.edit_text(final, parse_mode="HTML")
+            # Always sent: the last preview may still be queued, and it has the cursor
+            await edit_scheduler.finish(status_msg, final, parse_mode="HTML")
             print(f"DEBUG: Final response: {final[:100]}...")
         else:
-            await status_msg.edit_text(
-                "I couldn't generate a response. Please try again."
+            await edit_scheduler.finish(
+                status_msg, "I couldn't generate a response. Please try again."
             )
             return
 
@@ -231,7 +166,7 @@ async def stream_ai_response(update, context, status_msg, user_message):
         firebase_db.log_conversation(telegram_id, "assistant", final)
 
     except Exception as e:
-        await status_msg.edit_text(f"Error: {str(e)}")
+        await edit_scheduler.finish(status_msg, f"Error: {str(e)}")
 
 
 def generate_announcement_comment(announcement_text, user_memories):
@@ -1,7 +1,8 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
-from utils import firebase_db, ai_tutor, concurrency, vision
+from utils import firebase_db_aio, concurrency, vision
+from utils.stream_renderer import escape_html
 import asyncio
 import os
 import base64
@@ -13,7 +14,7 @@ async def announce(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
 
     # Security Check: Allow both root admin and additional admins
-    if not user or not firebase_db.is_admin(user.id):
+    if not user or not await firebase_db_aio.is_admin(user.id):
         print(f"Unauthorized /announce attempt by {user.id} ({user.first_name})")
         await update.message.reply_text(
             f"🔒 Nice try! This command is for Admin only.\nYour ID: `{user.id}`"
@@ -77,14 +78,14 @@ async def announce(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if media_type:
         log_text = f"[{media_type.upper()}] {log_text}"
 
-    firebase_db.save_announcement(log_text, user.id)
+    await firebase_db_aio.save_announcement(log_text, user.id)
 
     await update.message.reply_text(
         f"📣 Analyzing & Broadcasting... (Media: {media_type or 'None'})"
     )
 
     # --- 3. Broadcast Loop ---
-    user_ids = firebase_db.get_all_user_ids()
+    user_ids = await firebase_db_aio.get_all_user_ids()
     count = 0
     loop = asyncio.get_running_loop()
 
@@ -114,42 +115,42 @@ async def announce(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await context.bot.send_photo(
                     chat_id=uid,
                     photo=file_id,
-                    caption=ai_tutor.escape_html(final_content),
+                    caption=escape_html(final_content),
                     parse_mode="HTML",
                 )
             elif media_type == "document":
                 await context.bot.send_document(
                     chat_id=uid,
                     document=file_id,
-                    caption=ai_tutor.escape_html(final_content),
+                    caption=escape_html(final_content),
                     parse_mode="HTML",
                 )
             elif media_type == "video":
                 await context.bot.send_video(
                     chat_id=uid,
                     video=file_id,
-                    caption=ai_tutor.escape_html(final_content),
+                    caption=escape_html(final_content),
                     parse_mode="HTML",
                 )
             elif media_type == "audio":
                 await context.bot.send_audio(
                     chat_id=uid,
                     audio=file_id,
-                    caption=ai_tutor.escape_html(final_content),
+                    caption=escape_html(final_content),
                     parse_mode="HTML",
                 )
             elif media_type == "voice":
                 await context.bot.send_voice(
                     chat_id=uid,
                     voice=file_id,
-                    caption=ai_tutor.escape_html(final_content),
+                    caption=escape_html(final_content),
                     parse_mode="HTML",
                 )
             else:
                 # Text only
                 await context.bot.send_message(
                     chat_id=uid,
-                    text=ai_tutor.escape_html(final_content),
+                    text=escape_html(final_content),
                     parse_mode="HTML",
                 )
 
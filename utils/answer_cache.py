@@ -0,0 +1,221 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Semantic answer cache in front of the agent (opt-in: ANSWER_CACHE=1).
+# Stand-alone course questions ("how do I use Henderson-Hasselbalch?") are
+# normalized and embedded through mimi_embeddings; a new question whose
+# embedding is within SIMILARITY of a cached one, in the same scope (chat
+# type + academic week), is answered from the cache without a DeepSeek run.
+# The agent only stores DM answers written under a neutral persona (see
+# ai_agent), and the asker's name is stored as a placeholder and filled in
+# for whoever asks next. Entries expire after TTL; admins clear or forget
+# entries with /answercache and see hit rates in /cachestats.
+ENABLED = os.getenv("ANSWER_CACHE", "0") == "1"
+SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.93))
+TTL = float(os.getenv("ANSWER_CACHE_TTL", 3 * 24 * 3600))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 2000))
+LOOKUP_DEADLINE = 2.0  # embedding round trip; past it the turn runs uncached
+MIN_CHARS = 12
+MAX_CHARS = 400
+NAME_PLACEHOLDER = "{{asker}}"
+
+_entries = OrderedDict()  # {(scope, question): _Entry}, least recently used first
+_lock = threading.Lock()
+
+stats = {
+    "lookups": 0,
+    "exact_hits": 0,
+    "semantic_hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "expired": 0,
+    "invalidated": 0,
+}
+
+
+class _Entry:
+    __slots__ = ("vector", "answer", "expires_at")
+
+    def __init__(self, vector, answer, expires_at):
+        self.vector = vector
+        self.answer = answer
+        self.expires_at = expires_at
+
+
+# --- Keys ---
+
+
+_MENTION = re.compile(r"@\w+")
+_EDGE_PUNCTUATION = " \t\n?!.,;:"
+
+
+def normalize(text):
+    text = _MENTION.sub(" ", str(text or "")).lower()
+    return " ".join(text.split()).strip(_EDGE_PUNCTUATION)
+
+
+def question_for(update, user_message):
+    """
+    The normalized question if this turn may use the cache, else None.
+    Only plain text questions qualify: no media, not a reply (those depend
+    on the replied-to message), and of a sensible length.
+    """
+    message = update.effective_message
+    if message is None or message.photo or message.document or message.reply_to_message:
+        return None
+    if (message.text or "") != user_message:
+        return None  # built by vision/PDF handlers
+    question = normalize(user_message)
+    if not MIN_CHARS <= len(question) <= MAX_CHARS:
+        return None
+    return question
+
+
+def scope_for(chat_type, week):
+    return f"{chat_type}:w{week}"
+
+
+def _embed(text):
+    """Embedding of `text`, or None."""
+    from utils import mimi_embeddings
+
+    return mimi_embeddings.get_embedding(text)
+
+
+def _unit(vector):
+    """`vector` as a unit-length float32 array, or None."""
+    if vector is None or not len(vector):
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def _best_match(vector, candidates):
+    """(key, score) of the closest candidate at or above SIMILARITY, else (None, 0.0)."""
+    if not candidates:
+        return None, 0.0
+    keys, vectors = zip(*candidates)
+    scores = np.stack(vectors) @ vector
+    best = int(np.argmax(scores))
+    if scores[best] < SIMILARITY:
+        return None, 0.0
+    return keys[best], float(scores[best])
+
+
+# --- Lookup / store ---
+
+
+def lookup(scope, question):
+    """
+    Returns (answer, embedding). `answer` is the cached answer template or
+    None; `embedding` is the question's vector for store() (None on an
+    exact hit or if embedding failed). Blocking: run it in a thread.
+    """
+    now = time.time()
+    with _lock:
+        stats["lookups"] += 1
+        entry = _entries.get((scope, question))
+        if entry is not None and entry.expires_at > now:
+            _entries.move_to_end((scope, question))
+            stats["exact_hits"] += 1
+            return entry.answer, None
+
+    vector = _unit(_embed(question))
+    if vector is None:
+        with _lock:
+            stats["misses"] += 1
+        return None, None
+
+    # Snapshot under the lock, score outside it
+    with _lock:
+        for key in [k for k, e in _entries.items() if e.expires_at <= now]:
+            del _entries[key]
+            stats["expired"] += 1
+        candidates = [(key, e.vector) for key, e in _entries.items() if key[0] == scope]
+    best_key, best_score = _best_match(vector, candidates)
+
+    with _lock:
+        entry = _entries.get(best_key) if best_key else None
+        if entry is None:  # no match, or evicted while scoring
+            stats["misses"] += 1
+            return None, vector
+        _entries.move_to_end(best_key)
+        stats["semantic_hits"] += 1
+        answer = entry.answer
+    print(f"DEBUG: Answer cache hit ({best_score:.3f}) for '{question[:60]}' ~ '{best_key[1][:60]}'")
+    return answer, vector
+
+
+def store(scope, question, vector, answer, asker_name=None):
+    if vector is None or not answer:
+        return
+    if asker_name:
+        # Whole words only: "Ion" must not turn "Ionic" into "{{asker}}ic"
+        answer = re.sub(rf"\b{re.escape(asker_name)}\b", NAME_PLACEHOLDER, answer)
+    with _lock:
+        _entries[(scope, question)] = _Entry(vector, answer, time.time() + TTL)
+        _entries.move_to_end((scope, question))
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+        stats["stores"] += 1
+
+
+def personalize(answer, name):
+    return answer.replace(NAME_PLACEHOLDER, name or "there")
+
+
+# --- Invalidation ---
+
+
+def clear():
+    with _lock:
+        count = len(_entries)
+        _entries.clear()
+        stats["invalidated"] += count
+    return count
+
+
+def forget(question):
+    """Drops every entry (any scope) matching `question`. Blocking; returns the count."""
+    question = normalize(question)
+    vector = _unit(_embed(question))
+    with _lock:
+        doomed = [
+            key
+            for key, entry in _entries.items()
+            if key[1] == question
+            or (vector is not None and float(entry.vector @ vector) >= SIMILARITY)
+        ]
+        for key in doomed:
+            del _entries[key]
+        stats["invalidated"] += len(doomed)
+    return len(doomed)
+
+
+def get_stats():
+    with _lock:
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        return {
+            **stats,
+            "entries": len(_entries),
+            "hit_rate": hits / stats["lookups"] if stats["lookups"] else 0.0,
+        }
+
+
+def format_stats():
+    s = get_stats()
+    state = "on" if ENABLED else "off (ANSWER_CACHE=1 to enable)"
+    return (
+        f"Answer cache ({state}): {s['hit_rate']:.0%} hit rate "
+        f"({s['exact_hits']} exact, {s['semantic_hits']} similar, {s['misses']} missed), "
+        f"{s['entries']} entries, {s['invalidated']} invalidated"
+    )
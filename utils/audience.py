@@ -0,0 +1,113 @@
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Audience index: every user ID with its last_active time, stored as one
+# tiny document per user (audience/{id}) and mirrored in memory.
+# /announce and /pasummatch read the in-memory copy. Storage is paged only
+# at startup or after REFRESH_TTL seconds. User updates keep it current,
+# writing to storage at most once per TOUCH_INTERVAL per user.
+REFRESH_TTL = float(os.getenv("AUDIENCE_CACHE_TTL", 600))
+TOUCH_INTERVAL = float(os.getenv("AUDIENCE_TOUCH_INTERVAL", 3600))
+PAGE_SIZE = int(os.getenv("AUDIENCE_PAGE_SIZE", 500))
+
+_members = {}  # {user_id: last_active}
+_touched_at = {}  # {user_id: monotonic time of the last index write}
+_loaded_at = None
+_lock = threading.Lock()
+
+
+def _backend():
+    from utils import firebase_db
+
+    return firebase_db.backend
+
+
+def _read_pages(read_page):
+    entries = []
+    while True:
+        page = read_page(PAGE_SIZE, entries[-1][0] if entries else None)
+        entries.extend(page)
+        if len(page) < PAGE_SIZE:
+            return entries
+
+
+def load():
+    """Reads the whole index page by page; builds it from users if it is empty."""
+    global _loaded_at
+    backend = _backend()
+    entries = _read_pages(backend.audience_page)
+    if not entries:
+        # First run: project last_active out of users and persist the index
+        entries = _read_pages(backend.user_activity_page)
+        if entries:
+            backend.put_audience(entries)
+            print(f"DEBUG: Firestore: Built audience index ({len(entries)} users)")
+    with _lock:
+        _members.clear()
+        _members.update((str(uid), ts) for uid, ts in entries)
+        _loaded_at = time.monotonic()
+    return len(entries)
+
+
+def is_fresh():
+    """True if reads can be answered from memory."""
+    return _loaded_at is not None and time.monotonic() - _loaded_at <= REFRESH_TTL
+
+
+def _ensure_loaded():
+    if not is_fresh():
+        load()
+
+
+def all_ids():
+    _ensure_loaded()
+    with _lock:
+        return list(_members)
+
+
+def sample(k, exclude=None):
+    """Up to `k` random user IDs, skipping `exclude`."""
+    _ensure_loaded()
+    with _lock:
+        pool = [uid for uid in _members if uid != str(exclude)]
+    return random.sample(pool, min(k, len(pool)))
+
+
+def note_active(user_id, last_active):
+    """
+    Records activity in memory. Returns True when the stored index entry
+    is due a write (new user, or not written for TOUCH_INTERVAL).
+    """
+    user_id = str(user_id)
+    now = time.monotonic()
+    with _lock:
+        known = user_id in _members
+        _members[user_id] = last_active
+        last_write = _touched_at.get(user_id)
+        if known and last_write is not None and now - last_write < TOUCH_INTERVAL:
+            return False
+        if known and last_write is None and _loaded_at is not None:
+            # Loaded from storage this run; give the stored entry a full interval
+            _touched_at[user_id] = now
+            return False
+        _touched_at[user_id] = now
+        return True
+
+
+def touch(user_id, last_active):
+    """note_active plus the storage write when one is due."""
+    if note_active(user_id, last_active):
+        try:
+            _backend().put_audience([(str(user_id), last_active)])
+        except Exception as e:
+            logger.error(f"Audience index update failed for {user_id}: {e}")
+
+
+def size():
+    with _lock:
+        return len(_members)
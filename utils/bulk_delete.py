@@ -0,0 +1,83 @@
+import datetime
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Paged conversation deletion for /reset and /hardreset.
+# A purge deletes PAGE_SIZE documents per batch commit. It only removes
+# messages logged before the reset, so the user can keep chatting while the
+# purge runs in the background.
+PAGE_SIZE = int(os.getenv("BULK_DELETE_PAGE_SIZE", 400))
+
+_active = {}  # {chat_id: cutoff datetime} for purges still running
+_lock = threading.Lock()
+
+
+def purge_cutoff(chat_id):
+    """Returns the reset time if a purge of this chat is still running, else None."""
+    with _lock:
+        return _active.get(str(chat_id))
+
+
+def is_purged(chat_id, msg_data):
+    """True if a stored message belongs to history that is being deleted."""
+    cutoff = purge_cutoff(chat_id)
+    if cutoff is None:
+        return False
+    ts = msg_data.get("timestamp")
+    if ts is None:
+        return True
+    if isinstance(ts, str):
+        try:
+            ts = datetime.datetime.fromisoformat(ts)
+        except ValueError:
+            return True
+    # Firestore hands back aware UTC datetimes for the naive ones we write
+    return ts.replace(tzinfo=None) <= cutoff
+
+
+def begin(chat_id):
+    """Marks the start of a purge and returns its cutoff time."""
+    cutoff = datetime.datetime.now()
+    with _lock:
+        _active[str(chat_id)] = cutoff
+    return cutoff
+
+
+def purge_conversations(telegram_id, cutoff=None, on_progress=None):
+    """
+    Deletes a user's legacy conversations and DM history written up to
+    `cutoff` (defaults to now). Blocking; run it in a worker thread.
+    on_progress(total_so_far) is called after each page. Returns the total.
+    """
+    from utils import firebase_db
+
+    chat_id = str(telegram_id)
+    cutoff = cutoff or begin(chat_id)
+    backend = firebase_db.backend
+    total = 0
+
+    def page_done(n):
+        nonlocal total
+        total += n
+        if on_progress:
+            on_progress(total)
+
+    try:
+        backend.delete_legacy_conversations(
+            telegram_id, page_size=PAGE_SIZE, on_progress=page_done
+        )
+        if backend.get_message_count(chat_id) is None:
+            # Seed the counter first so the per-page decrements stay correct
+            backend.count_messages(chat_id)
+        backend.delete_messages(
+            chat_id, before=cutoff, page_size=PAGE_SIZE, on_progress=page_done
+        )
+    finally:
+        with _lock:
+            if _active.get(chat_id) == cutoff:
+                del _active[chat_id]
+    print(f"DEBUG: Firestore: Purged {total} messages for chat {chat_id}")
+    return total
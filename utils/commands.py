@@ -1,8 +1,61 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from . import firebase_db
+from . import firebase_db, bulk_delete
 import asyncio
 
+PROGRESS_INTERVAL = 2.0  # seconds between progress edits (Telegram rate limits)
+
+# Running purges; the loop only keeps weak references to tasks
+_purges = set()
+
+
+def _spawn(coro):
+    """Runs `coro` in the background, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _purges.add(task)
+    task.add_done_callback(_purges.discard)
+
+
+async def _purge_with_progress(message, user_id, cutoff, done_text):
+    """Deletes stored history in a worker thread, editing `message` as pages complete."""
+    progress = {"deleted": 0}
+
+    def on_progress(total):
+        progress["deleted"] = total
+
+    task = asyncio.create_task(
+        asyncio.to_thread(
+            bulk_delete.purge_conversations, user_id, cutoff, on_progress
+        )
+    )
+    shown = 0
+    while not task.done():
+        await asyncio.wait({task}, timeout=PROGRESS_INTERVAL)
+        if not task.done() and progress["deleted"] != shown:
+            shown = progress["deleted"]
+            try:
+                await message.edit_text(
+                    f"🧹 <i>Clearing history… {shown} messages removed</i>",
+                    parse_mode="HTML",
+                )
+            except Exception:
+                pass
+
+    try:
+        total = task.result()
+    except Exception as e:
+        print(f"❌ Reset purge failed for {user_id}: {e}")
+        text = (
+            f"{done_text}\n\n⚠️ Some old messages could not be removed "
+            "(they stay hidden from Mimi)."
+        )
+    else:
+        text = f"{done_text}\n\n<i>{total} stored messages removed.</i>"
+    try:
+        await message.edit_text(text, parse_mode="HTML")
+    except Exception:
+        pass
+
 
 async def soft_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -11,11 +64,11 @@ async def soft_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message:
         return
     user_id = update.effective_user.id
-    firebase_db.clear_user_conversations(user_id)
-    await update.message.reply_text(
-        "🔄 <b>Context Cleared.</b>\n\nConversation history cleared! ✨",
-        parse_mode="HTML",
-    )
+    # Mimi forgets immediately; stored messages are deleted in the background
+    cutoff = firebase_db.forget_conversation(user_id)
+    done_text = "🔄 <b>Context Cleared.</b>\n\nConversation history cleared! ✨"
+    reply = await update.message.reply_text(done_text, parse_mode="HTML")
+    _spawn(_purge_with_progress(reply, user_id, cutoff, done_text))
 
 
 async def hard_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -25,8 +78,8 @@ async def hard_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message:
         return
     user_id = update.effective_user.id
-    firebase_db.hard_reset_user_data(user_id)
-    await update.message.reply_text(
-        "🗑️ <b>Reset Complete.</b>\n\nAll data cleared! ✨",
-        parse_mode="HTML",
-    )
+    cutoff = firebase_db.forget_conversation(user_id)
+    await asyncio.to_thread(firebase_db.reset_personality, user_id)
+    done_text = "🗑️ <b>Reset Complete.</b>\n\nAll data cleared! ✨"
+    reply = await update.message.reply_text(done_text, parse_mode="HTML")
+    _spawn(_purge_with_progress(reply, user_id, cutoff, done_text))
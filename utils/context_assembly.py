@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pre-turn context assembly.
+# The sources an agent turn needs (prompt files, user state, history,
+# reminiscence, the splash message) are started together instead of one
+# after another. Optional sources have a deadline: past it, or on an error,
+# the turn goes ahead with the source's default. Required sources
+# (deadline=None) are awaited fully and their errors propagate.
+REMINISCENCE_DEADLINE = float(os.getenv("CONTEXT_REMINISCENCE_DEADLINE", 2.5))
+HISTORY_DEADLINE = float(os.getenv("CONTEXT_HISTORY_DEADLINE", 6.0))
+
+
+class Source:
+    def __init__(self, name, awaitable, deadline=None, default=None):
+        self.name = name
+        self.awaitable = awaitable
+        self.deadline = deadline
+        self.default = default
+
+
+async def _run(source):
+    start = time.perf_counter()
+    try:
+        if source.deadline is None:
+            value = await source.awaitable
+        else:
+            value = await asyncio.wait_for(source.awaitable, source.deadline)
+        status = "ok"
+    except asyncio.TimeoutError:
+        value, status = source.default, "timeout"
+    except Exception as e:
+        if source.deadline is None:
+            raise
+        logger.warning(f"Context source {source.name} failed: {e}")
+        value, status = source.default, "error"
+    return value, {"ms": round((time.perf_counter() - start) * 1000), "status": status}
+
+
+async def gather(*sources):
+    """
+    Runs `sources` concurrently. Returns (values, timings), both keyed by
+    source name; timings hold {"ms", "status"} with status ok/timeout/error.
+    """
+    results = await asyncio.gather(*(_run(source) for source in sources))
+    values = {}
+    timings = {}
+    for source, (value, timing) in zip(sources, results):
+        values[source.name] = value
+        timings[source.name] = timing
+    return values, timings
+
+
+def format_timings(timings):
+    """One-line summary, e.g. "history=120ms reminiscence=2500ms(timeout)"."""
+    return " ".join(
+        f"{name}={t['ms']}ms" + ("" if t["status"] == "ok" else f"({t['status']})")
+        for name, t in timings.items()
+    )
@@ -0,0 +1,144 @@
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# Token budget for an agent request.
+# Tokens are estimated locally (DeepSeek's tokenizer averages ~0.3 tokens
+# per ASCII character and ~0.6 per CJK/other character), so no tokenizer
+# download is needed. build() fits the system prompt, chat history and the
+# current turn (user message + tool exchange) into the model's budget:
+# long old history messages are clipped first, then the oldest are dropped,
+# then this turn's tool results are clipped, and only as a last resort the
+# user's own message. The system prompt is never touched.
+MODEL_BUDGETS = {
+    "deepseek-chat": int(os.getenv("CONTEXT_BUDGET_CHAT", 16000)),
+    "deepseek-reasoner": int(os.getenv("CONTEXT_BUDGET_REASONER", 24000)),
+}
+DEFAULT_BUDGET = 16000
+TOOL_RESULT_TOKENS = int(os.getenv("CONTEXT_TOOL_RESULT_TOKENS", 4000))
+HISTORY_CLIP_TOKENS = 150  # old history messages are shortened to this first
+RECENT_WHOLE = 4  # the newest history messages are never clipped, only dropped
+CLIP_FLOOR = 500  # tool results and the user message keep at least this much
+MESSAGE_OVERHEAD = 4  # role and separators
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    text = str(text)
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars * 0.3 + (len(text) - ascii_chars) * 0.6)
+
+
+def message_tokens(message):
+    tokens = MESSAGE_OVERHEAD + estimate_tokens(message.get("content"))
+    tokens += estimate_tokens(message.get("reasoning_content"))
+    for call in message.get("tool_calls") or []:
+        function = call.get("function", {})
+        tokens += MESSAGE_OVERHEAD + estimate_tokens(function.get("name"))
+        tokens += estimate_tokens(function.get("arguments"))
+    return tokens
+
+
+def clip(text, max_tokens):
+    """Keeps the head of `text` within roughly `max_tokens`, noting the cut."""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    marker = f"\n[... truncated ~{tokens - max_tokens} tokens ...]"
+    keep = int(len(text) * max(0, max_tokens - estimate_tokens(marker)) / tokens)
+    return text[:keep].rstrip() + marker
+
+
+def cap_tool_result(text):
+    return clip(text, TOOL_RESULT_TOKENS)
+
+
+def budget_for(model):
+    return MODEL_BUDGETS.get(model, DEFAULT_BUDGET)
+
+
+def _shrink(message, max_tokens):
+    """Clips the message's content in place; returns its new token count."""
+    content = message.get("content") or ""
+    overhead = message_tokens(message) - estimate_tokens(content)
+    message["content"] = clip(content, max(0, max_tokens - overhead))
+    return message_tokens(message)
+
+
+def build(system_prompt, history, turn, model):
+    """
+    Returns (messages, breakdown) for one request. `history` and `turn` are
+    lists of chat messages; they are copied, not modified. Assistant
+    tool_calls and their tool results are always kept together (only the
+    results' content is clipped).
+    """
+    budget = budget_for(model)
+    system = {"role": "system", "content": system_prompt}
+    history = [dict(m) for m in history]
+    turn = [dict(m) for m in turn]
+    system_tokens = message_tokens(system)
+    history_tokens = [message_tokens(m) for m in history]
+    turn_tokens = [message_tokens(m) for m in turn]
+    total = system_tokens + sum(history_tokens) + sum(turn_tokens)
+    history_total = len(history)
+    clipped = 0
+
+    # 1. Clip long old history messages, oldest first
+    for i in range(max(0, len(history) - RECENT_WHOLE)):
+        if total <= budget:
+            break
+        if history_tokens[i] > HISTORY_CLIP_TOKENS + MESSAGE_OVERHEAD:
+            new = _shrink(history[i], HISTORY_CLIP_TOKENS)
+            total -= history_tokens[i] - new
+            history_tokens[i] = new
+            clipped += 1
+
+    # 2. Drop the oldest history messages
+    dropped = 0
+    while total > budget and dropped < len(history):
+        total -= history_tokens[dropped]
+        dropped += 1
+    history = history[dropped:]
+    history_tokens = history_tokens[dropped:]
+
+    # 3. Clip this turn's tool results, then 4. the user's message
+    for roles in (("tool",), ("user",)):
+        for i, message in enumerate(turn):
+            if total <= budget:
+                break
+            if message.get("role") not in roles or turn_tokens[i] <= CLIP_FLOOR:
+                continue
+            target = max(CLIP_FLOOR, turn_tokens[i] - (total - budget))
+            new = _shrink(message, target)
+            total -= turn_tokens[i] - new
+            turn_tokens[i] = new
+            clipped += 1
+
+    if total > budget:
+        logger.warning(f"Context for {model} is {total} tokens, over its {budget} budget")
+
+    breakdown = {
+        "model": model,
+        "budget": budget,
+        "total": total,
+        "system": system_tokens,
+        "history": sum(history_tokens),
+        "history_kept": len(history),
+        "history_total": history_total,
+        "turn": sum(turn_tokens),
+        "turn_messages": len(turn),
+        "clipped": clipped,
+    }
+    return [system, *history, *turn], breakdown
+
+
+def format_breakdown(b):
+    return (
+        f"{b['model']}: system {b['system']} + history {b['history']} "
+        f"({b['history_kept']}/{b['history_total']} msgs) + turn {b['turn']} "
+        f"({b['turn_messages']} msgs) = {b['total']}/{b['budget']} tokens"
+        + (f", {b['clipped']} clipped" if b["clipped"] else "")
+    )
@@ -0,0 +1,232 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Write-behind buffer for chat messages.
+# Messages are queued per chat and handed to the storage backend in one
+# append_messages call (a WriteBatch on Firestore, one transaction per chat on
+# SQLite) once BATCH_SIZE messages are waiting or FLUSH_INTERVAL seconds have passed.
+BATCH_SIZE = int(os.getenv("CONV_LOG_BATCH_SIZE", 25))
+FLUSH_INTERVAL = float(os.getenv("CONV_LOG_FLUSH_INTERVAL", 2.0))
+# A chat whose messages fail to commit is retried with exponential backoff
+# (FLUSH_INTERVAL, 2x, 4x... up to MAX_BACKOFF); after MAX_ATTEMPTS failures
+# its failed messages are parked so later messages can go through.
+MAX_ATTEMPTS = int(os.getenv("CONV_LOG_MAX_ATTEMPTS", 5))
+MAX_BACKOFF = float(os.getenv("CONV_LOG_MAX_BACKOFF", 60.0))
+
+_pending = OrderedDict()  # {chat_id: [msg_data, ...]}
+_inflight = {}  # {chat_id: [msg_data, ...]} handed to the backend, not yet committed
+_discarded = set()  # chats reset while their batch was in flight; never requeued
+_retries = {}  # {chat_id: (failed_attempts, retry_at)}
+_parked = {}  # {chat_id: [msg_data, ...]} gave up after MAX_ATTEMPTS
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # one flush at a time (flusher thread, atexit, tests)
+_wakeup = threading.Event()
+_flusher = None
+_stopping = False
+
+stats = {
+    "enqueued": 0,
+    "written": 0,
+    "commits": 0,
+    "failed_commits": 0,
+    "parked": 0,
+    "lost": 0,
+}
+
+
+def enqueue(chat_id, msg_data):
+    """Queues a message for chats/{chat_id}/messages. Never touches the network."""
+    chat_id = str(chat_id)
+    with _lock:
+        _pending.setdefault(chat_id, []).append(msg_data)
+        stats["enqueued"] += 1
+        depth = sum(len(msgs) for msgs in _pending.values())
+
+    _ensure_flusher()
+    if depth >= BATCH_SIZE:
+        _wakeup.set()
+
+
+def queue_depth():
+    """Number of messages waiting to be written."""
+    with _lock:
+        return sum(len(msgs) for msgs in _pending.values())
+
+
+def pending_for_chat(chat_id):
+    """
+    Returns (in_flight, queued): copies of one chat's not-yet-committed
+    messages, oldest first. `in_flight` is the batch being written, which
+    may already be in storage if the commit has just landed.
+    """
+    chat_id = str(chat_id)
+    with _lock:
+        return list(_inflight.get(chat_id, [])), list(_pending.get(chat_id, []))
+
+
+def discard(chat_id):
+    """Drops unflushed messages for a chat (used by /reset)."""
+    chat_id = str(chat_id)
+    with _lock:
+        # An in-flight batch may still land (bulk_delete's cutoff hides it);
+        # if its commit fails it must not be requeued
+        if _inflight.pop(chat_id, None) is not None:
+            _discarded.add(chat_id)
+        _retries.pop(chat_id, None)
+        _parked.pop(chat_id, None)
+        return len(_pending.pop(chat_id, []))
+
+
+def get_stats():
+    with _lock:
+        snapshot = dict(stats)
+        snapshot["queue_depth"] = sum(len(msgs) for msgs in _pending.values())
+        snapshot["pending_chats"] = len(_pending)
+        snapshot["parked_chats"] = len(_parked)
+    return snapshot
+
+
+def flush():
+    """
+    Writes everything currently queued. Safe to call from any thread;
+    concurrent calls run one after another. Until the write returns, the
+    batch stays visible to pending_for_chat. Chats in retry backoff are
+    written too; the flusher thread waits for their retry time.
+    """
+    with _flush_lock:
+        return _flush()
+
+
+def _flush(now=None):
+    """Writes the queued chats (only those due for retry at `now`, if given)."""
+    from utils import firebase_db
+
+    with _lock:
+        drained = [
+            (chat_id, msgs)
+            for chat_id, msgs in _pending.items()
+            if now is None or _retries.get(chat_id, (0, 0))[1] <= now
+        ]
+        if not drained:
+            return 0
+        for chat_id, _ in drained:
+            del _pending[chat_id]
+        _inflight.update((chat_id, list(msgs)) for chat_id, msgs in drained)
+
+    total = sum(len(msgs) for _, msgs in drained)
+    try:
+        # The backend also bumps each chat's message_count so that
+        # prune_conversation can decide with a single read
+        failed = firebase_db.backend.append_messages(drained)
+    except Exception as e:
+        logger.error(f"Conversation log flush failed ({total} msgs): {e}")
+        failed = [(chat_id, m) for chat_id, msgs in drained for m in msgs]
+    written = total - len(failed)
+
+    with _lock:
+        # Committed messages are now in storage; failed ones go back to the
+        # queue in the same step, so neither is ever invisible
+        _inflight.clear()
+        failed = [(chat_id, m) for chat_id, m in failed if chat_id not in _discarded]
+        _discarded.clear()
+        failed_chats = {chat_id for chat_id, _ in failed}
+        for chat_id, _ in drained:
+            if chat_id not in failed_chats:
+                _retries.pop(chat_id, None)
+        if failed:
+            _requeue(failed)
+        stats["written"] += written
+        if written:
+            stats["commits"] += 1
+        if failed:
+            stats["failed_commits"] += 1
+    print(
+        f"DEBUG: Firestore: Flushed {written} messages across {len(drained)} chats"
+    )
+    return written
+
+
+def _requeue(items):
+    """
+    Puts messages from a failed commit back at the front of their chat
+    queues with a backoff, or parks them once a chat has failed
+    MAX_ATTEMPTS times (holds _lock).
+    """
+    if _stopping:
+        stats["lost"] += len(items)
+        logger.error(f"Conversation log: {len(items)} messages lost at shutdown")
+        return
+    by_chat = OrderedDict()
+    for chat_id, msg_data in items:
+        by_chat.setdefault(chat_id, []).append(msg_data)
+    now = time.monotonic()
+    for chat_id, msgs in by_chat.items():
+        attempts = _retries.get(chat_id, (0, 0))[0] + 1
+        if attempts >= MAX_ATTEMPTS:
+            _retries.pop(chat_id, None)
+            _parked.setdefault(chat_id, []).extend(msgs)
+            stats["parked"] += len(msgs)
+            logger.error(
+                f"Conversation log: parked {len(msgs)} messages for chat {chat_id} "
+                f"after {attempts} failed commits"
+            )
+            continue
+        backoff = min(FLUSH_INTERVAL * 2 ** (attempts - 1), MAX_BACKOFF)
+        _retries[chat_id] = (attempts, now + backoff)
+        _pending[chat_id] = msgs + _pending.get(chat_id, [])
+        _pending.move_to_end(chat_id, last=False)
+
+
+def _run():
+    metrics.set_handler("conversation_log")
+    while not _stopping:
+        _wakeup.wait(FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            with _flush_lock:
+                _flush(now=time.monotonic())
+        except Exception as e:
+            logger.error(f"Conversation log flush error: {e}")
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None or _stopping:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_run, name="MimiConvLog", daemon=True
+            )
+            _flusher.start()
+
+
+def shutdown():
+    """Stops the flusher thread and writes whatever is still queued."""
+    global _stopping
+    _stopping = True
+    _wakeup.set()
+    if _flusher is not None:
+        _flusher.join(timeout=FLUSH_INTERVAL + 5)
+    try:
+        flush()
+    except Exception as e:
+        logger.error(f"Final conversation log flush failed: {e}")
+    with _lock:
+        parked = sum(len(msgs) for msgs in _parked.values())
+        unwritten = sum(len(msgs) for msgs in _pending.values())
+    if parked or unwritten:
+        logger.error(
+            f"Conversation log: {parked + unwritten} messages not written at shutdown "
+            f"({parked} parked after repeated failures)"
+        )
+
+
+atexit.register(shutdown)
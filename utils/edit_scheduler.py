@@ -0,0 +1,270 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Central scheduler for streaming message edits (ai_agent / ai_tutor).
+# Streams hand over their latest preview with submit(); only the newest text
+# per message is kept, and a single worker sends edits within a global
+# budget and a per-chat interval (Telegram allows roughly 30 messages/s
+# overall, 1/s in a private chat and 20/min in a group). Intervals stretch
+# when many chats are streaming and after a RetryAfter, so previews slow
+# down evenly instead of one chat getting flood-limited. finish() sends a
+# message's final text right away, and no older preview can land after it.
+GLOBAL_RATE = float(os.getenv("EDIT_GLOBAL_RATE", 25))  # edits/s across all chats
+PRIVATE_INTERVAL = float(os.getenv("EDIT_PRIVATE_INTERVAL", 1.0))
+GROUP_INTERVAL = float(os.getenv("EDIT_GROUP_INTERVAL", 3.0))
+PREVIEW_INTERVAL = 0.5  # how often streams hand over a new preview
+MAX_STRETCH = 8.0
+MAX_INFLIGHT = 8
+FINISH_ATTEMPTS = 3
+TRACKED_MESSAGES = 4096
+
+_seq = itertools.count()
+_pending = OrderedDict()  # {(chat_id, message_id): _Edit}, oldest first
+_messages = OrderedDict()  # {(chat_id, message_id): _MessageState}
+_next_slot = {}  # {chat_id: monotonic time its next preview may go out}
+_stretch = 1.0
+_tokens = GLOBAL_RATE
+_refilled = 0.0
+
+_loop = None
+_wakeup = None
+_inflight = None
+_worker = None
+_tasks = set()
+
+
+class _Edit:
+    __slots__ = ("message", "text", "parse_mode", "seq")
+
+    def __init__(self, message, text, parse_mode):
+        self.message = message
+        self.text = text
+        self.parse_mode = parse_mode
+        self.seq = next(_seq)
+
+
+class _MessageState:
+    __slots__ = ("lock", "sent_seq")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # held while an edit of this message is on the wire
+        self.sent_seq = -1  # newest edit that reached Telegram
+
+
+def _key(message):
+    return (message.chat_id, message.message_id)
+
+
+def _state(key):
+    state = _messages.get(key)
+    if state is None:
+        state = _messages[key] = _MessageState()
+        while len(_messages) > TRACKED_MESSAGES:
+            oldest, old_state = next(iter(_messages.items()))
+            if old_state.lock.locked():
+                break
+            del _messages[oldest]
+    else:
+        _messages.move_to_end(key)
+    return state
+
+
+def chat_interval(chat_id):
+    """Seconds between previews in this chat, stretched for load and back-off."""
+    base = PRIVATE_INTERVAL if chat_id > 0 else GROUP_INTERVAL
+    load = max(1.0, len(_pending) / GLOBAL_RATE)
+    return base * _stretch * load
+
+
+def _take_token(now, force=False):
+    """Seconds to wait for a global token (0 if one was taken)."""
+    global _tokens, _refilled
+    _tokens = min(GLOBAL_RATE, _tokens + (now - _refilled) * GLOBAL_RATE)
+    _refilled = now
+    if _tokens >= 1 or force:
+        _tokens -= 1
+        return 0
+    return (1 - _tokens) / GLOBAL_RATE
+
+
+def _retry_after(error):
+    """Seconds Telegram asked us to wait (telegram.error.RetryAfter), else None."""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        return None
+    return float(getattr(value, "total_seconds", lambda: value)())
+
+
+async def _send(message, text, parse_mode):
+    """Edits the message; returns retry_after seconds if we were flood-limited."""
+    kwargs = {"parse_mode": parse_mode} if parse_mode else {}
+    try:
+        await message.edit_text(text, **kwargs)
+        return None
+    except Exception as e:
+        retry_after = _retry_after(e)
+        if retry_after is not None:
+            return retry_after
+        if "not modified" in str(e).lower():
+            return None
+        if not parse_mode:
+            logger.warning(f"Edit failed: {e}")
+            return None
+    # Fallback to plain text if the markup doesn't parse
+    try:
+        await message.edit_text(text)
+    except Exception as e:
+        retry_after = _retry_after(e)
+        if retry_after is not None:
+            return retry_after
+        if "not modified" not in str(e).lower():
+            logger.warning(f"Edit failed: {e}")
+    return None
+
+
+def _back_off(chat_id, seconds):
+    global _stretch
+    _next_slot[chat_id] = max(_next_slot.get(chat_id, 0), time.monotonic() + seconds)
+    _stretch = min(MAX_STRETCH, _stretch * 2)
+    print(f"DEBUG: Edit flood limit in {chat_id}, retry after {seconds:.0f}s (stretch x{_stretch:.1f})")
+
+
+def _relax():
+    global _stretch
+    _stretch = max(1.0, _stretch * 0.95)
+
+
+# --- Worker ---
+
+
+def _ensure_worker():
+    global _loop, _wakeup, _inflight, _worker, _tokens, _refilled
+    loop = asyncio.get_running_loop()
+    if _loop is not loop:
+        # First use, or a new event loop: state bound to the old one is useless
+        _loop = loop
+        _wakeup = asyncio.Event()
+        _inflight = asyncio.Semaphore(MAX_INFLIGHT)
+        _worker = None
+        _pending.clear()
+        _messages.clear()
+        _next_slot.clear()
+        _tasks.clear()
+        _tokens, _refilled = GLOBAL_RATE, time.monotonic()
+    if _worker is None or _worker.done():
+        _worker = loop.create_task(_run())
+
+
+async def _nap(seconds):
+    try:
+        await asyncio.wait_for(_wakeup.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _run():
+    while True:
+        _wakeup.clear()
+        if not _pending:
+            await _wakeup.wait()
+            continue
+
+        now = time.monotonic()
+        key = next(
+            (
+                k
+                for k in _pending
+                if _next_slot.get(k[0], 0) <= now and not _state(k).lock.locked()
+            ),
+            None,
+        )
+        if key is None:
+            soonest = min(_next_slot.get(k[0], 0) for k in _pending)
+            await _nap(max(soonest - now, 0.05))
+            continue
+
+        wait = _take_token(now)
+        if wait:
+            await _nap(wait)
+            continue
+
+        edit = _pending.pop(key)
+        _next_slot[key[0]] = now + chat_interval(key[0])
+        task = asyncio.create_task(_deliver(key, edit))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+
+async def _deliver(key, edit):
+    state = _state(key)
+    async with _inflight:
+        async with state.lock:
+            if edit.seq < state.sent_seq:
+                return  # a newer edit (e.g. the final one) already landed
+            retry_after = await _send(edit.message, edit.text, edit.parse_mode)
+            if retry_after is None:
+                state.sent_seq = edit.seq
+    if retry_after is not None:
+        _back_off(key[0], retry_after)
+        if key not in _pending:
+            _pending[key] = edit
+    else:
+        _relax()
+    _wakeup.set()
+
+
+# --- Public API ---
+
+
+def submit(message, text, parse_mode=None):
+    """
+    Queues a preview edit of `message`. Replaces any preview of the same
+    message still waiting; returns immediately.
+    """
+    _ensure_worker()
+    key = _key(message)
+    _pending[key] = _Edit(message, text, parse_mode)
+    _wakeup.set()
+
+
+async def finish(message, text, parse_mode=None):
+    """
+    Sends the final text of `message` now, dropping its queued preview.
+    Waits out RetryAfter a few times since this edit must land; falls back
+    to plain text if the markup doesn't parse.
+    """
+    _ensure_worker()
+    key = _key(message)
+    _pending.pop(key, None)
+    edit = _Edit(message, text, parse_mode)
+    state = _state(key)
+    # Finals skip the queue but still count against the global budget
+    _take_token(time.monotonic(), force=True)
+    for _ in range(FINISH_ATTEMPTS):
+        async with state.lock:
+            retry_after = await _send(message, text, parse_mode)
+            if retry_after is None:
+                state.sent_seq = edit.seq
+                return
+        _back_off(key[0], retry_after)
+        await asyncio.sleep(retry_after)
+    logger.warning(f"Gave up on final edit of {key} after {FINISH_ATTEMPTS} flood limits")
+
+
+async def stop():
+    """Cancels the worker; previews still queued are dropped."""
+    global _worker
+    if _worker is not None and not _worker.done():
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+    _worker = None
+    _pending.clear()
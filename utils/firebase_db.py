@@ -1,52 +1,51 @@
-import firebase_admin
-from firebase_admin import credentials
-from google.cloud import firestore
 import os
 import datetime
+import threading
+import time
+from utils import (
+    audience,
+    bulk_delete,
+    conversation_log,
+    history_cache,
+    metrics,
+    news_feed,
+    post_index,
+    storage,
+)
+from utils.id_allocator import LeasedIdAllocator
 
-# Initialize Firebase Admin (for other features if needed)
 cred_path = os.getenv("FIREBASE_CREDENTIALS", "service-account.json")
-if not firebase_admin._apps:
-    if os.path.exists(cred_path):
-        firebase_admin.initialize_app(credentials.Certificate(cred_path))
-    else:
-        try:
-            firebase_admin.initialize_app()
-        except:
-            pass
 
-# Initialize Firestore Client explicitly with credentials to avoid ADC errors
-if os.path.exists(cred_path):
-    db = firestore.Client.from_service_account_json(cred_path)
-else:
-    db = firestore.Client()
+# Storage backend (see utils/storage), wrapped so every call is recorded in
+# utils/metrics. `db` stays the raw Firestore client for code that still
+# talks to Firestore directly; it is None on other backends.
+backend = metrics.InstrumentedBackend(storage.get_backend())
+db = getattr(backend, "client", None)
 
 
 def get_user_profile(telegram_id):
-    if not db:
-        return None
-    doc_ref = db.collection("users").document(str(telegram_id))
-    doc = doc_ref.get()
-    if doc.exists:
-        return doc.to_dict()
-    return None
+    return backend.get_user(telegram_id)
 
 
 def create_or_update_user(telegram_id, user_data):
-    if not db:
-        return
-    doc_ref = db.collection("users").document(str(telegram_id))
-    doc_ref.set(user_data, merge=True)
+    backend.merge_user(telegram_id, user_data)
+    if "last_active" in user_data:
+        audience.touch(telegram_id, user_data["last_active"])
+
+
+def update_user_state(telegram_id, fields, increments=None):
+    """Merges `fields` into the user doc and adds `increments` atomically."""
+    backend.merge_user(telegram_id, fields, increments=increments)
+    if "last_active" in fields:
+        audience.touch(telegram_id, fields["last_active"])
 
 
 def log_conversation(telegram_id, role, content, chat_id=None, user_name=None):
-    if not db:
-        return
+    """Queues a message for the write-behind logger (see utils/conversation_log.py)."""
     # Use chat_id as the primary scope if provided, otherwise default to telegram_id (for legacy/DMs)
     target_id = str(chat_id) if chat_id else str(telegram_id)
 
     # Store in a "chats" collection to isolate environments
-    chat_ref = db.collection("chats").document(target_id)
     msg_data = {
         "role": role,
         "content": content,
@@ -54,69 +53,86 @@ def log_conversation(telegram_id, role, content, chat_id=None, user_name=None):
         "user_id": str(telegram_id),
         "user_name": user_name,
     }
-    chat_ref.collection("messages").add(msg_data)
+    conversation_log.enqueue(target_id, msg_data)
+    history_cache.append(target_id, msg_data)
     print(
-        f"DEBUG: Firestore: Saving {role} message ({len(content)} chars) for chat {target_id}"
+        f"DEBUG: Firestore: Queued {role} message ({len(content)} chars) for chat {target_id}"
     )
 
 
 def prune_conversation(telegram_id, chat_id=None, max_messages=50, delete_count=25):
-    """Prune oldest messages when conversation exceeds max_messages."""
-    if not db:
-        return
-
+    """
+    Prune oldest messages when conversation exceeds max_messages.
+    Reads only the message_count kept on chats/{id}; the history itself is
+    touched only when the counter crosses the threshold.
+    """
     target_id = str(chat_id) if chat_id else str(telegram_id)
-    chat_ref = db.collection("chats").document(target_id)
-    conv_ref = chat_ref.collection("messages")
 
-    total = len(list(conv_ref.stream()))
+    total = backend.get_message_count(target_id)
+    if total is None:
+        # Counter not seeded yet (chat predates it): count once and set it
+        total = backend.count_messages(target_id)
+
     if total <= max_messages:
         return
 
-    old_docs = conv_ref.order_by("timestamp").limit(delete_count).stream()
-    count = 0
-    for doc in old_docs:
-        doc.reference.delete()
-        count += 1
+    deleted = backend.delete_oldest_messages(target_id, delete_count)
+    if deleted:
+        print(
+            f"DEBUG: Firestore: Pruned {deleted} messages for chat {target_id} (had {total})"
+        )
 
 
 def get_recent_context(telegram_id, chat_id=None, limit=5):
     """
     Retrieves the last N messages (Sliding Window: 5 messages).
+    Served from utils/history_cache.py; storage is read only to warm a chat
+    the process has not seen yet.
     """
-    if not db:
-        return []
-
     target_id = str(chat_id) if chat_id else str(telegram_id)
-    chat_ref = db.collection("chats").document(target_id)
 
-    docs = (
-        chat_ref.collection("messages")
-        .order_by("timestamp", direction=firestore.Query.DESCENDING)
-        .limit(limit)
-        .stream()
-    )
-    messages = []
-    for doc in docs:
-        data = doc.to_dict()
-        # Clean internal fields before returning to context
-        messages.append(
-            {
-                "role": data.get("role"),
-                "content": data.get("content"),
-                "user_name": data.get("user_name"),
-                "user_id": data.get("user_id"),
-            }
-        )
-
-    result = messages[::-1]
-    total_chars = sum(len(m.get("content", "")) for m in result)
+    cached = history_cache.get(target_id, limit)
+    if cached is not None:
+        return cached
+
+    history_cache.begin_warm(target_id)
+    fetch = max(limit, history_cache.PER_CHAT)
+    try:
+        stored = backend.recent_messages(target_id, fetch)
+    except BaseException:
+        # Don't leave the warm pending, or the chat is never warmed again
+        history_cache.discard(target_id)
+        raise
+    window = _with_pending(target_id, stored, fetch)
+    history_cache.warm(target_id, window)
+
+    result = window[-limit:]
+    total_chars = sum(len(m.get("content") or "") for m in result)
     print(
         f"DEBUG: Firestore: Retrieved {len(result)} messages ({total_chars} chars) for chat {target_id}"
     )
     return result
 
 
+def _with_pending(target_id, stored, limit):
+    """Shapes stored messages and appends ones still in the write-behind buffer."""
+    # Clean internal fields before returning to context; skip history a /reset is still deleting
+    result = [
+        history_cache.shape(data)
+        for data in stored
+        if not bulk_delete.is_purged(target_id, data)
+    ]
+    # Messages still sitting in the write-behind buffer are newer than anything stored.
+    # A batch that committed just before the read is briefly both; skip that overlap.
+    in_flight, queued = conversation_log.pending_for_chat(target_id)
+    in_flight = [history_cache.shape(m) for m in in_flight]
+    if in_flight or queued:
+        result.extend(in_flight[history_cache.overlap(result, in_flight):])
+        result.extend(history_cache.shape(m) for m in queued)
+        result = result[-limit:]
+    return result
+
+
 # Memory functions are DISABLED for refactoring
 # These will be reimplemented later
 
@@ -160,54 +176,117 @@ def clear_user_memories(telegram_id, category=None):
 
 
 def save_announcement(text, admin_id):
-    if not db:
-        return
-    db.collection("announcements").add(
+    backend.add_announcement(
         {"text": text, "admin_id": str(admin_id), "timestamp": datetime.datetime.now()}
     )
 
 
 def get_all_user_ids():
-    if not db:
-        return []
-    docs = db.collection("users").stream()
-    return [doc.id for doc in docs]
+    """All user IDs, from the in-memory audience index (see utils/audience.py)."""
+    return audience.all_ids()
+
+
+def sample_audience(k, exclude=None):
+    return audience.sample(k, exclude)
+
+
+def load_audience():
+    try:
+        count = audience.load()
+        print(f"DEBUG: Firestore: Audience index loaded ({count} users)")
+    except Exception as e:
+        print(f"⚠️ Audience index load failed: {e}")
 
 
 def get_all_user_profiles(limit=50):
-    if not db:
-        return []
-    docs = db.collection("users").limit(limit).stream()
-    profiles = []
-    for doc in docs:
-        data = doc.to_dict()
-        data["id"] = doc.id
-        profiles.append(data)
-    return profiles
+    return backend.list_users(limit)
 
 
-def add_admin(user_id):
-    if not db:
+# Admin set cache: loaded at startup and kept fresh by an on_snapshot listener
+# on settings/admins. If the listener is not running, the set is re-read
+# after ADMIN_CACHE_TTL seconds.
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", 300))
+_admin_cache = set()
+_admin_cache_loaded_at = 0.0
+_admin_watch = None
+_admin_lock = threading.Lock()
+
+
+def _set_admin_cache(user_ids):
+    global _admin_cache, _admin_cache_loaded_at
+    with _admin_lock:
+        _admin_cache = {str(uid) for uid in user_ids}
+        _admin_cache_loaded_at = time.monotonic()
+
+
+def _refresh_admin_cache():
+    data = backend.get_setting("admins")
+    _set_admin_cache(data.keys() if data else [])
+
+
+def _admin_listener_alive():
+    return _admin_watch is not None and getattr(_admin_watch, "is_active", True)
+
+
+def admin_cache_is_fresh():
+    """True if is_admin can answer from memory without a storage read."""
+    if _admin_listener_alive():
+        return True
+    return time.monotonic() - _admin_cache_loaded_at <= ADMIN_CACHE_TTL
+
+
+def start_admin_listener():
+    """Loads the admin set and subscribes to changes on settings/admins."""
+    global _admin_watch
+    if _admin_listener_alive():
         return
-    db.collection("settings").document("admins").set({str(user_id): True}, merge=True)
+    try:
+        _refresh_admin_cache()
+    except Exception as e:
+        print(f"⚠️ Initial admin load failed: {e}")
+
+    def on_change(data):
+        _set_admin_cache(data.keys())
+        print(f"DEBUG: Firestore: Admin set updated ({len(data)} admins)")
+
+    try:
+        _admin_watch = backend.watch_setting("admins", on_change)
+    except Exception as e:
+        print(f"⚠️ Admin listener unavailable, using {ADMIN_CACHE_TTL}s TTL: {e}")
+        _admin_watch = None
+
+
+def stop_admin_listener():
+    global _admin_watch
+    if _admin_watch is not None:
+        try:
+            _admin_watch.unsubscribe()
+        except Exception:
+            pass
+        _admin_watch = None
+
+
+def add_admin(user_id):
+    backend.merge_setting("admins", {str(user_id): True})
+    with _admin_lock:
+        _admin_cache.add(str(user_id))
 
 
 def remove_admin(user_id):
-    if not db:
-        return
-    db.collection("settings").document("admins").update(
-        {str(user_id): firestore.DELETE_FIELD}
-    )
+    backend.merge_setting("admins", {}, delete_fields=[str(user_id)])
+    with _admin_lock:
+        _admin_cache.discard(str(user_id))
 
 
 def get_admins():
-    if not db:
-        return []
-    doc = db.collection("settings").document("admins").get()
-    if doc.exists:
-        data = doc.to_dict()
-        return list(data.keys()) if data else []
-    return []
+    """Returns admin IDs from memory, re-reading only when the cache is stale."""
+    if not admin_cache_is_fresh():
+        try:
+            _refresh_admin_cache()
+        except Exception as e:
+            print(f"⚠️ Admin refresh failed, serving cached set: {e}")
+    with _admin_lock:
+        return list(_admin_cache)
 
 
 def is_admin(user_id):
@@ -217,140 +296,227 @@ def is_admin(user_id):
     return str(user_id) in get_admins()
 
 
-def clear_user_conversations(telegram_id):
-    if not db:
-        return
-    # 1. Clear Legacy Conversations (users/{id}/conversations)
-    user_ref = db.collection("users").document(str(telegram_id))
-    for doc in user_ref.collection("conversations").stream():
-        doc.reference.delete()
-
-    # 2. Clear New Chat History (chats/{id}/messages) - Private DMs
+def forget_conversation(telegram_id):
+    """
+    Drops a user's DM history from memory (write-behind buffer and history
+    cache) and hides the stored copy until it is deleted. Returns the cutoff
+    to pass to bulk_delete.purge_conversations.
+    """
     # Note: We assume reset is mostly for private context.
     # For groups, we'd need chat_id, but usually reset is user-centric.
-    chat_ref = db.collection("chats").document(str(telegram_id))
-    for doc in chat_ref.collection("messages").stream():
-        doc.reference.delete()
+    cutoff = bulk_delete.begin(telegram_id)
+    conversation_log.discard(telegram_id)
+    history_cache.discard(telegram_id)
+    return cutoff
 
 
-def hard_reset_user_data(telegram_id):
-    if not db:
-        return
-    # 1. Clear Conversations
-    clear_user_conversations(telegram_id)
-
-    # 2. Reset Personality State
-    user_ref = db.collection("users").document(str(telegram_id))
-    user_ref.update(
-        {
-            "debate_state": firestore.DELETE_FIELD,
-            "favourability": 50,  # Reset to neutral
-        }
+def clear_user_conversations(telegram_id, on_progress=None):
+    """Blocking reset: clears legacy conversations and chats/{id}/messages."""
+    cutoff = forget_conversation(telegram_id)
+    return bulk_delete.purge_conversations(telegram_id, cutoff, on_progress)
+
+
+def reset_personality(telegram_id):
+    backend.merge_user(
+        telegram_id,
+        {"favourability": 50},  # Reset to neutral
+        delete_fields=["debate_state"],
     )
 
 
+def hard_reset_user_data(telegram_id, on_progress=None):
+    # 1. Reset Personality State
+    reset_personality(telegram_id)
+
+    # 2. Clear Conversations
+    return clear_user_conversations(telegram_id, on_progress)
+
+
 def get_debate_state(telegram_id):
     """Retrieves the current debate/personality state for a user."""
-    if not db:
-        return {}
-    doc = db.collection("users").document(str(telegram_id)).get()
-    if doc.exists:
-        return doc.to_dict().get("debate_state", {})
+    data = backend.get_user(telegram_id)
+    if data:
+        return data.get("debate_state", {})
     return {}
 
 
 def update_debate_state(telegram_id, state):
     """Updates the debate/personality state."""
-    if not db:
-        return
-    db.collection("users").document(str(telegram_id)).set(
-        {"debate_state": state}, merge=True
-    )
+    backend.merge_user(telegram_id, {"debate_state": state})
 
 
 def get_user_favourability(telegram_id):
     """Retrieves the current favourability score (0-100)."""
-    if not db:
-        return 50  # Default neutral
-    doc = db.collection("users").document(str(telegram_id)).get()
-    if doc.exists:
-        data = doc.to_dict()
+    data = backend.get_user(telegram_id)
+    if data:
         return data.get("favourability", 50)
-    return 50
+    return 50  # Default neutral
 
 
 def update_user_favourability(telegram_id, delta):
     """Updates favourability score. Clamped between 0 and 100."""
-    if not db:
-        return
-
     current = get_user_favourability(telegram_id)
     new_val = max(0, min(100, current + delta))
 
     if new_val != current:
-        db.collection("users").document(str(telegram_id)).set(
-            {"favourability": new_val}, merge=True
-        )
+        backend.merge_user(telegram_id, {"favourability": new_val})
         print(f"DEBUG: Updated Favourability for {telegram_id}: {current} -> {new_val}")
 
 
-def get_latest_news(limit=5, last_timestamp=None):
-    """Retrieves paginated news from aggregated_posts."""
-    if not db:
-        return []
-
-    query = (
-        db.collection("aggregated_posts")
-        .where("status", "in", ["trusted", "confession", "complaint"])
-        .order_by("timestamp", direction=firestore.Query.DESCENDING)
-        .limit(limit)
-    )
+NEWS_STATUSES = ["trusted", "confession", "complaint"]
 
-    if last_timestamp:
-        query = query.start_after({"timestamp": last_timestamp})
 
-    return list(query.stream())
+def get_latest_news(limit=5, last_timestamp=None):
+    """Retrieves paginated news from aggregated_posts."""
+    return backend.latest_posts(NEWS_STATUSES, limit, before_timestamp=last_timestamp)
 
 
 def save_aggregated_post(data):
     """Saves or updates a post in the aggregated_posts collection."""
-    if not db:
-        return None
     doc_id = data.get("doc_id")
-    if doc_id:
-        doc_ref = db.collection("aggregated_posts").document(doc_id)
-    else:
-        doc_ref = db.collection("aggregated_posts").document()
-        if "timestamp" not in data:
-            data["timestamp"] = datetime.datetime.now().isoformat()
+    if not doc_id and "timestamp" not in data:
+        data["timestamp"] = datetime.datetime.now().isoformat()
+    doc_id = backend.save_post(doc_id, data)
+    _post_saved(doc_id, data)
+    return doc_id
 
-    doc_ref.set(data, merge=True)
-    return doc_ref.id
+
+def _post_saved(doc_id, data):
+    news_feed.note_saved(doc_id, data)
+    _index_post(doc_id, data.get("post_id"), data.get("dest_msg_id"))
+
+
+def _index_post(doc_id, post_id=None, dest_msg_id=None):
+    """Records post_id -> doc_id (and dest_msg_id) in memory and in post_index/."""
+    if post_id is None:
+        post_id = post_index.post_id_for(doc_id)
+    if post_id is None or not doc_id:
+        return
+    entry = post_index.remember(post_id, doc_id, dest_msg_id)
+    if entry:
+        try:
+            backend.put_post_index(post_id, entry)
+        except Exception as e:
+            print(f"⚠️ Post index write failed for #{post_id}: {e}")
+
+
+def save_post(data):
+    """Aggregator variant: assigns a post_id and created_at for new posts."""
+    if "post_id" not in data:
+        data["post_id"] = get_next_post_id()
+    doc_id = data.get("doc_id")
+    if not doc_id:
+        data["created_at"] = datetime.datetime.now()
+    doc_id = backend.save_post(doc_id, data)
+    _post_saved(doc_id, data)
+    return doc_id
+
+
+def get_post(doc_id):
+    """Fetches one post by document ID (a StoredDoc; .exists is False if missing)."""
+    return backend.get_post(doc_id)
 
 
 def get_post_by_id(post_id):
-    """Finds a post by its sequential short ID (e.g. 101)."""
-    if not db:
-        return None
+    """
+    Finds a post by its sequential short ID (e.g. 101).
+    Resolves the ID through post_index (memory, then post_index/{id}) and
+    fetches the post directly; the query on post_id is only a fallback for
+    posts saved before the index existed.
+    """
+    entry = post_index.lookup(post_id)
+    if entry is None:
+        entry = backend.get_post_index(post_id)
+        if entry:
+            post_index.remember(post_id, entry["doc_id"], entry.get("dest_msg_id"))
+    if entry:
+        doc = news_feed.cached_post(entry["doc_id"]) or backend.get_post(entry["doc_id"])
+        if doc.exists:
+            return doc
+
     # Ensure post_id is treated correctly as int or str based on storage
-    docs = (
-        db.collection("aggregated_posts").where("post_id", "==", post_id).limit(1).get()
+    doc = backend.find_post(post_id=post_id)
+    if doc:
+        _index_post(doc.id, post_id, doc.get("dest_msg_id"))
+    return doc
+
+
+def get_post_by_source(source_id, source_msg_id):
+    return backend.find_post(source_id=source_id, source_msg_id=source_msg_id)
+
+
+def is_album_processed(grouped_id):
+    if not grouped_id:
+        return False
+    return backend.find_post(grouped_id=str(grouped_id)) is not None
+
+
+def check_duplicate(content_hash):
+    """True if a post with this hash was created in the last 24 hours."""
+    if not content_hash:
+        return False
+    return _created_recently(backend.find_post(content_hash=content_hash))
+
+
+def _created_recently(doc):
+    """True if the post `doc` was created in the last 24 hours."""
+    if not doc:
+        return False
+
+    created_at = doc.get("created_at")
+    if not created_at:
+        return False
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.datetime.fromisoformat(created_at)
+        except ValueError:
+            return True
+    now = (
+        datetime.datetime.now(created_at.tzinfo)
+        if created_at.tzinfo
+        else datetime.datetime.now()
     )
-    return docs[0] if docs else None
+    return (now - created_at).total_seconds() < 86400
+
+
+def update_dest_msg(doc_id, dest_msg_id):
+    backend.save_post(doc_id, {"dest_msg_id": dest_msg_id})
+    _post_saved(doc_id, {"dest_msg_id": dest_msg_id})
+
+
+def get_old_local_posts(days=3):
+    """Posts older than `days` whose media is still cached on local disk."""
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    return backend.posts_with_local_files(cutoff)
+
+
+def clear_local_path(doc_id):
+    backend.save_post(doc_id, {"local_path": None})
+
+
+POST_ID_BLOCK_SIZE = int(os.getenv("POST_ID_BLOCK_SIZE", 20))
+
+
+def _lease_post_id_block(size):
+    """Reserves `size` post IDs on settings/counters in a single transaction."""
+    return backend.lease_counter("post_id", size, default=100)
+
+
+def _release_post_id_block(next_unused, last):
+    """Hands an unused lease tail back if the counter has not moved past it."""
+    return backend.release_counter("post_id", next_unused, last)
+
+
+post_id_allocator = LeasedIdAllocator(
+    _lease_post_id_block, _release_post_id_block, block_size=POST_ID_BLOCK_SIZE
+)
 
 
 def get_next_post_id():
-    """Generates the next sequential ID for posts."""
-    if not db:
-        return 0
-    counter_ref = db.collection("settings").document("counters")
-
-    @firestore.transactional
-    def update_counter(transaction, ref):
-        snapshot = ref.get(transaction=transaction)
-        current = snapshot.get("post_id") if snapshot.exists else 100
-        new_val = current + 1
-        transaction.set(ref, {"post_id": new_val}, merge=True)
-        return new_val
-
-    return update_counter(db.transaction(), counter_ref)
+    """Generates the next sequential ID for posts from a locally leased block."""
+    return post_id_allocator.allocate()
+
+
+def release_post_ids():
+    """Returns unused leased post IDs on shutdown (or skips them)."""
+    post_id_allocator.close()
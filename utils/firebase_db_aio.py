@@ -0,0 +1,261 @@
+"""
+Async counterpart of utils/firebase_db.py.
+
+Function names mirror firebase_db (plus the aggregator helpers that
+FirebaseManager provides), so async handlers can swap
+`firebase_db.x(...)` for `await firebase_db_aio.x(...)` and keep the event
+loop free while storage I/O is in flight. In-process state (write-behind
+log buffer, history cache, admin set, post ID leases) is shared with firebase_db.
+
+Storage goes through the async face of firebase_db's backend
+(StorageBackend.aio()): native AsyncClient calls on Firestore, the sync
+backend in a worker thread elsewhere. Either way calls return the same
+values as firebase_db and are recorded in utils/metrics.
+"""
+
+import asyncio
+import datetime
+import os
+from utils import audience, firebase_db, history_cache, metrics, news_feed, post_index
+
+backend = metrics.InstrumentedAsyncBackend(firebase_db.backend.aio())
+
+
+# --- Users ---
+
+
+async def get_user_profile(telegram_id):
+    return await backend.get_user(telegram_id)
+
+
+async def create_or_update_user(telegram_id, user_data):
+    await backend.merge_user(telegram_id, user_data)
+    if "last_active" in user_data:
+        await _touch_audience(telegram_id, user_data["last_active"])
+
+
+async def update_user_state(telegram_id, fields, increments=None):
+    await backend.merge_user(telegram_id, fields, increments=increments)
+    if "last_active" in fields:
+        await _touch_audience(telegram_id, fields["last_active"])
+
+
+async def _touch_audience(telegram_id, last_active):
+    """Async twin of audience.touch."""
+    if audience.note_active(telegram_id, last_active):
+        try:
+            await backend.put_audience([(str(telegram_id), last_active)])
+        except Exception as e:
+            print(f"⚠️ Audience index update failed for {telegram_id}: {e}")
+
+
+async def get_all_user_ids():
+    # The audience index answers from memory; only a (re)load pages storage
+    if audience.is_fresh():
+        return audience.all_ids()
+    return await asyncio.to_thread(firebase_db.get_all_user_ids)
+
+
+async def sample_audience(k, exclude=None):
+    if audience.is_fresh():
+        return audience.sample(k, exclude)
+    return await asyncio.to_thread(firebase_db.sample_audience, k, exclude)
+
+
+# --- Conversations ---
+
+
+async def log_conversation(telegram_id, role, content, chat_id=None, user_name=None):
+    # Queuing is in-memory; the write-behind buffer does the I/O off the loop
+    firebase_db.log_conversation(telegram_id, role, content, chat_id, user_name)
+
+
+async def get_recent_context(telegram_id, chat_id=None, limit=5):
+    target_id = str(chat_id) if chat_id else str(telegram_id)
+
+    cached = history_cache.get(target_id, limit)
+    if cached is not None:
+        return cached
+
+    history_cache.begin_warm(target_id)
+    fetch = max(limit, history_cache.PER_CHAT)
+    try:
+        stored = await backend.recent_messages(target_id, fetch)
+    except BaseException:
+        # Failed or cancelled (context deadline): don't leave the warm pending
+        history_cache.discard(target_id)
+        raise
+    window = firebase_db._with_pending(target_id, stored, fetch)
+    history_cache.warm(target_id, window)
+
+    result = window[-limit:]
+    total_chars = sum(len(m.get("content") or "") for m in result)
+    print(
+        f"DEBUG: Firestore: Retrieved {len(result)} messages ({total_chars} chars) for chat {target_id}"
+    )
+    return result
+
+
+async def prune_conversation(telegram_id, chat_id=None, max_messages=50, delete_count=25):
+    """Async version of firebase_db.prune_conversation (counter-based)."""
+    target_id = str(chat_id) if chat_id else str(telegram_id)
+
+    total = await backend.get_message_count(target_id)
+    if total is None:
+        # Counter not seeded yet (chat predates it): count once and set it
+        total = await backend.count_messages(target_id)
+
+    if total <= max_messages:
+        return
+
+    deleted = await backend.delete_oldest_messages(target_id, delete_count)
+    if deleted:
+        print(
+            f"DEBUG: Firestore: Pruned {deleted} messages for chat {target_id} (had {total})"
+        )
+
+
+# --- Admins & Announcements ---
+
+
+async def is_admin(user_id):
+    # Normally a memory lookup; only a stale cache without a listener hits the network
+    if firebase_db.admin_cache_is_fresh():
+        return firebase_db.is_admin(user_id)
+    return await asyncio.to_thread(firebase_db.is_admin, user_id)
+
+
+async def add_admin(user_id):
+    await asyncio.to_thread(firebase_db.add_admin, user_id)
+
+
+async def remove_admin(user_id):
+    await asyncio.to_thread(firebase_db.remove_admin, user_id)
+
+
+async def save_announcement(text, admin_id):
+    await backend.add_announcement(
+        {"text": text, "admin_id": str(admin_id), "timestamp": datetime.datetime.now()}
+    )
+
+
+# --- Aggregated Posts ---
+
+
+async def get_latest_news(limit=5, last_timestamp=None):
+    return await backend.latest_posts(
+        firebase_db.NEWS_STATUSES, limit, before_timestamp=last_timestamp
+    )
+
+
+async def save_aggregated_post(data):
+    doc_id = data.get("doc_id")
+    if not doc_id and "timestamp" not in data:
+        data["timestamp"] = datetime.datetime.now().isoformat()
+    doc_id = await backend.save_post(doc_id, data)
+    await _post_saved(doc_id, data)
+    return doc_id
+
+
+async def _post_saved(doc_id, data):
+    news_feed.note_saved(doc_id, data)
+    await _index_post(doc_id, data.get("post_id"), data.get("dest_msg_id"))
+
+
+async def _index_post(doc_id, post_id=None, dest_msg_id=None):
+    """Async twin of firebase_db._index_post."""
+    if post_id is None:
+        post_id = post_index.post_id_for(doc_id)
+    if post_id is None or not doc_id:
+        return
+    entry = post_index.remember(post_id, doc_id, dest_msg_id)
+    if entry:
+        try:
+            await backend.put_post_index(post_id, entry)
+        except Exception as e:
+            print(f"⚠️ Post index write failed for #{post_id}: {e}")
+
+
+async def save_post(data):
+    """Aggregator variant: assigns a post_id and created_at for new posts."""
+    if "post_id" not in data:
+        data["post_id"] = await get_next_post_id()
+    doc_id = data.get("doc_id")
+    if not doc_id:
+        data["created_at"] = datetime.datetime.now()
+    doc_id = await backend.save_post(doc_id, data)
+    await _post_saved(doc_id, data)
+    return doc_id
+
+
+async def get_post(doc_id):
+    return await backend.get_post(doc_id)
+
+
+async def get_post_by_id(post_id):
+    """Index lookup plus one direct get (or none, if /news has the post cached)."""
+    entry = post_index.lookup(post_id)
+    if entry is None:
+        entry = await backend.get_post_index(post_id)
+        if entry:
+            post_index.remember(post_id, entry["doc_id"], entry.get("dest_msg_id"))
+    if entry:
+        doc = news_feed.cached_post(entry["doc_id"]) or await get_post(entry["doc_id"])
+        if doc.exists:
+            return doc
+
+    doc = await backend.find_post(post_id=post_id)
+    if doc:
+        await _index_post(doc.id, post_id, doc.get("dest_msg_id"))
+    return doc
+
+
+async def get_post_by_source(source_id, source_msg_id):
+    return await backend.find_post(source_id=source_id, source_msg_id=source_msg_id)
+
+
+async def is_album_processed(grouped_id):
+    if not grouped_id:
+        return False
+    return await backend.find_post(grouped_id=str(grouped_id)) is not None
+
+
+async def check_duplicate(content_hash):
+    """True if a post with this hash was created in the last 24 hours."""
+    if not content_hash:
+        return False
+    return firebase_db._created_recently(await backend.find_post(content_hash=content_hash))
+
+
+async def update_dest_msg(doc_id, dest_msg_id):
+    await backend.save_post(doc_id, {"dest_msg_id": dest_msg_id})
+    await _post_saved(doc_id, {"dest_msg_id": dest_msg_id})
+
+
+async def upload_image(local_path, remote_path):
+    """Uploads to Firebase Storage in a worker thread; returns the public URL or None."""
+
+    def upload():
+        from firebase_admin import storage
+
+        try:
+            bucket = storage.bucket(os.getenv("FIREBASE_STORAGE_BUCKET") or None)
+            blob = bucket.blob(remote_path)
+            blob.upload_from_filename(local_path)
+            blob.make_public()
+            return blob.public_url
+        except Exception as e:
+            print(f"❌ Storage Upload Error: {e}")
+            return None
+
+    return await asyncio.to_thread(upload)
+
+
+# --- Counters ---
+
+
+async def get_next_post_id():
+    # Served from the current lease without I/O; only a new lease needs a thread
+    if firebase_db.post_id_allocator.remaining():
+        return firebase_db.get_next_post_id()
+    return await asyncio.to_thread(firebase_db.get_next_post_id)
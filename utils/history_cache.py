@@ -0,0 +1,110 @@
+import os
+import threading
+from collections import OrderedDict, deque
+
+# In-process ring buffer of recent messages per chat.
+# log_conversation appends to chats that are already cached; a read for an
+# uncached chat (a "miss") is answered from storage once and the result
+# warms the buffer. Chats are evicted least-recently-used beyond MAX_CHATS.
+MAX_CHATS = int(os.getenv("HISTORY_CACHE_CHATS", 500))
+PER_CHAT = int(os.getenv("HISTORY_CACHE_SIZE", 50))
+
+_chats = OrderedDict()  # {chat_id: deque([message, ...], maxlen=PER_CHAT)}
+_warming = {}  # {chat_id: [messages logged while a warm-up read is in flight]}
+_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def shape(msg_data):
+    """The fields get_recent_context returns for each message."""
+    return {
+        "role": msg_data.get("role"),
+        "content": msg_data.get("content"),
+        "user_name": msg_data.get("user_name"),
+        "user_id": msg_data.get("user_id"),
+    }
+
+
+def get(chat_id, limit):
+    """Returns the newest `limit` messages (oldest first), or None on a miss."""
+    chat_id = str(chat_id)
+    with _lock:
+        buf = _chats.get(chat_id)
+        if buf is None or limit > PER_CHAT:
+            stats["misses"] += 1
+            return None
+        _chats.move_to_end(chat_id)
+        stats["hits"] += 1
+        return list(buf)[-limit:] if limit > 0 else []
+
+
+def append(chat_id, msg_data):
+    """Adds a logged message to a cached chat. Uncached chats are left cold."""
+    chat_id = str(chat_id)
+    with _lock:
+        buf = _chats.get(chat_id)
+        if buf is not None:
+            buf.append(shape(msg_data))
+        elif chat_id in _warming:
+            _warming[chat_id].append(shape(msg_data))
+
+
+def begin_warm(chat_id):
+    """
+    Call before reading a missed chat from storage. Messages logged until
+    warm() are held so they are not lost between the read and the fill.
+    """
+    with _lock:
+        _warming.setdefault(str(chat_id), [])
+
+
+def warm(chat_id, messages):
+    """Fills a chat's buffer with its newest messages (oldest first, already shaped)."""
+    chat_id = str(chat_id)
+    with _lock:
+        if chat_id not in _warming:
+            return  # discarded (/reset) while the read was in flight
+        logged_since = _warming.pop(chat_id)
+        if chat_id in _chats:
+            return
+        buf = deque(messages, maxlen=PER_CHAT)
+        # The read may already include the first few messages logged during
+        # it (as the tail of `messages`); matched by position, not by value,
+        # so a repeated "ok" is still kept
+        buf.extend(logged_since[overlap(messages, logged_since):])
+        _chats[chat_id] = buf
+        while len(_chats) > MAX_CHATS:
+            _chats.popitem(last=False)
+            stats["evictions"] += 1
+
+
+def overlap(messages, newer):
+    """Length of the longest prefix of `newer` that ends `messages` (by position)."""
+    for k in range(min(len(messages), len(newer)), 0, -1):
+        if messages[-k:] == newer[:k]:
+            return k
+    return 0
+
+
+def discard(chat_id):
+    """Forgets a chat (used by /reset)."""
+    chat_id = str(chat_id)
+    with _lock:
+        _chats.pop(chat_id, None)
+        _warming.pop(chat_id, None)
+
+
+def clear():
+    with _lock:
+        _chats.clear()
+        _warming.clear()
+
+
+def get_stats():
+    with _lock:
+        snapshot = dict(stats)
+        snapshot["chats"] = len(_chats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+    return snapshot
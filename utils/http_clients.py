@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Shared HTTP clients, one connection pool per host.
+# DeepSeek, OpenRouter and Telegram Bot API calls reuse warm keep-alive
+# connections (HTTP/2 when the h2 package is installed) instead of paying
+# TCP + TLS setup on every request:
+#   get_client()        - async httpx pools (agent, router, aggregator's raw
+#                         api.telegram.org POSTs)
+#   get_session()       - one requests.Session for sync callers (vision,
+#                         validator, ai_mgr, embeddings, tools.web_fetch)
+#   telegram_request()  - python-telegram-bot's HTTPXRequest; PTB owns that
+#                         client, so it gets the same limits, not the same pool
+# main.py opens the pools in post_init and closes them in post_shutdown;
+# get_client() also creates them lazily.
+# Per-request `timeout=` arguments still override the defaults below.
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 60))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_KEEPALIVE_CONNECTIONS", 10))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 90))
+
+# Hosts whose pools are opened at startup
+WARM_HOSTS = (
+    "https://api.deepseek.com",
+    "https://openrouter.ai",
+    "https://api.telegram.org",
+)
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+_clients = {}  # {"https://host": (loop, httpx.AsyncClient)}
+_stale = []  # clients replaced after their (now stopped) loop; close() releases them
+_session = None
+_lock = threading.Lock()
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _new_client():
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=_limits(),
+    )
+
+
+def get_client(url):
+    """
+    Returns the shared AsyncClient for `url`'s host. Do not close it or use
+    it as a context manager; requests take absolute URLs as before.
+    """
+    origin = _origin(url)
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(origin)
+    if entry is None or entry[0] is not loop:
+        # A pool is tied to the event loop that opened it (asyncio.run in scripts)
+        if entry is not None:
+            _retire(origin, *entry)
+        entry = (loop, _new_client())
+        _clients[origin] = entry
+    return entry[1]
+
+
+def _retire(origin, loop, client):
+    """Closes a client whose loop was replaced, on that loop if it still runs."""
+    if loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        return
+    logger.info(f"HTTP pool for {origin} outlived its event loop; releasing it at close()")
+    _stale.append(client)
+
+
+def get_session():
+    """Shared requests.Session for the sync callers (vision, validator, ai_mgr, tools)."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=len(WARM_HOSTS) + 4,
+                    pool_maxsize=MAX_CONNECTIONS,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def telegram_request(read_timeout=READ_TIMEOUT, write_timeout=READ_TIMEOUT,
+                     connect_timeout=CONNECT_TIMEOUT):
+    """
+    HTTPXRequest for Application.builder().request(): Bot API calls made
+    through PTB keep connections alive and use HTTP/2 like get_client().
+    PTB opens and closes this client itself (initialize/shutdown).
+    """
+    from telegram.request import HTTPXRequest
+
+    return HTTPXRequest(
+        connection_pool_size=MAX_CONNECTIONS,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        connect_timeout=connect_timeout,
+        http_version="2" if HTTP2 else "1.1",
+        httpx_kwargs={"limits": _limits()},
+    )
+
+
+async def start():
+    """Opens the pools for the API hosts (called from post_init)."""
+    for origin in WARM_HOSTS:
+        get_client(origin)
+    print(f"🌐 HTTP pools ready ({'HTTP/2' if HTTP2 else 'HTTP/1.1'})")
+
+
+async def close():
+    """Closes every pool (called from post_shutdown)."""
+    global _session
+    clients = [client for _, client in _clients.values()] + _stale
+    _clients.clear()
+    _stale.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"HTTP client close failed: {e}")
+    if _session is not None:
+        _session.close()
+        _session = None
@@ -0,0 +1,62 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LeasedIdAllocator:
+    """
+    Hands out sequential IDs from blocks leased in one round-trip each.
+
+    lease_block(size) must atomically reserve `size` IDs and return the
+    inclusive (first, last) range. release_block(next_unused, last) is
+    optional. It should hand the unused tail back if nothing was leased after
+    it, and return True when it did. Otherwise the tail is skipped, which
+    leaves a gap in the sequence.
+    """
+
+    def __init__(self, lease_block, release_block=None, block_size=20):
+        self._lease_block = lease_block
+        self._release_block = release_block
+        self.block_size = max(1, int(block_size))
+        self._lock = threading.Lock()
+        self._next = None
+        self._last = None
+        self.stats = {"leases": 0, "allocated": 0, "returned": 0, "skipped": 0}
+
+    def allocate(self):
+        with self._lock:
+            if self._next is None or self._next > self._last:
+                # Only one thread leases at a time; the rest wait for the new block
+                self._next, self._last = self._lease_block(self.block_size)
+                self.stats["leases"] += 1
+            value = self._next
+            self._next += 1
+            self.stats["allocated"] += 1
+            return value
+
+    def remaining(self):
+        with self._lock:
+            if self._next is None:
+                return 0
+            return max(0, self._last - self._next + 1)
+
+    def close(self):
+        """Returns (or skips) whatever is left of the current block."""
+        with self._lock:
+            if self._next is None or self._next > self._last:
+                self._next = self._last = None
+                return
+            unused = self._last - self._next + 1
+            returned = False
+            if self._release_block:
+                try:
+                    returned = self._release_block(self._next, self._last)
+                except Exception as e:
+                    logger.error(f"Failed to return ID lease: {e}")
+            if returned:
+                self.stats["returned"] += unused
+            else:
+                self.stats["skipped"] += unused
+                logger.info(f"Skipping {unused} leased IDs ({self._next}-{self._last})")
+            self._next = self._last = None
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from utils.metrics import percentile
+
+# DeepSeek request accounting.
+# ai_agent records each request's usage block (with prompt_cache_hit_tokens
+# / prompt_cache_miss_tokens), its time to first token and total time, and a
+# fingerprint of the stable system prompt prefix. The prefix count per model
+# should stay small (one per chat type / creator combination); if it grows
+# with every request, something volatile has crept into the prefix and the
+# cache stops working. First-token latency is kept separately for warm
+# (mostly cached) and cold requests to show what the cache buys. /llmstats.
+SAMPLES_PER_MODEL = int(os.getenv("METRICS_SAMPLES", 2048))
+WARM_RATIO = 0.5  # share of prompt tokens from cache for a request to count as warm
+
+_lock = threading.Lock()
+_totals = defaultdict(Counter)  # {model: Counter(requests=, prompt=, hit=, miss=, completion=)}
+_first_token = defaultdict(lambda: {"warm": deque(maxlen=SAMPLES_PER_MODEL),
+                                    "cold": deque(maxlen=SAMPLES_PER_MODEL)})
+_latency = defaultdict(lambda: deque(maxlen=SAMPLES_PER_MODEL))
+_prefixes = defaultdict(set)  # {model: {prefix fingerprint}}
+_started_at = time.time()
+
+
+def fingerprint(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def record(model, usage, first_token_seconds=None, seconds=None, prefix=None):
+    """Adds one request. `usage` is the API's usage object (may be None)."""
+    usage = usage or {}
+    prompt = usage.get("prompt_tokens", 0)
+    hit = usage.get("prompt_cache_hit_tokens", 0)
+    miss = usage.get("prompt_cache_miss_tokens", prompt - hit)
+    with _lock:
+        totals = _totals[model]
+        totals["requests"] += 1
+        totals["prompt"] += prompt
+        totals["hit"] += hit
+        totals["miss"] += miss
+        totals["completion"] += usage.get("completion_tokens", 0)
+        if first_token_seconds is not None:
+            warm = prompt and hit / prompt >= WARM_RATIO
+            _first_token[model]["warm" if warm else "cold"].append(first_token_seconds)
+        if seconds is not None:
+            _latency[model].append(seconds)
+        if prefix is not None:
+            _prefixes[model].add(fingerprint(prefix))
+
+
+def snapshot():
+    with _lock:
+        models = {}
+        for model, totals in _totals.items():
+            prompt = totals["hit"] + totals["miss"]
+            models[model] = {
+                **totals,
+                "hit_rate": totals["hit"] / prompt if prompt else 0.0,
+                "first_token_warm": percentile(list(_first_token[model]["warm"]), 50),
+                "first_token_cold": percentile(list(_first_token[model]["cold"]), 50),
+                "latency_p50": percentile(list(_latency[model]), 50),
+                "latency_p95": percentile(list(_latency[model]), 95),
+                "prefixes": len(_prefixes[model]),
+            }
+    return {"since": _started_at, "models": models}
+
+
+def reset():
+    global _started_at
+    with _lock:
+        _totals.clear()
+        _first_token.clear()
+        _latency.clear()
+        _prefixes.clear()
+        _started_at = time.time()
+
+
+def format_report():
+    """Plain-text dump for /llmstats."""
+    snap = snapshot()
+    minutes = (time.time() - snap["since"]) / 60
+    lines = [f"LLM requests over the last {minutes:.0f} min"]
+    for model, m in sorted(snap["models"].items()):
+        lines.append(
+            f"\n{model}: {m['requests']} requests, {m['prompt']} prompt tokens, "
+            f"{m['hit_rate']:.0%} from cache ({m['hit']} hit / {m['miss']} miss), "
+            f"{m['completion']} completion"
+        )
+        lines.append(
+            f"  first token p50: warm {m['first_token_warm']:.2f}s, "
+            f"cold {m['first_token_cold']:.2f}s; total p50 {m['latency_p50']:.1f}s "
+            f"p95 {m['latency_p95']:.1f}s"
+        )
+        lines.append(f"  {m['prefixes']} distinct system prompt prefixes")
+    if len(lines) == 1:
+        lines.append("\n(no requests recorded yet)")
+    return "\n".join(lines)
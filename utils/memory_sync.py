@@ -3,7 +3,7 @@ import os
 import logging
 import shutil
 from datetime import datetime
-from utils import firebase_db, mimi_embeddings
+from utils import firebase_db, mimi_embeddings, prompt_cache
 
 logger = logging.getLogger(__name__)
 
@@ -35,14 +35,10 @@ def get_identity_narrative(user_id: int) -> str:
     - Public: A 'Lore-Safe' peer narrative.
     """
     if str(user_id) == KUUMIN_ID:
-        # Load the deep narrative for Kuumin
-        if os.path.exists(PERSONA_FILE):
-            try:
-                with open(PERSONA_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    return data.get("narrative", "I am Mimi, your evolving system.")
-            except Exception as e:
-                logger.error(f"Failed to load persona core: {e}")
+        # Load the deep narrative for Kuumin (parsed once, reloaded on change)
+        data = prompt_cache.get_json(PERSONA_FILE, default={})
+        if isinstance(data, dict):
+            return data.get("narrative", "I am Mimi, your evolving system.")
         return "I am Mimi, your evolving system."
     else:
         # Public Narrative
@@ -65,10 +61,7 @@ def initialize_user_archive(user_id: int):
 
     try:
         # Load Public Lore Seed
-        seed_data = []
-        if os.path.exists(PUBLIC_LORE_FILE):
-            with open(PUBLIC_LORE_FILE, "r", encoding="utf-8") as f:
-                seed_data = json.load(f)
+        seed_data = prompt_cache.get_json(PUBLIC_LORE_FILE, default=[])
 
         # Write new archive
         with open(path, "w", encoding="utf-8") as f:
@@ -223,11 +216,8 @@ def add_memory_to_archive(user_id: int, content: str, category: str = "User"):
             with open(vector_path, "w", encoding="utf-8") as f:
                 json.dump(user_vectors, f)
 
-        # 5. Sync to Firestore (Backup)
-        if firebase_db.db:
-            firebase_db.db.collection("users").document(str(user_id)).collection(
-                "memories"
-            ).add(new_item)
+        # 5. Sync to the storage backend (Backup)
+        firebase_db.backend.add_memory(user_id, new_item)
 
         return True
     except Exception as e:
@@ -240,9 +230,6 @@ def sync_memories_to_firestore():
     Bi-directional sync for ALL user archives in the memories directory.
     Iterates through all `archive_{user_id}.json` files and syncs them.
     """
-    if not firebase_db.db:
-        return
-
     try:
         if not os.path.exists(MEMORIES_DIR):
             return
@@ -263,15 +250,9 @@ def sync_memories_to_firestore():
 
                     local_map = {get_mem_hash(m): m for m in local_memories}
 
-                    # 2. Load Firestore Memories
-                    user_mem_ref = (
-                        firebase_db.db.collection("users")
-                        .document(user_id)
-                        .collection("memories")
-                    )
+                    # 2. Load Stored Memories
                     cloud_memories = []
-                    for doc in user_mem_ref.stream():
-                        data = doc.to_dict()
+                    for data in firebase_db.backend.list_memories(user_id):
                         # Normalize keys
                         data["id"] = data.get("id") or int(
                             datetime.now().timestamp() * 1000
@@ -338,18 +319,7 @@ def sync_memories_to_firestore():
 
                     # Write to Cloud
                     if updates_to_cloud:
-                        batch = firebase_db.db.batch()
-                        count = 0
-                        for item in updates_to_cloud:
-                            doc_ref = user_mem_ref.document(str(item.get("id")))
-                            batch.set(doc_ref, item)
-                            count += 1
-                            if count >= 400:
-                                batch.commit()
-                                batch = firebase_db.db.batch()
-                                count = 0
-                        if count > 0:
-                            batch.commit()
+                        firebase_db.backend.put_memories(user_id, updates_to_cloud)
 
                         logger.info(
                             f"Synced {len(updates_to_cloud)} memories Local -> Cloud for {user_id}"
@@ -0,0 +1,290 @@
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+# Storage operation accounting.
+# Every backend call, sync or async (firebase_db_aio), is recorded with its
+# op type, collection, document count and latency, under the Telegram
+# handler that caused it. The handler name travels
+# through a contextvar: set per update in main.py and copied into
+# asyncio.to_thread workers. Admins read the totals with /dbstats.
+SAMPLES_PER_KEY = int(os.getenv("METRICS_SAMPLES", 2048))
+
+current_handler = contextvars.ContextVar("mimi_handler", default="background")
+
+_lock = threading.Lock()
+_ops = defaultdict(Counter)  # {handler: Counter({"read:users": calls})}
+_docs = defaultdict(Counter)  # {handler: Counter({"read:users": documents})}
+_latency = defaultdict(lambda: deque(maxlen=SAMPLES_PER_KEY))  # {handler: seconds}
+_op_latency = defaultdict(lambda: deque(maxlen=SAMPLES_PER_KEY))  # {"read:users": seconds}
+_errors = Counter()  # {handler: failed calls}
+_started_at = time.time()
+
+
+def set_handler(name):
+    """Tags the current context (update task, aggregator loop) with a handler name."""
+    return current_handler.set(name)
+
+
+def handler_name_for(update):
+    """Short label for an incoming update: /command, callback:prefix or message."""
+    if getattr(update, "callback_query", None) and update.callback_query.data:
+        return f"callback:{update.callback_query.data.split('_', 1)[0]}"
+    message = getattr(update, "effective_message", None)
+    text = getattr(message, "text", None) or ""
+    if text.startswith("/"):
+        return text.split()[0].split("@")[0].lower()
+    if message is not None:
+        return "message"
+    return "other"
+
+
+def record(op, collection, docs, seconds, handler=None, error=False):
+    handler = handler or current_handler.get()
+    key = f"{op}:{collection}"
+    with _lock:
+        _ops[handler][key] += 1
+        _docs[handler][key] += docs
+        _latency[handler].append(seconds)
+        _op_latency[key].append(seconds)
+        if error:
+            _errors[handler] += 1
+
+
+class track:
+    """
+    Context manager that times one storage call:
+
+        with metrics.track("read", "users") as op:
+            doc = await ref.get()
+            op.docs = 1
+    """
+
+    def __init__(self, op, collection, docs=1):
+        self.op = op
+        self.collection = collection
+        self.docs = docs
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(
+            self.op,
+            self.collection,
+            self.docs if exc_type is None else 0,
+            time.perf_counter() - self._start,
+            error=exc_type is not None,
+        )
+        return False
+
+
+def count_docs(result):
+    """Best-effort document count for a storage call's return value."""
+    if result is None or isinstance(result, bool):
+        return 0 if result is None else 1
+    if isinstance(result, int):
+        return result
+    if isinstance(result, (list, tuple, set)):
+        return len(result)
+    if getattr(result, "exists", True) is False:
+        return 0
+    return 1
+
+
+# op type and collection for each StorageBackend method
+BACKEND_OPS = {
+    "get_user": ("read", "users"),
+    "merge_user": ("write", "users"),
+    "list_user_ids": ("query", "users"),
+    "list_users": ("query", "users"),
+    "user_activity_page": ("query", "users"),
+    "audience_page": ("query", "audience"),
+    "put_audience": ("write", "audience"),
+    "append_messages": ("write", "messages"),
+    "get_message_count": ("read", "chats"),
+    "count_messages": ("aggregate", "messages"),
+    "recent_messages": ("query", "messages"),
+    "delete_oldest_messages": ("delete", "messages"),
+    "delete_messages": ("delete", "messages"),
+    "delete_legacy_conversations": ("delete", "conversations"),
+    "save_post": ("write", "aggregated_posts"),
+    "get_post": ("read", "aggregated_posts"),
+    "find_post": ("query", "aggregated_posts"),
+    "latest_posts": ("query", "aggregated_posts"),
+    "posts_with_local_files": ("query", "aggregated_posts"),
+    "get_post_index": ("read", "post_index"),
+    "put_post_index": ("write", "post_index"),
+    "get_setting": ("read", "settings"),
+    "merge_setting": ("write", "settings"),
+    "watch_setting": ("listen", "settings"),
+    "lease_counter": ("transaction", "settings"),
+    "release_counter": ("transaction", "settings"),
+    "add_memory": ("write", "memories"),
+    "list_memories": ("query", "memories"),
+    "put_memories": ("write", "memories"),
+    "add_announcement": ("write", "announcements"),
+}
+
+
+def _backend_doc_count(method, args, result):
+    if method == "append_messages":
+        sent = sum(len(msgs) for _, msgs in args[0])
+        return sent - len(result or [])
+    if method == "put_audience":
+        return len(args[0])
+    if method == "put_memories":
+        return len(args[1])
+    op = BACKEND_OPS[method][0]
+    if op in ("write", "transaction", "aggregate", "listen"):
+        return 1
+    return count_docs(result)
+
+
+class InstrumentedBackend:
+    """Proxy that records every StorageBackend call (see BACKEND_OPS)."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.name = backend.name
+
+    def __getattr__(self, attr):
+        value = getattr(self._backend, attr)
+        if attr not in BACKEND_OPS or not callable(value):
+            return value
+        op, collection = BACKEND_OPS[attr]
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            with track(op, collection) as t:
+                result = value(*args, **kwargs)
+                t.docs = _backend_doc_count(attr, args, result)
+            return result
+
+        return call
+
+
+class InstrumentedAsyncBackend:
+    """InstrumentedBackend for an AsyncStorageBackend (utils/firebase_db_aio.py)."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.name = backend.name
+
+    def __getattr__(self, attr):
+        value = getattr(self._backend, attr)
+        if attr not in BACKEND_OPS or not callable(value):
+            return value
+        op, collection = BACKEND_OPS[attr]
+
+        async def call(*args, **kwargs):
+            with track(op, collection) as t:
+                result = await value(*args, **kwargs)
+                t.docs = _backend_doc_count(attr, args, result)
+            return result
+
+        return call
+
+
+def timed(op, collection):
+    """Decorator for sync storage helpers outside the backend (FirebaseManager)."""
+
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with track(op, collection) as t:
+                result = fn(*args, **kwargs)
+                if op not in ("write", "delete"):
+                    t.docs = count_docs(result)
+            return result
+
+        return inner
+
+    return wrap
+
+
+# --- Reporting ---
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (0 if empty)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _summary(samples):
+    samples = list(samples)
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+
+def snapshot():
+    """Per-handler and per-operation totals with latency percentiles (seconds)."""
+    with _lock:
+        handlers = {
+            handler: {
+                "ops": dict(_ops[handler]),
+                "docs": dict(_docs[handler]),
+                "errors": _errors[handler],
+                "latency": _summary(_latency[handler]),
+            }
+            for handler in _ops
+        }
+        operations = {key: _summary(samples) for key, samples in _op_latency.items()}
+    return {
+        "since": _started_at,
+        "handlers": handlers,
+        "operations": operations,
+    }
+
+
+def reset():
+    global _started_at
+    with _lock:
+        _ops.clear()
+        _docs.clear()
+        _latency.clear()
+        _op_latency.clear()
+        _errors.clear()
+        _started_at = time.time()
+
+
+def format_report(top=10):
+    """Plain-text dump for /dbstats, busiest handlers first."""
+    snap = snapshot()
+    minutes = (time.time() - snap["since"]) / 60
+    lines = [f"Storage ops over the last {minutes:.0f} min"]
+    ranked = sorted(
+        snap["handlers"].items(),
+        key=lambda item: sum(item[1]["docs"].values()),
+        reverse=True,
+    )
+    for handler, data in ranked[:top]:
+        lat = data["latency"]
+        reads = sum(n for k, n in data["docs"].items() if not k.startswith(("write", "delete")))
+        writes = sum(n for k, n in data["docs"].items() if k.startswith(("write", "delete")))
+        lines.append(
+            f"\n{handler}: {lat['count']} calls, {reads} docs read, {writes} written"
+            + (f", {data['errors']} errors" if data["errors"] else "")
+        )
+        lines.append(
+            f"  p50 {lat['p50'] * 1000:.1f}ms  p95 {lat['p95'] * 1000:.1f}ms  "
+            f"p99 {lat['p99'] * 1000:.1f}ms"
+        )
+        busiest = sorted(data["docs"].items(), key=lambda kv: kv[1], reverse=True)[:3]
+        lines.append("  " + ", ".join(f"{k}={n}" for k, n in busiest))
+    if len(lines) == 1:
+        lines.append("\n(no storage calls recorded yet)")
+    return "\n".join(lines)
@@ -1,9 +1,9 @@
-import requests
 import json
 import os
 import math
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
+from utils import http_clients
 
 load_dotenv()
 
@@ -13,15 +13,9 @@ CLI_ROOT = "/home/kuumin/Projects/mimi-cli"
 VECTORS_FILE = os.path.join(CLI_ROOT, "mimi_memory_vectors.json")
 ARCHIVE_FILE = os.path.join(CLI_ROOT, "mimi_memory_archive.json")
 
-# Caches
-_http_session = None
-
 
 def get_session():
-    global _http_session
-    if _http_session is None:
-        _http_session = requests.Session()
-    return _http_session
+    return http_clients.get_session()
 
 
 def get_embedding(text: str) -> Optional[List[float]]:
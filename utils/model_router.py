@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from utils.metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# Model routing for the agent's tool loop.
+# Each step ("chat" for the opening turn, "reasoning" after tool calls) has
+# an ordered list of routes (model + endpoint). Every route keeps a rolling
+# window of outcomes and time-to-first-token; a circuit breaker opens when
+# the error rate or median first-token latency gets too high and skips the
+# route for COOLDOWN seconds, then lets one probe request through.
+# A request that has produced no token after HEDGE_DELAY seconds gets a
+# hedged twin on the next route; whichever streams first wins and the other
+# is cancelled. MODEL_HEDGE_DELAY=0 turns hedging off.
+# A 4xx other than 408/429 means our payload was rejected (bad tool schema,
+# context too long): it raises RequestError without scoring the route or
+# trying the next one, which would reject the same request.
+DEEPSEEK_URL = "https://api.deepseek.com"
+OPENROUTER_URL = "https://openrouter.ai/api/v1"
+
+HEDGE_DELAY = float(os.getenv("MODEL_HEDGE_DELAY", 12))
+FIRST_TOKEN_TIMEOUT = float(os.getenv("MODEL_FIRST_TOKEN_TIMEOUT", 60))
+STREAM_TIMEOUT = 120.0
+WINDOW = 20  # outcomes kept per route
+MIN_SAMPLES = 4
+MAX_ERROR_RATE = 0.5
+SLOW_FIRST_TOKEN = float(os.getenv("MODEL_SLOW_FIRST_TOKEN", 20))
+COOLDOWN = float(os.getenv("MODEL_BREAKER_COOLDOWN", 60))
+
+
+class RouteError(Exception):
+    pass
+
+
+class RequestError(RouteError):
+    """The endpoint rejected the request itself; other routes would too."""
+
+
+class Route:
+    def __init__(self, name, model, base_url, api_key_env):
+        self.name = name
+        self.model = model
+        self.url = f"{base_url}/chat/completions"
+        self.api_key_env = api_key_env
+        self.outcomes = deque(maxlen=WINDOW)  # (ok, first_token_seconds or None)
+        self.opened_at = None  # breaker open since (monotonic), None when closed
+        self.probing = False  # a half-open probe is in flight
+
+    @property
+    def api_key(self):
+        return os.getenv(self.api_key_env)
+
+    def record(self, ok, first_token=None):
+        self.outcomes.append((ok, first_token))
+        if self.opened_at is not None:
+            # Result of the half-open probe
+            self.probing = False
+            if ok:
+                self.opened_at = None
+                self.outcomes.clear()
+                logger.info(f"Model route {self.name} recovered, breaker closed")
+            else:
+                self.opened_at = time.monotonic()
+            return
+        self._check()
+
+    def record_stream_failure(self, first_token):
+        """
+        Turns the success recorded when a stream opened (with `first_token`)
+        into a failure, so a broken stream counts once, not twice.
+        """
+        for i in range(len(self.outcomes) - 1, -1, -1):
+            if self.outcomes[i] == (True, first_token):
+                self.outcomes[i] = (False, None)
+                break
+        else:
+            self.outcomes.append((False, None))  # window cleared since (probe closed it)
+        if self.opened_at is None:
+            self._check()
+
+    def _check(self):
+        if self._degraded():
+            self.opened_at = time.monotonic()
+            logger.warning(f"Model route {self.name} degraded ({self.describe()}), breaker open")
+
+    def _degraded(self):
+        if len(self.outcomes) < MIN_SAMPLES:
+            return False
+        errors = sum(1 for ok, _ in self.outcomes if not ok)
+        if errors / len(self.outcomes) >= MAX_ERROR_RATE:
+            return True
+        latencies = [t for ok, t in self.outcomes if ok and t is not None]
+        return len(latencies) >= MIN_SAMPLES and percentile(latencies, 50) > SLOW_FIRST_TOKEN
+
+    def available(self):
+        """True if requests may go to this route now (closed, or due a probe)."""
+        if not self.api_key:
+            return False
+        if self.opened_at is None:
+            return True
+        return not self.probing and time.monotonic() - self.opened_at >= COOLDOWN
+
+    def describe(self):
+        errors = sum(1 for ok, _ in self.outcomes if not ok)
+        latencies = [t for ok, t in self.outcomes if ok and t is not None]
+        state = "open" if self.opened_at is not None else "closed"
+        return (
+            f"{state}, {errors}/{len(self.outcomes)} errors, "
+            f"first token p50 {percentile(latencies, 50):.1f}s"
+        )
+
+
+ROUTES = {
+    "reasoner": Route("reasoner", "deepseek-reasoner", DEEPSEEK_URL, "DEEPSEEK_API_KEY"),
+    "chat": Route("chat", "deepseek-chat", DEEPSEEK_URL, "DEEPSEEK_API_KEY"),
+    "fallback": Route(
+        "fallback",
+        os.getenv("MODEL_FALLBACK", "deepseek/deepseek-chat"),
+        OPENROUTER_URL,
+        "OPENROUTER_API_KEY",
+    ),
+}
+PLANS = {
+    "chat": ["chat", "fallback"],
+    "reasoning": ["reasoner", "chat", "fallback"],
+}
+
+
+def plan(step):
+    """Routes to try for `step`, healthy ones in preference order."""
+    routes = [ROUTES[name] for name in PLANS[step]]
+    healthy = [route for route in routes if route.available()]
+    if healthy:
+        return healthy
+    # Everything is tripped: try the preferred route anyway rather than fail
+    return [route for route in routes if route.api_key][:1]
+
+
+def _has_token(line):
+    """True for an SSE data line carrying content, reasoning or tool calls."""
+    if not line.startswith("data: ") or line == "data: [DONE]":
+        return False
+    try:
+        chunk = json.loads(line[6:])
+    except ValueError:
+        return False
+    for choice in chunk.get("choices") or []:
+        delta = choice.get("delta") or {}
+        if delta.get("content") or delta.get("reasoning_content") or delta.get("tool_calls"):
+            return True
+    return False
+
+
+def _connect(route, payload):
+    """The streaming request for `route` (an async context manager yielding the response)."""
+    from utils import http_clients
+
+    client = http_clients.get_client(route.url)
+    return client.stream(
+        "POST",
+        route.url,
+        headers={
+            "Authorization": f"Bearer {route.api_key}",
+            "Content-Type": "application/json",
+        },
+        json={**payload, "model": route.model},
+        timeout=STREAM_TIMEOUT,
+    )
+
+
+class Stream:
+    """An open response from the winning route, first token already read."""
+
+    def __init__(self, route, request, lines, head, first_token):
+        self.route = route
+        self.first_token = first_token
+        self._request = request
+        self._lines = lines
+        self._head = head
+
+    async def lines(self):
+        for line in self._head:
+            yield line
+        async for line in self._lines:
+            yield line
+
+    async def aclose(self):
+        await self._request.__aexit__(None, None, None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+async def _open(route, payload):
+    started = time.monotonic()
+    request = _connect(route, payload)
+    response = await request.__aenter__()
+    try:
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            raise RequestError(f"{route.name}: HTTP {response.status_code}")
+        if response.status_code != 200:
+            raise RouteError(f"{route.name}: HTTP {response.status_code}")
+        lines = response.aiter_lines()
+        head = []
+        async for line in lines:
+            head.append(line)
+            if _has_token(line) or line == "data: [DONE]":
+                break
+        return Stream(route, request, lines, head, time.monotonic() - started)
+    except BaseException:
+        await request.__aexit__(None, None, None)
+        raise
+
+
+async def _attempt(route, payload):
+    """_open with the first-token deadline, recording the outcome on the route."""
+    if route.opened_at is not None:
+        route.probing = True  # half-open: this request decides the breaker
+    try:
+        stream = await asyncio.wait_for(_open(route, payload), FIRST_TOKEN_TIMEOUT)
+    except asyncio.CancelledError:
+        # Lost a hedge race: says nothing about the route's health, so it
+        # isn't recorded (a cancelled probe just frees the half-open slot)
+        route.probing = False
+        raise
+    except RequestError as e:
+        # Our payload's fault, not the route's
+        route.probing = False
+        logger.warning(f"Model route {route.name} rejected the request: {e!r}")
+        raise
+    except Exception as e:
+        route.record(False)
+        logger.warning(f"Model route {route.name} failed: {e!r}")
+        raise
+    route.record(True, stream.first_token)
+    return stream
+
+
+async def open_stream(step, payload):
+    """
+    Starts the request for `step` and returns the first route's Stream to
+    produce a token. Falls through to the next route on errors and hedges
+    to it after HEDGE_DELAY; raises the last error if every route fails,
+    or RequestError at once if the request itself was rejected.
+    """
+    routes = plan(step)
+    if not routes:
+        raise RouteError(f"No model route configured for {step}")
+    queue = list(routes)
+    tasks = {}
+    last_error = None
+
+    def launch():
+        route = queue.pop(0)
+        tasks[asyncio.create_task(_attempt(route, payload))] = route
+
+    launch()
+    try:
+        while tasks:
+            hedge = HEDGE_DELAY if HEDGE_DELAY > 0 and queue and len(tasks) == 1 else None
+            done, _ = await asyncio.wait(
+                tasks, timeout=hedge, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                print(f"DEBUG: {tasks[next(iter(tasks))].name} slow, hedging to {queue[0].name}")
+                launch()
+                continue
+            for task in done:
+                del tasks[task]
+                if task.exception() is None:
+                    return task.result()
+                if isinstance(task.exception(), RequestError):
+                    raise task.exception()
+                last_error = task.exception()
+            if not tasks and queue:
+                launch()
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, Stream):
+                    await result.aclose()  # finished just as it lost
+
+
+def report_failure(stream):
+    """Marks a stream that broke after its first token as a failure."""
+    stream.route.record_stream_failure(stream.first_token)
+
+
+def format_status():
+    return "\n".join(f"{name}: {route.model} {route.describe()}" for name, route in ROUTES.items())
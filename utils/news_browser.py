@@ -1,9 +1,11 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from utils import firebase_db
+from utils import news_feed
 
 
-async def display_news_cards(update: Update, context: ContextTypes.DEFAULT_TYPE, docs):
+async def display_news_cards(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, docs, next_cursor=None
+):
     """Utility to send news cards to the user."""
     chat_id = update.effective_chat.id
 
@@ -48,13 +50,13 @@ async def display_news_cards(update: Update, context: ContextTypes.DEFAULT_TYPE,
         except Exception as e:
             print(f"⚠️ Error sending news card: {e}")
 
-    # Pagination
-    if len(docs) >= 5:
-        last_ts = docs[-1].to_dict().get("timestamp")
+    # Pagination (the cursor is the last post's document ID)
+    if next_cursor:
+        news_feed.prefetch(next_cursor)
         keyboard = [
             [
                 InlineKeyboardButton(
-                    "Next 5 Posts ➡️", callback_data=f"news_more_{last_ts}"
+                    "Next 5 Posts ➡️", callback_data=f"news_more_{next_cursor}"
                 )
             ]
         ]
@@ -78,13 +80,13 @@ async def news_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    docs = firebase_db.get_latest_news(limit=5)
+    docs, next_cursor = await news_feed.get_page()
     if not docs:
         await update.message.reply_text("📭 No news aggregated yet.")
         return
 
     await update.message.reply_text("📡 <b>Latest PASUM News</b>", parse_mode="HTML")
-    await display_news_cards(update, context, docs)
+    await display_news_cards(update, context, docs, next_cursor)
 
 
 async def news_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -93,13 +95,13 @@ async def news_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     if query.data.startswith("news_more_"):
-        last_ts = query.data.replace("news_more_", "")
-        docs = firebase_db.get_latest_news(limit=5, last_timestamp=last_ts)
+        cursor = query.data.replace("news_more_", "")
+        docs, next_cursor = await news_feed.get_page(cursor)
         if not docs:
             await query.edit_message_text("🔚 You've reached the end of the news feed.")
             return
 
-        await display_news_cards(update, context, docs)
+        await display_news_cards(update, context, docs, next_cursor)
 
     elif query.data.startswith("reply_"):
         post_id = query.data.replace("reply_", "")
@@ -0,0 +1,174 @@
+import asyncio
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.storage import StoredDoc
+
+# Materialized /news feed: the newest FEED_SIZE news posts, kept in memory.
+# Post saves (aggregator, submissions) update cached posts in place or mark
+# the feed stale when a new post appears. Page cursors are post document IDs,
+# which stay valid as new posts arrive. Pages past the cached window are
+# read from storage and prefetched one page ahead.
+FEED_SIZE = int(os.getenv("NEWS_FEED_SIZE", 25))
+FEED_TTL = float(os.getenv("NEWS_FEED_TTL", 300))
+PAGE_SIZE = 5
+NEWS_STATUSES = ("trusted", "confession", "complaint")
+
+_feed = []  # [StoredDoc, ...] newest first
+_loaded_at = None
+_prefetched = OrderedDict()  # {cursor: [StoredDoc, ...]} pages beyond the feed
+_MAX_PREFETCHED = 20
+_prefetches = set()  # running prefetch tasks; the loop only keeps weak references
+_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "loads": 0, "prefetches": 0}
+
+
+def _db():
+    from utils import firebase_db_aio
+
+    return firebase_db_aio
+
+
+def _as_doc(doc):
+    return doc if isinstance(doc, StoredDoc) else StoredDoc(doc.id, doc.to_dict())
+
+
+def _is_fresh():
+    return _loaded_at is not None and time.monotonic() - _loaded_at <= FEED_TTL
+
+
+def invalidate():
+    global _loaded_at
+    with _lock:
+        _loaded_at = None
+        _prefetched.clear()
+
+
+def note_saved(doc_id, data):
+    """Keeps the feed in step with a post write (called from firebase_db/_aio)."""
+    global _loaded_at
+    if not doc_id:
+        return
+    with _lock:
+        for i, doc in enumerate(_feed):
+            if doc.id == doc_id:
+                merged = doc.to_dict()
+                merged.update(data)
+                if merged.get("status") in NEWS_STATUSES:
+                    _feed[i] = StoredDoc(doc_id, merged)
+                else:
+                    del _feed[i]
+                    _loaded_at = None  # the window is now one short
+                _prefetched.clear()
+                return
+        if data.get("status") in NEWS_STATUSES:
+            # A new (or newly visible) post: reload on the next /news
+            _loaded_at = None
+            _prefetched.clear()
+
+
+def cached_post(doc_id):
+    """Returns a post held by the feed (kept current by note_saved), or None."""
+    with _lock:
+        if not _is_fresh():
+            return None
+        return next((doc for doc in _feed if doc.id == doc_id), None)
+
+
+def _is_legacy_cursor(cursor):
+    """Old keyboards carry an ISO timestamp instead of a document ID."""
+    try:
+        datetime.datetime.fromisoformat(cursor)
+        return True
+    except ValueError:
+        return False
+
+
+async def _load():
+    global _feed, _loaded_at
+    docs = await _db().get_latest_news(limit=FEED_SIZE)
+    with _lock:
+        _feed = [_as_doc(doc) for doc in docs]
+        _loaded_at = time.monotonic()
+        _prefetched.clear()
+        stats["loads"] += 1
+
+
+async def _fetch_after(cursor):
+    """Reads the page after `cursor` (a doc ID or legacy timestamp) from storage."""
+    if _is_legacy_cursor(cursor):
+        last_ts = cursor
+    else:
+        with _lock:
+            last_ts = next((d.get("timestamp") for d in _feed if d.id == cursor), None)
+        if last_ts is None:
+            anchor = await _db().get_post(cursor)
+            if not anchor or not anchor.exists:
+                return []
+            last_ts = anchor.get("timestamp")
+    docs = await _db().get_latest_news(limit=PAGE_SIZE, last_timestamp=last_ts)
+    return [_as_doc(doc) for doc in docs]
+
+
+def _from_memory(cursor):
+    """Returns the cached page after `cursor`, or None if it is not in memory."""
+    with _lock:
+        if cursor in _prefetched:
+            _prefetched.move_to_end(cursor)
+            return list(_prefetched[cursor])
+        if not _is_fresh():
+            return None
+        if cursor is None:
+            return _feed[:PAGE_SIZE]
+        for i, doc in enumerate(_feed):
+            if doc.id == cursor:
+                page = _feed[i + 1 : i + 1 + PAGE_SIZE]
+                # A short page at the end of the window may have more in storage
+                if len(page) == PAGE_SIZE or len(_feed) < FEED_SIZE:
+                    return page
+                return None
+    return None
+
+
+async def get_page(cursor=None):
+    """
+    Returns (docs, next_cursor) for the first page (cursor=None) or the page
+    after `cursor`. next_cursor is None at the end of the feed.
+    """
+    docs = _from_memory(cursor)
+    if docs is not None:
+        stats["hits"] += 1
+    else:
+        stats["misses"] += 1
+        if cursor is None or (not _is_fresh() and not _is_legacy_cursor(cursor)):
+            await _load()
+            docs = _from_memory(cursor)
+        if docs is None:
+            docs = await _fetch_after(cursor)
+    next_cursor = docs[-1].id if len(docs) >= PAGE_SIZE else None
+    return docs, next_cursor
+
+
+def prefetch(cursor):
+    """Starts loading the page after `cursor` in the background if it is not in memory."""
+    if cursor is None or _from_memory(cursor) is not None:
+        return
+
+    async def run():
+        try:
+            docs = await _fetch_after(cursor)
+        except Exception as e:
+            print(f"⚠️ News prefetch failed: {e}")
+            return
+        with _lock:
+            _prefetched[cursor] = docs
+            while len(_prefetched) > _MAX_PREFETCHED:
+                _prefetched.popitem(last=False)
+            stats["prefetches"] += 1
+
+    task = asyncio.create_task(run())
+    _prefetches.add(task)
+    task.add_done_callback(_prefetches.discard)
@@ -5,7 +5,7 @@ from telegram.ext import (
     filters,
     ContextTypes,
 )
-from utils import globals, firebase_db
+from utils import globals, firebase_db_aio
 import os
 import random
 
@@ -33,17 +33,14 @@ async def pasum_match(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🔍 Finding study partners from the PASUM community..."
     )
 
-    all_users = firebase_db.get_all_user_ids()
-    other_users = [uid for uid in all_users if uid != str(user.id)]
+    matches = await firebase_db_aio.sample_audience(5, exclude=user.id)
 
-    if not other_users:
+    if not matches:
         await update.message.reply_text(
             "No other students found yet! Be the first to join! 🌟"
         )
         return
 
-    matches = random.sample(other_users, min(5, len(other_users)))
-
     text = f"💘 **Study Partners for {user.first_name}** 💘\n\n"
     text += "Found some potential study partners from the PASUM community!\n\n"
 
@@ -1,4 +1,3 @@
-import os
 import asyncio
 import datetime
 import random
@@ -6,7 +5,10 @@ import time
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
-from utils import firebase_db, ai_agent, vision, concurrency
+from utils import firebase_db, firebase_db_aio, ai_agent, vision, admission, edit_scheduler
+
+# Background notices and profile writes; the loop only keeps weak references to tasks
+_tasks = set()
 
 
 async def pipe_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -28,17 +30,9 @@ async def pipe_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     is_summoned = False
 
     # 1. Background Logging (Always listen in groups)
+    # log_conversation only queues in memory; the batched write happens off-loop
     if chat_type in ["group", "supergroup"] and text:
-        loop = asyncio.get_running_loop()
-        loop.run_in_executor(
-            concurrency.get_pool(),
-            firebase_db.log_conversation,
-            telegram_id,
-            "user",
-            text,
-            chat_id,
-            user_name
-        )
+        firebase_db.log_conversation(telegram_id, "user", text, chat_id, user_name)
 
     # 2. Trigger Check
     if chat_type in ["group", "supergroup"]:
@@ -74,24 +68,90 @@ async def pipe_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_summoned:
         return
 
-    # 3. Update User Profile in Background
+    # 3. Profile fields (name, username, last_active): a text turn writes them
+    # with its UserStateSession commit in ai_agent.stream_ai_response; every
+    # other summon (images, PDFs, shed requests) gets its own background write
+    agent_turn = False
+
+    # 4. Wait for an LLM slot. A queue notice is only sent if we actually
+    # have to wait; the text path reuses it as the splash message.
+    priority = admission.priority_for(chat_type, is_mention, is_reply_to_bot)
+    queue_msg = None
+
+    def show_position(position):
+        nonlocal queue_msg
+        notice = f"⏳ Lots of questions right now, you're #{position} in line."
+        if queue_msg is None:
+            queue_msg = _spawn(update.message.reply_text(notice))
+        else:
+            _spawn(_edit_notice(queue_msg, notice))
+
     try:
-        user_data = {
-            "name": user.full_name,
-            "username": user.username,
-            "last_active": datetime.datetime.now(),
-        }
-        loop = asyncio.get_running_loop()
-        loop.run_in_executor(
-            concurrency.get_pool(),
-            firebase_db.create_or_update_user,
-            telegram_id,
-            user_data,
-        )
-    except:
+        # Nobody asked for an interjection, so nobody is told where it stands
+        on_position = show_position if priority != "interjection" else None
+        async with admission.slot(telegram_id, chat_id, priority, on_position):
+            agent_turn = await _answer(
+                update, context, text, chat_id, is_mention, is_reply_to_bot, queue_msg
+            )
+    except admission.Rejected as e:
+        print(f"DEBUG: [ADMISSION] {priority} from {telegram_id} in {chat_id} dropped: {e}")
+        if priority != "interjection":
+            notice = "😵 I'm swamped right now, please ask again in a minute."
+            if queue_msg is None:
+                await update.message.reply_text(notice)
+            else:
+                await _edit_notice(queue_msg, notice)
+        elif queue_msg is not None:
+            _spawn(_delete_notice(queue_msg))
+    finally:
+        if not agent_turn:
+            _touch_profile(user)
+
+
+def _touch_profile(user):
+    user_data = {
+        "name": user.full_name,
+        "username": user.username,
+        "last_active": datetime.datetime.now(),
+    }
+    _spawn(_write_profile(user.id, user_data))
+
+
+def _spawn(coro):
+    """Runs `coro` in the background, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+def _finished(task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"DEBUG: Background task failed: {task.exception()!r}")
+
+
+async def _write_profile(telegram_id, user_data):
+    try:
+        await firebase_db_aio.create_or_update_user(telegram_id, user_data)
+    except Exception as e:
+        print(f"DEBUG: Profile update failed for {telegram_id}: {e}")
+
+
+async def _edit_notice(task, text):
+    edit_scheduler.submit(await task, text)
+
+
+async def _delete_notice(task):
+    try:
+        await (await task).delete()
+    except Exception:
         pass
 
-    # 4. Vision Priority
+
+async def _answer(update, context, text, chat_id, is_mention, is_reply_to_bot, queue_msg):
+    """Returns True if the turn went to the agent (which commits the profile)."""
+    # 5. Vision Priority
     target_photo = update.message.photo
     target_doc = update.message.document
     
@@ -101,35 +161,46 @@ async def pipe_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if target_doc and target_doc.mime_type == "application/pdf":
         context.user_data["processing_pdf"] = True
+        if queue_msg is not None:
+            _spawn(_delete_notice(queue_msg))
         await vision.process_pdf_question(update, context)
-        return
+        return False
 
     if target_photo:
         context.user_data["processing_image"] = True
+        if queue_msg is not None:
+            _spawn(_delete_notice(queue_msg))
         await vision.process_image_question(update, context)
-        return
+        return False
 
-    # 4b. Skip if media processing flag is set (prevents duplicate handling)
+    # 5b. Skip if media processing flag is set (prevents duplicate handling)
     if context.user_data.get("processing_image") or context.user_data.get("processing_pdf"):
         context.user_data["processing_image"] = False
         context.user_data["processing_pdf"] = False
-        return
+        return False
 
-    # 5. Text Streaming
+    # 6. Text Streaming
     if text or update.message.caption:
         # For interjections, we are more lenient with length
         if not is_mention and not is_reply_to_bot and not text:
-             return
-        await context.bot.send_chat_action(
-            chat_id=update.effective_chat.id, action=ChatAction.TYPING
+             return False
+        _spawn(
+            context.bot.send_chat_action(
+                chat_id=update.effective_chat.id, action=ChatAction.TYPING
+            )
         )
 
-        # Random splash text
+        # Random splash text; sent while the agent assembles its context
         splash = random.choice(vision.SPLASH_TEXTS)
-        status_msg = await update.message.reply_text(f"🤔 {splash}")
+        if queue_msg is None:
+            status_msg = _spawn(update.message.reply_text(f"🤔 {splash}"))
+        else:
+            status_msg = queue_msg
+            _spawn(_edit_notice(queue_msg, f"🤔 {splash}"))
 
         # Call the new AI Agent (Tool-enabled) with chat_id for scoping
         await ai_agent.stream_ai_response(
             update, context, status_msg, text, chat_id
         )
-        return
+        return True
+    return False
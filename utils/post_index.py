@@ -0,0 +1,62 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Short post ID -> document index for recent posts.
+# Entries are {"doc_id", "dest_msg_id"}. They are filled when posts are saved
+# and mirrored to post_index/{post_id} lookup documents, so /reply resolves
+# a post with direct gets instead of a where("post_id", "==", ...) query.
+MAX_ENTRIES = int(os.getenv("POST_INDEX_SIZE", 2000))
+
+_entries = OrderedDict()  # {post_id: {"doc_id": ..., "dest_msg_id": ...}}
+_by_doc = {}  # {doc_id: post_id}
+_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0}
+
+
+def _key(post_id):
+    return str(post_id)
+
+
+def lookup(post_id):
+    """Returns a copy of the entry for `post_id`, or None if it is not in memory."""
+    with _lock:
+        entry = _entries.get(_key(post_id))
+        if entry is None:
+            stats["misses"] += 1
+            return None
+        _entries.move_to_end(_key(post_id))
+        stats["hits"] += 1
+        return dict(entry)
+
+
+def post_id_for(doc_id):
+    with _lock:
+        return _by_doc.get(doc_id)
+
+
+def remember(post_id, doc_id, dest_msg_id=None):
+    """
+    Records a post. Returns the entry if it is new or changed (and so should
+    be written to post_index/{post_id}), else None.
+    """
+    key = _key(post_id)
+    with _lock:
+        current = _entries.get(key)
+        if dest_msg_id is None and current and current["doc_id"] == doc_id:
+            dest_msg_id = current.get("dest_msg_id")
+        entry = {"doc_id": doc_id, "dest_msg_id": dest_msg_id}
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        _by_doc[doc_id] = key
+        while len(_entries) > MAX_ENTRIES:
+            _, evicted = _entries.popitem(last=False)
+            _by_doc.pop(evicted["doc_id"], None)
+        return None if entry == current else dict(entry)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _by_doc.clear()
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Prompt files, read once and kept compiled in memory.
+# Each file is re-stat'ed at most every CHECK_INTERVAL seconds and reloaded
+# when its mtime changes; /reloadprompts drops everything at once.
+# Templates are split on {{name}} placeholders up front so filling them is a
+# single join instead of a chain of str.replace calls.
+CHECK_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", 5))
+
+_PLACEHOLDER = re.compile(r"{{(\w+)}}")
+
+_files = {}  # {path: {"mtime", "checked_at", "text", "json", "template"}}
+_composed = {}  # {key: (mtimes, Template)}
+_lock = threading.Lock()
+
+stats = {"reads": 0, "reloads": 0}
+
+
+class Template:
+    """A prompt pre-split into literal text and {{placeholder}} names."""
+
+    def __init__(self, text):
+        pieces = _PLACEHOLDER.split(text)
+        self.literals = pieces[0::2]
+        self.fields = pieces[1::2]
+
+    def render(self, **values):
+        """Fills every placeholder in one pass; unknown ones are left as written."""
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            value = values.get(field)
+            out.append("{{" + field + "}}" if value is None else str(value))
+            out.append(literal)
+        return "".join(out)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _entry(path):
+    """Returns the cache entry for `path`, (re)reading the file if it changed."""
+    now = time.monotonic()
+    with _lock:
+        entry = _files.get(path)
+        if entry is not None and now - entry["checked_at"] < CHECK_INTERVAL:
+            return entry
+    mtime = _mtime(path)
+    if entry is not None and entry["mtime"] == mtime:
+        entry["checked_at"] = now
+        return entry
+
+    text = None
+    if mtime is not None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            logger.error(f"Failed to read prompt {path}: {e}")
+    entry = {"mtime": mtime, "checked_at": now, "text": text}
+    with _lock:
+        if path in _files:
+            stats["reloads"] += 1
+        _files[path] = entry
+        stats["reads"] += 1
+    return entry
+
+
+def get_text(path, default=""):
+    """File contents, or `default` if the file is missing or unreadable."""
+    text = _entry(path)["text"]
+    return default if text is None else text
+
+
+def get_template(path, default=""):
+    entry = _entry(path)
+    if "template" not in entry:
+        entry["template"] = Template(default if entry["text"] is None else entry["text"])
+    return entry["template"]
+
+
+def get_json(path, default=None):
+    """Parsed JSON file, or `default` if it is missing or invalid."""
+    entry = _entry(path)
+    if "json" not in entry:
+        try:
+            entry["json"] = None if entry["text"] is None else json.loads(entry["text"])
+        except ValueError as e:
+            logger.error(f"Failed to parse {path}: {e}")
+            entry["json"] = None
+    return default if entry["json"] is None else entry["json"]
+
+
+def compose(key, paths, build):
+    """
+    Caches a Template built from several files. `build(texts)` receives the
+    current contents of `paths` (None for missing files) and returns the
+    template text; it runs again only when one of the files changes.
+    """
+    entries = [_entry(path) for path in paths]
+    mtimes = tuple(e["mtime"] for e in entries)
+    with _lock:
+        cached = _composed.get(key)
+    if cached is not None and cached[0] == mtimes:
+        return cached[1]
+    template = Template(build([e["text"] for e in entries]))
+    with _lock:
+        _composed[key] = (mtimes, template)
+    return template
+
+
+def reload():
+    """Forgets every cached file so the next use reads from disk. Returns the count."""
+    with _lock:
+        count = len(_files)
+        _files.clear()
+        _composed.clear()
+    return count
@@ -0,0 +1,30 @@
+"""
+Storage backends for Mimi's persistent data.
+
+MIMI_STORAGE_BACKEND selects the implementation:
+  firestore (default) - Google Cloud Firestore, as used in production
+  sqlite              - a local SQLite file at MIMI_SQLITE_PATH (default mimi.db)
+"""
+
+import os
+from utils.storage.base import AsyncStorageBackend, StorageBackend, StoredDoc
+
+BACKENDS = ("firestore", "sqlite")
+
+
+def get_backend(name=None, **kwargs):
+    """Builds the backend named by `name` or MIMI_STORAGE_BACKEND."""
+    name = (name or os.getenv("MIMI_STORAGE_BACKEND", "firestore")).strip().lower()
+    if name == "firestore":
+        from utils.storage.firestore_backend import FirestoreBackend
+
+        return FirestoreBackend(**kwargs)
+    if name == "sqlite":
+        from utils.storage.sqlite_backend import SQLiteBackend
+
+        kwargs.setdefault("path", os.getenv("MIMI_SQLITE_PATH", "mimi.db"))
+        return SQLiteBackend(**kwargs)
+    raise ValueError(f"Unknown storage backend {name!r} (expected one of {BACKENDS})")
+
+
+__all__ = ["BACKENDS", "AsyncStorageBackend", "StorageBackend", "StoredDoc", "get_backend"]
@@ -0,0 +1,211 @@
+import asyncio
+import copy
+
+
+class StoredDoc:
+    """
+    Backend-neutral document record.
+    Mirrors the parts of a Firestore DocumentSnapshot the handlers use
+    (.id, .exists, .to_dict(), .get(field)).
+    """
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+    def __repr__(self):
+        return f"StoredDoc({self.id!r})"
+
+
+class StorageBackend:
+    """
+    Storage interface behind utils/firebase_db.py.
+
+    Collections covered: users, chats/messages, aggregated_posts,
+    settings (incl. counters), memories and announcements.
+    """
+
+    name = "base"
+
+    def aio(self):
+        """The async face of this backend (see AsyncStorageBackend)."""
+        return AsyncStorageBackend(self)
+
+    # --- Users ---
+
+    def get_user(self, user_id):
+        """Returns the user's document as a dict, or None."""
+        raise NotImplementedError
+
+    def merge_user(self, user_id, data, increments=None, delete_fields=None):
+        """Merges `data` into the user doc, adding `increments` to numeric fields."""
+        raise NotImplementedError
+
+    def list_user_ids(self, page_size=500):
+        """All user IDs, read page by page without downloading the documents."""
+        raise NotImplementedError
+
+    def list_users(self, limit=50):
+        """Returns up to `limit` user dicts, each with its "id"."""
+        raise NotImplementedError
+
+    def user_activity_page(self, limit, start_after=None):
+        """[(user_id, last_active), ...] from users, ordered by ID, after `start_after`."""
+        raise NotImplementedError
+
+    # --- Audience index (one tiny entry per user: last_active) ---
+
+    def audience_page(self, limit, start_after=None):
+        """[(user_id, last_active), ...] ordered by ID, after `start_after`."""
+        raise NotImplementedError
+
+    def put_audience(self, entries):
+        """Upserts [(user_id, last_active), ...]."""
+        raise NotImplementedError
+
+    # --- Chats / Messages ---
+
+    def append_messages(self, batches):
+        """
+        Writes [(chat_id, [msg_data, ...]), ...] and bumps each chat's
+        message_count in the same commit. Returns the (chat_id, msg_data)
+        pairs that could not be written.
+        """
+        raise NotImplementedError
+
+    def get_message_count(self, chat_id):
+        """
+        Returns the stored message_count, or None until count_messages has
+        seeded it (chats with history from before the counter existed).
+        """
+        raise NotImplementedError
+
+    def count_messages(self, chat_id):
+        """
+        Counts stored messages directly and seeds message_count with the
+        result, atomically with respect to append_messages. Returns the count.
+        """
+        raise NotImplementedError
+
+    def recent_messages(self, chat_id, limit):
+        """Returns the newest `limit` messages, oldest first."""
+        raise NotImplementedError
+
+    def delete_oldest_messages(self, chat_id, count):
+        """Deletes the oldest `count` messages and decrements message_count."""
+        raise NotImplementedError
+
+    def delete_messages(self, chat_id, before=None, page_size=500, on_progress=None):
+        """
+        Deletes a chat's messages (only those with timestamp <= `before` if
+        given) page by page, decrementing message_count with each page.
+        Calls on_progress(n) after every page; returns the total deleted.
+        """
+        raise NotImplementedError
+
+    def delete_legacy_conversations(self, user_id, page_size=500, on_progress=None):
+        """Deletes users/{id}/conversations (pre-chats history) page by page."""
+        raise NotImplementedError
+
+    # --- Aggregated Posts ---
+
+    def save_post(self, doc_id, data):
+        """Merges `data` into a post (new document if doc_id is None). Returns doc_id."""
+        raise NotImplementedError
+
+    def get_post(self, doc_id):
+        raise NotImplementedError
+
+    def find_post(self, **equals):
+        """First post whose fields equal all of `equals`, as a StoredDoc, or None."""
+        raise NotImplementedError
+
+    def latest_posts(self, statuses, limit, before_timestamp=None):
+        """Newest posts with a status in `statuses`, by timestamp descending."""
+        raise NotImplementedError
+
+    def posts_with_local_files(self, created_before):
+        """Posts created before `created_before` that still have a local_path."""
+        raise NotImplementedError
+
+    def get_post_index(self, post_id):
+        """Returns post_index/{post_id} ({"doc_id", "dest_msg_id"}) or None."""
+        raise NotImplementedError
+
+    def put_post_index(self, post_id, entry):
+        raise NotImplementedError
+
+    # --- Settings & Counters ---
+
+    def get_setting(self, name):
+        """Returns settings/{name} as a dict, or None."""
+        raise NotImplementedError
+
+    def merge_setting(self, name, data, delete_fields=None):
+        raise NotImplementedError
+
+    def watch_setting(self, name, callback):
+        """
+        Calls callback(dict) whenever settings/{name} changes. Returns a
+        handle with unsubscribe() and is_active, or None if unsupported.
+        """
+        return None
+
+    def lease_counter(self, field, size, default=100):
+        """Atomically advances settings/counters.{field} by `size`; returns (first, last)."""
+        raise NotImplementedError
+
+    def release_counter(self, field, next_unused, last):
+        """Rolls the counter back to next_unused - 1 if it still equals `last`."""
+        raise NotImplementedError
+
+    # --- Memories & Announcements ---
+
+    def add_memory(self, user_id, item):
+        raise NotImplementedError
+
+    def list_memories(self, user_id):
+        raise NotImplementedError
+
+    def put_memories(self, user_id, items):
+        """Upserts memories keyed by their "id"."""
+        raise NotImplementedError
+
+    def add_announcement(self, data):
+        raise NotImplementedError
+
+
+class AsyncStorageBackend:
+    """
+    Async interface behind utils/firebase_db_aio.py.
+
+    Every StorageBackend method is available as a coroutine with the same
+    name, arguments and return values. By default the sync method runs in a
+    worker thread; backends with a native async client override the calls
+    async handlers make (see FirestoreAsyncBackend).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def __getattr__(self, attr):
+        method = getattr(self.backend, attr)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return call
@@ -0,0 +1,579 @@
+import logging
+import os
+import uuid
+from google.api_core import exceptions as google_exceptions
+from google.cloud import firestore
+from utils.storage.base import AsyncStorageBackend, StorageBackend, StoredDoc
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPS = 500  # Firestore hard limit per WriteBatch
+SEED_ATTEMPTS = 5  # count_messages retries when a flush lands mid-count
+
+# The seeding write lost a race with a flush (or another seed)
+_SEED_CONFLICTS = (google_exceptions.FailedPrecondition, google_exceptions.Conflict)
+
+
+def create_client(cred_path):
+    """Initializes firebase_admin and returns a Firestore client."""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    # Initialize Firebase Admin (for other features if needed)
+    if not firebase_admin._apps:
+        if os.path.exists(cred_path):
+            firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        else:
+            try:
+                firebase_admin.initialize_app()
+            except:
+                pass
+
+    # Initialize Firestore Client explicitly with credentials to avoid ADC errors
+    if os.path.exists(cred_path):
+        return firestore.Client.from_service_account_json(cred_path)
+    return firestore.Client()
+
+
+def create_async_client(cred_path):
+    """An AsyncClient with the same credentials as create_client."""
+    if os.path.exists(cred_path):
+        return firestore.AsyncClient.from_service_account_json(cred_path)
+    return firestore.AsyncClient()
+
+
+def _to_doc(snapshot):
+    return StoredDoc(snapshot.id, snapshot.to_dict() if snapshot.exists else None)
+
+
+class _SettingWatch:
+    def __init__(self, watch):
+        self._watch = watch
+
+    @property
+    def is_active(self):
+        return getattr(self._watch, "is_active", True)
+
+    def unsubscribe(self):
+        self._watch.unsubscribe()
+
+
+class FirestoreBackend(StorageBackend):
+    name = "firestore"
+
+    def __init__(self, client=None, cred_path=None):
+        self.cred_path = cred_path or os.getenv("FIREBASE_CREDENTIALS", "service-account.json")
+        if client is None:
+            client = create_client(self.cred_path)
+        self.client = client
+
+    def aio(self):
+        return FirestoreAsyncBackend(self)
+
+    # --- Users ---
+
+    def _user_ref(self, user_id):
+        return self.client.collection("users").document(str(user_id))
+
+    def get_user(self, user_id):
+        doc = self._user_ref(user_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def merge_user(self, user_id, data, increments=None, delete_fields=None):
+        payload = dict(data)
+        for field, delta in (increments or {}).items():
+            payload[field] = firestore.Increment(delta)
+        for field in delete_fields or []:
+            payload[field] = firestore.DELETE_FIELD
+        if payload:
+            self._user_ref(user_id).set(payload, merge=True)
+
+    def _id_pages(self, collection, fields, limit, start_after=None):
+        query = (
+            self.client.collection(collection)
+            .select(fields)
+            .order_by("__name__")
+            .limit(limit)
+        )
+        if start_after is not None:
+            query = query.start_after({"__name__": str(start_after)})
+        return list(query.stream())
+
+    def list_user_ids(self, page_size=500):
+        ids = []
+        while True:
+            docs = self._id_pages("users", [], page_size, ids[-1] if ids else None)
+            ids.extend(doc.id for doc in docs)
+            if len(docs) < page_size:
+                return ids
+
+    def list_users(self, limit=50):
+        profiles = []
+        for doc in self.client.collection("users").limit(limit).stream():
+            data = doc.to_dict()
+            data["id"] = doc.id
+            profiles.append(data)
+        return profiles
+
+    def user_activity_page(self, limit, start_after=None):
+        docs = self._id_pages("users", ["last_active"], limit, start_after)
+        return [(doc.id, (doc.to_dict() or {}).get("last_active")) for doc in docs]
+
+    # --- Audience index ---
+
+    def audience_page(self, limit, start_after=None):
+        docs = self._id_pages("audience", ["last_active"], limit, start_after)
+        return [(doc.id, (doc.to_dict() or {}).get("last_active")) for doc in docs]
+
+    def put_audience(self, entries):
+        batch = self.client.batch()
+        count = 0
+        for user_id, last_active in entries:
+            batch.set(
+                self.client.collection("audience").document(str(user_id)),
+                {"last_active": last_active},
+            )
+            count += 1
+            if count >= MAX_BATCH_OPS:
+                batch.commit()
+                batch = self.client.batch()
+                count = 0
+        if count > 0:
+            batch.commit()
+
+    # --- Chats / Messages ---
+
+    def _chat_ref(self, chat_id):
+        return self.client.collection("chats").document(str(chat_id))
+
+    def append_messages(self, batches):
+        failed = []
+        batch = self.client.batch()
+        ops = 0
+        in_batch = []
+
+        def commit():
+            nonlocal batch, ops, in_batch
+            if not in_batch:
+                return
+            try:
+                batch.commit()
+            except Exception as e:
+                logger.error(f"Message batch commit failed ({len(in_batch)} msgs): {e}")
+                failed.extend(in_batch)
+            batch = self.client.batch()
+            ops = 0
+            in_batch = []
+
+        for chat_id, messages in batches:
+            chat_ref = self._chat_ref(chat_id)
+            start = 0
+            while start < len(messages):
+                # Leave one slot for the counter update that rides in the same batch
+                room = MAX_BATCH_OPS - ops - 1
+                if room <= 0:
+                    commit()
+                    continue
+                chunk = messages[start : start + room]
+                for msg_data in chunk:
+                    batch.set(chat_ref.collection("messages").document(), msg_data)
+                    in_batch.append((chat_id, msg_data))
+                batch.set(
+                    chat_ref,
+                    {"message_count": firestore.Increment(len(chunk))},
+                    merge=True,
+                )
+                ops += len(chunk) + 1
+                start += len(chunk)
+        commit()
+        return failed
+
+    def get_message_count(self, chat_id):
+        snapshot = self._chat_ref(chat_id).get()
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict() or {}
+        # append_messages creates message_count with the first Increment, which
+        # misses anything logged before the counter existed; only a count
+        # seeded by count_messages is trusted
+        if not data.get("counted"):
+            return None
+        return data.get("message_count")
+
+    def count_messages(self, chat_id):
+        chat_ref = self._chat_ref(chat_id)
+        conv_ref = chat_ref.collection("messages")
+        total = 0
+        for _ in range(SEED_ATTEMPTS):
+            snapshot = chat_ref.get()
+            data = snapshot.to_dict() or {}
+            if data.get("counted"):
+                return data.get("message_count") or 0  # seeded meanwhile
+            total = self._count_stored(conv_ref)
+            seed = {"message_count": total, "counted": True}
+            try:
+                # A flush commits its Increment to the chat doc, changing
+                # update_time: then this write fails instead of overwriting it
+                if snapshot.exists:
+                    option = self.client.write_option(last_update_time=snapshot.update_time)
+                    chat_ref.update(seed, option=option)
+                else:
+                    chat_ref.create(seed)
+                return total
+            except _SEED_CONFLICTS:
+                continue
+        print(f"DEBUG: Firestore: chat {chat_id} kept changing, message_count left unseeded")
+        return total
+
+    def _count_stored(self, conv_ref):
+        try:
+            result = conv_ref.count().get()
+            return int(result[0][0].value)
+        except Exception as e:
+            print(f"DEBUG: Firestore: count() aggregation unavailable ({e}), streaming ids")
+            return sum(1 for _ in conv_ref.select([]).stream())
+
+    def recent_messages(self, chat_id, limit):
+        docs = (
+            self._chat_ref(chat_id)
+            .collection("messages")
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .limit(limit)
+            .stream()
+        )
+        return [doc.to_dict() for doc in docs][::-1]
+
+    def delete_oldest_messages(self, chat_id, count):
+        chat_ref = self._chat_ref(chat_id)
+        old_docs = list(
+            chat_ref.collection("messages").order_by("timestamp").limit(count).stream()
+        )
+        if not old_docs:
+            return 0
+        batch = self.client.batch()
+        for doc in old_docs:
+            batch.delete(doc.reference)
+        batch.set(
+            chat_ref, {"message_count": firestore.Increment(-len(old_docs))}, merge=True
+        )
+        batch.commit()
+        return len(old_docs)
+
+    def _delete_pages(self, query, page_size, on_progress, counter_ref=None):
+        """Deletes everything matched by `query`, one WriteBatch per page."""
+        # Leave one slot for the counter update that rides in the same batch
+        page_size = max(1, min(page_size, MAX_BATCH_OPS - 1))
+        total = 0
+        while True:
+            refs = [doc.reference for doc in query.select([]).limit(page_size).stream()]
+            if not refs:
+                return total
+            batch = self.client.batch()
+            for ref in refs:
+                batch.delete(ref)
+            if counter_ref is not None:
+                batch.set(
+                    counter_ref,
+                    {"message_count": firestore.Increment(-len(refs))},
+                    merge=True,
+                )
+            batch.commit()
+            total += len(refs)
+            if on_progress:
+                on_progress(len(refs))
+            if len(refs) < page_size:
+                return total
+
+    def delete_messages(self, chat_id, before=None, page_size=500, on_progress=None):
+        chat_ref = self._chat_ref(chat_id)
+        query = chat_ref.collection("messages")
+        if before is not None:
+            query = query.where("timestamp", "<=", before)
+        return self._delete_pages(query, page_size, on_progress, counter_ref=chat_ref)
+
+    def delete_legacy_conversations(self, user_id, page_size=500, on_progress=None):
+        query = self._user_ref(user_id).collection("conversations")
+        return self._delete_pages(query, page_size, on_progress)
+
+    # --- Aggregated Posts ---
+
+    def _posts(self):
+        return self.client.collection("aggregated_posts")
+
+    def save_post(self, doc_id, data):
+        doc_ref = self._posts().document(doc_id) if doc_id else self._posts().document()
+        doc_ref.set(data, merge=True)
+        return doc_ref.id
+
+    def get_post(self, doc_id):
+        return _to_doc(self._posts().document(doc_id).get())
+
+    def find_post(self, **equals):
+        query = self._posts()
+        for field, value in equals.items():
+            query = query.where(field, "==", value)
+        docs = query.limit(1).get()
+        return _to_doc(docs[0]) if docs else None
+
+    def latest_posts(self, statuses, limit, before_timestamp=None):
+        query = (
+            self._posts()
+            .where("status", "in", list(statuses))
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .limit(limit)
+        )
+        if before_timestamp:
+            query = query.start_after({"timestamp": before_timestamp})
+        return [_to_doc(doc) for doc in query.stream()]
+
+    def posts_with_local_files(self, created_before):
+        docs = (
+            self._posts()
+            .where("created_at", "<", created_before)
+            .where("local_path", "!=", None)
+            .stream()
+        )
+        return [_to_doc(doc) for doc in docs]
+
+    def get_post_index(self, post_id):
+        doc = self.client.collection("post_index").document(str(post_id)).get()
+        return doc.to_dict() if doc.exists else None
+
+    def put_post_index(self, post_id, entry):
+        self.client.collection("post_index").document(str(post_id)).set(entry)
+
+    # --- Settings & Counters ---
+
+    def _setting_ref(self, name):
+        return self.client.collection("settings").document(name)
+
+    def get_setting(self, name):
+        doc = self._setting_ref(name).get()
+        return doc.to_dict() if doc.exists else None
+
+    def merge_setting(self, name, data, delete_fields=None):
+        payload = dict(data)
+        for field in delete_fields or []:
+            payload[field] = firestore.DELETE_FIELD
+        self._setting_ref(name).set(payload, merge=True)
+
+    def watch_setting(self, name, callback):
+        def on_snapshot(doc_snapshots, changes, read_time):
+            data = {}
+            for snap in doc_snapshots:
+                if snap.exists:
+                    data = snap.to_dict() or {}
+            callback(data)
+
+        return _SettingWatch(self._setting_ref(name).on_snapshot(on_snapshot))
+
+    def lease_counter(self, field, size, default=100):
+        @firestore.transactional
+        def lease(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            current = snapshot.get(field) if snapshot.exists else None
+            current = default if current is None else current
+            transaction.set(ref, {field: current + size}, merge=True)
+            return current + 1, current + size
+
+        return lease(self.client.transaction(), self._setting_ref("counters"))
+
+    def release_counter(self, field, next_unused, last):
+        @firestore.transactional
+        def release(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.get(field) != last:
+                return False
+            transaction.set(ref, {field: next_unused - 1}, merge=True)
+            return True
+
+        return release(self.client.transaction(), self._setting_ref("counters"))
+
+    # --- Memories & Announcements ---
+
+    def _memories(self, user_id):
+        return self._user_ref(user_id).collection("memories")
+
+    def add_memory(self, user_id, item):
+        self._memories(user_id).add(item)
+
+    def list_memories(self, user_id):
+        return [doc.to_dict() for doc in self._memories(user_id).stream()]
+
+    def put_memories(self, user_id, items):
+        batch = self.client.batch()
+        count = 0
+        for item in items:
+            doc_id = str(item.get("id") or uuid.uuid4().hex)
+            batch.set(self._memories(user_id).document(doc_id), item)
+            count += 1
+            if count >= 400:
+                batch.commit()
+                batch = self.client.batch()
+                count = 0
+        if count > 0:
+            batch.commit()
+
+    def add_announcement(self, data):
+        self.client.collection("announcements").add(data)
+
+
+class FirestoreAsyncBackend(AsyncStorageBackend):
+    """
+    AsyncClient versions of the calls async handlers make, with the same
+    results as FirestoreBackend. Everything else runs the sync method in a
+    worker thread. The client is created on first use.
+    """
+
+    name = "firestore"
+
+    def __init__(self, backend, client=None):
+        super().__init__(backend)
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = create_async_client(self.backend.cred_path)
+        return self._client
+
+    # --- Users ---
+
+    def _user_ref(self, user_id):
+        return self.client.collection("users").document(str(user_id))
+
+    async def get_user(self, user_id):
+        doc = await self._user_ref(user_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    async def merge_user(self, user_id, data, increments=None, delete_fields=None):
+        payload = dict(data)
+        for field, delta in (increments or {}).items():
+            payload[field] = firestore.Increment(delta)
+        for field in delete_fields or []:
+            payload[field] = firestore.DELETE_FIELD
+        if payload:
+            await self._user_ref(user_id).set(payload, merge=True)
+
+    async def put_audience(self, entries):
+        batch = self.client.batch()
+        for user_id, last_active in entries:
+            batch.set(
+                self.client.collection("audience").document(str(user_id)),
+                {"last_active": last_active},
+            )
+        await batch.commit()
+
+    # --- Chats / Messages ---
+
+    def _chat_ref(self, chat_id):
+        return self.client.collection("chats").document(str(chat_id))
+
+    async def get_message_count(self, chat_id):
+        snapshot = await self._chat_ref(chat_id).get()
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict() or {}
+        if not data.get("counted"):
+            return None
+        return data.get("message_count")
+
+    async def count_messages(self, chat_id):
+        chat_ref = self._chat_ref(chat_id)
+        conv_ref = chat_ref.collection("messages")
+        total = 0
+        for _ in range(SEED_ATTEMPTS):
+            snapshot = await chat_ref.get()
+            data = snapshot.to_dict() or {}
+            if data.get("counted"):
+                return data.get("message_count") or 0
+            total = await self._count_stored(conv_ref)
+            seed = {"message_count": total, "counted": True}
+            try:
+                # Same update_time precondition as FirestoreBackend.count_messages
+                if snapshot.exists:
+                    option = self.client.write_option(last_update_time=snapshot.update_time)
+                    await chat_ref.update(seed, option=option)
+                else:
+                    await chat_ref.create(seed)
+                return total
+            except _SEED_CONFLICTS:
+                continue
+        print(f"DEBUG: Firestore: chat {chat_id} kept changing, message_count left unseeded")
+        return total
+
+    async def _count_stored(self, conv_ref):
+        try:
+            result = await conv_ref.count().get()
+            return int(result[0][0].value)
+        except Exception as e:
+            print(f"DEBUG: Firestore: count() aggregation unavailable ({e}), streaming ids")
+            return len([_ async for _ in conv_ref.select([]).stream()])
+
+    async def recent_messages(self, chat_id, limit):
+        query = (
+            self._chat_ref(chat_id)
+            .collection("messages")
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .limit(limit)
+        )
+        docs = [doc.to_dict() async for doc in query.stream()]
+        return docs[::-1]
+
+    async def delete_oldest_messages(self, chat_id, count):
+        chat_ref = self._chat_ref(chat_id)
+        query = chat_ref.collection("messages").order_by("timestamp").limit(count)
+        old_refs = [doc.reference async for doc in query.stream()]
+        if not old_refs:
+            return 0
+        batch = self.client.batch()
+        for ref in old_refs:
+            batch.delete(ref)
+        batch.set(
+            chat_ref, {"message_count": firestore.Increment(-len(old_refs))}, merge=True
+        )
+        await batch.commit()
+        return len(old_refs)
+
+    # --- Aggregated Posts ---
+
+    def _posts(self):
+        return self.client.collection("aggregated_posts")
+
+    async def save_post(self, doc_id, data):
+        doc_ref = self._posts().document(doc_id) if doc_id else self._posts().document()
+        await doc_ref.set(data, merge=True)
+        return doc_ref.id
+
+    async def get_post(self, doc_id):
+        return _to_doc(await self._posts().document(doc_id).get())
+
+    async def find_post(self, **equals):
+        query = self._posts()
+        for field, value in equals.items():
+            query = query.where(field, "==", value)
+        docs = await query.limit(1).get()
+        return _to_doc(docs[0]) if docs else None
+
+    async def latest_posts(self, statuses, limit, before_timestamp=None):
+        query = (
+            self._posts()
+            .where("status", "in", list(statuses))
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .limit(limit)
+        )
+        if before_timestamp:
+            query = query.start_after({"timestamp": before_timestamp})
+        return [_to_doc(doc) async for doc in query.stream()]
+
+    async def get_post_index(self, post_id):
+        doc = await self.client.collection("post_index").document(str(post_id)).get()
+        return doc.to_dict() if doc.exists else None
+
+    async def put_post_index(self, post_id, entry):
+        await self.client.collection("post_index").document(str(post_id)).set(entry)
+
+    # --- Announcements ---
+
+    async def add_announcement(self, data):
+        await self.client.collection("announcements").add(data)
@@ -0,0 +1,398 @@
+import datetime
+import json
+import sqlite3
+import threading
+import uuid
+from utils.storage.base import StorageBackend, StoredDoc
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audience (
+    id TEXT PRIMARY KEY,
+    last_active TEXT
+);
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    message_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_chat ON messages (chat_id, timestamp, seq);
+CREATE TABLE IF NOT EXISTS legacy_conversations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_by_post_id ON posts (json_extract(data, '$.post_id'));
+CREATE TABLE IF NOT EXISTS post_index (
+    post_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memories (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+CREATE TABLE IF NOT EXISTS announcements (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return {"__dt__": value.isoformat()}
+    raise TypeError(f"Unsupported type for SQLite storage: {type(value).__name__}")
+
+
+def _decode(obj):
+    if "__dt__" in obj and len(obj) == 1:
+        return datetime.datetime.fromisoformat(obj["__dt__"])
+    return obj
+
+
+def _dumps(data):
+    return json.dumps(data, default=_encode)
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+# Datetimes are tagged as {"__dt__": iso}; plain strings are left as-is
+TIMESTAMP_SQL = (
+    "COALESCE(json_extract(data, '$.timestamp.__dt__'), json_extract(data, '$.timestamp'))"
+)
+
+
+def _sort_key(value):
+    """Comparable form of a timestamp (datetime or ISO string)."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value or ""
+
+
+def _parse_ts(text):
+    try:
+        return datetime.datetime.fromisoformat(text) if text else None
+    except ValueError:
+        return text
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Single-file storage for local development and small deployments.
+
+    Documents are stored as JSON blobs (datetimes tagged so they round-trip).
+    Each thread gets its own connection; WAL mode lets the conversation log
+    flusher write while handlers read.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path="mimi.db"):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _fetch_doc(self, conn, table, key_col, key):
+        row = conn.execute(
+            f"SELECT data FROM {table} WHERE {key_col} = ?", (key,)
+        ).fetchone()
+        return _loads(row[0]) if row else None
+
+    def _merge(self, table, key_col, key, data, increments=None, delete_fields=None):
+        with self._write_lock, self._conn() as conn:
+            current = self._fetch_doc(conn, table, key_col, key) or {}
+            current.update(data)
+            for field, delta in (increments or {}).items():
+                current[field] = (current.get(field) or 0) + delta
+            for field in delete_fields or []:
+                current.pop(field, None)
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} ({key_col}, data) VALUES (?, ?)",
+                (key, _dumps(current)),
+            )
+            return current
+
+    # --- Users ---
+
+    def get_user(self, user_id):
+        return self._fetch_doc(self._conn(), "users", "id", str(user_id))
+
+    def merge_user(self, user_id, data, increments=None, delete_fields=None):
+        self._merge("users", "id", str(user_id), data, increments, delete_fields)
+
+    def list_user_ids(self, page_size=500):
+        return [row[0] for row in self._conn().execute("SELECT id FROM users ORDER BY id")]
+
+    def list_users(self, limit=50):
+        profiles = []
+        rows = self._conn().execute("SELECT id, data FROM users LIMIT ?", (limit,))
+        for user_id, data in rows:
+            profile = _loads(data)
+            profile["id"] = user_id
+            profiles.append(profile)
+        return profiles
+
+    def user_activity_page(self, limit, start_after=None):
+        rows = self._conn().execute(
+            "SELECT id, data FROM users WHERE id > ? ORDER BY id LIMIT ?",
+            ("" if start_after is None else str(start_after), limit),
+        )
+        return [(user_id, _loads(data).get("last_active")) for user_id, data in rows]
+
+    # --- Audience index ---
+
+    def audience_page(self, limit, start_after=None):
+        rows = self._conn().execute(
+            "SELECT id, last_active FROM audience WHERE id > ? ORDER BY id LIMIT ?",
+            ("" if start_after is None else str(start_after), limit),
+        ).fetchall()
+        return [(user_id, _parse_ts(ts)) for user_id, ts in rows]
+
+    def put_audience(self, entries):
+        with self._write_lock, self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO audience (id, last_active) VALUES (?, ?)",
+                [
+                    (str(user_id), ts.isoformat() if isinstance(ts, datetime.datetime) else ts)
+                    for user_id, ts in entries
+                ],
+            )
+
+    # --- Chats / Messages ---
+
+    def append_messages(self, batches):
+        failed = []
+        for chat_id, messages in batches:
+            chat_id = str(chat_id)
+            try:
+                with self._write_lock, self._conn() as conn:
+                    conn.executemany(
+                        "INSERT INTO messages (chat_id, timestamp, data) VALUES (?, ?, ?)",
+                        [
+                            (chat_id, _sort_key(m.get("timestamp")), _dumps(m))
+                            for m in messages
+                        ],
+                    )
+                    conn.execute(
+                        "INSERT INTO chats (id, message_count) VALUES (?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET "
+                        "message_count = COALESCE(message_count, 0) + excluded.message_count",
+                        (chat_id, len(messages)),
+                    )
+            except sqlite3.Error:
+                failed.extend((chat_id, m) for m in messages)
+        return failed
+
+    def get_message_count(self, chat_id):
+        row = self._conn().execute(
+            "SELECT message_count FROM chats WHERE id = ?", (str(chat_id),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def count_messages(self, chat_id):
+        chat_id = str(chat_id)
+        with self._write_lock, self._conn() as conn:
+            total = conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE chat_id = ?", (chat_id,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO chats (id, message_count) VALUES (?, ?)",
+                (chat_id, total),
+            )
+        return total
+
+    def recent_messages(self, chat_id, limit):
+        rows = self._conn().execute(
+            "SELECT data FROM messages WHERE chat_id = ? "
+            "ORDER BY timestamp DESC, seq DESC LIMIT ?",
+            (str(chat_id), limit),
+        ).fetchall()
+        return [_loads(row[0]) for row in reversed(rows)]
+
+    def delete_oldest_messages(self, chat_id, count):
+        chat_id = str(chat_id)
+        with self._write_lock, self._conn() as conn:
+            deleted = conn.execute(
+                "DELETE FROM messages WHERE seq IN ("
+                "SELECT seq FROM messages WHERE chat_id = ? "
+                "ORDER BY timestamp, seq LIMIT ?)",
+                (chat_id, count),
+            ).rowcount
+            conn.execute(
+                "UPDATE chats SET message_count = message_count - ? WHERE id = ?",
+                (deleted, chat_id),
+            )
+        return deleted
+
+    def delete_messages(self, chat_id, before=None, page_size=500, on_progress=None):
+        chat_id = str(chat_id)
+        where = "chat_id = ?"
+        params = [chat_id]
+        if before is not None:
+            where += " AND timestamp <= ?"
+            params.append(_sort_key(before))
+        total = 0
+        while True:
+            # Short transactions so the log flusher is never blocked for long
+            with self._write_lock, self._conn() as conn:
+                deleted = conn.execute(
+                    f"DELETE FROM messages WHERE seq IN ("
+                    f"SELECT seq FROM messages WHERE {where} LIMIT ?)",
+                    (*params, page_size),
+                ).rowcount
+                conn.execute(
+                    "UPDATE chats SET message_count = MAX(0, message_count - ?) WHERE id = ?",
+                    (deleted, chat_id),
+                )
+            if not deleted:
+                return total
+            total += deleted
+            if on_progress:
+                on_progress(deleted)
+            if deleted < page_size:
+                return total
+
+    def delete_legacy_conversations(self, user_id, page_size=500, on_progress=None):
+        with self._write_lock, self._conn() as conn:
+            deleted = conn.execute(
+                "DELETE FROM legacy_conversations WHERE user_id = ?", (str(user_id),)
+            ).rowcount
+        if deleted and on_progress:
+            on_progress(deleted)
+        return deleted
+
+    # --- Aggregated Posts ---
+
+    def _posts(self, where="", params=(), order="", limit=None):
+        sql = f"SELECT id, data FROM posts {where} {order}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self._conn().execute(sql, params)
+        return [StoredDoc(doc_id, _loads(data)) for doc_id, data in rows]
+
+    def save_post(self, doc_id, data):
+        doc_id = doc_id or uuid.uuid4().hex[:20]
+        self._merge("posts", "id", doc_id, data)
+        return doc_id
+
+    def get_post(self, doc_id):
+        return StoredDoc(doc_id, self._fetch_doc(self._conn(), "posts", "id", doc_id))
+
+    def find_post(self, **equals):
+        clauses = " AND ".join(f"json_extract(data, '$.{field}') = ?" for field in equals)
+        docs = self._posts(f"WHERE {clauses}", tuple(equals.values()), limit=1)
+        return docs[0] if docs else None
+
+    def latest_posts(self, statuses, limit, before_timestamp=None):
+        statuses = list(statuses)
+        where = f"WHERE json_extract(data, '$.status') IN ({','.join('?' * len(statuses))})"
+        params = list(statuses)
+        if before_timestamp:
+            where += f" AND {TIMESTAMP_SQL} < ?"
+            params.append(_sort_key(before_timestamp))
+        order = f"ORDER BY {TIMESTAMP_SQL} DESC"
+        return self._posts(where, tuple(params), order, limit)
+
+    def posts_with_local_files(self, created_before):
+        docs = self._posts("WHERE json_extract(data, '$.local_path') IS NOT NULL")
+        cutoff = _sort_key(created_before)
+        return [d for d in docs if _sort_key(d.get("created_at")) < cutoff]
+
+    def get_post_index(self, post_id):
+        return self._fetch_doc(self._conn(), "post_index", "post_id", str(post_id))
+
+    def put_post_index(self, post_id, entry):
+        with self._write_lock, self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO post_index (post_id, data) VALUES (?, ?)",
+                (str(post_id), _dumps(entry)),
+            )
+
+    # --- Settings & Counters ---
+
+    def get_setting(self, name):
+        return self._fetch_doc(self._conn(), "settings", "name", name)
+
+    def merge_setting(self, name, data, delete_fields=None):
+        self._merge("settings", "name", name, data, delete_fields=delete_fields)
+
+    def lease_counter(self, field, size, default=100):
+        with self._write_lock, self._conn() as conn:
+            counters = self._fetch_doc(conn, "settings", "name", "counters") or {}
+            current = counters.get(field)
+            current = default if current is None else current
+            counters[field] = current + size
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (name, data) VALUES ('counters', ?)",
+                (_dumps(counters),),
+            )
+        return current + 1, current + size
+
+    def release_counter(self, field, next_unused, last):
+        with self._write_lock, self._conn() as conn:
+            counters = self._fetch_doc(conn, "settings", "name", "counters") or {}
+            if counters.get(field) != last:
+                return False
+            counters[field] = next_unused - 1
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (name, data) VALUES ('counters', ?)",
+                (_dumps(counters),),
+            )
+        return True
+
+    # --- Memories & Announcements ---
+
+    def add_memory(self, user_id, item):
+        self.put_memories(user_id, [item])
+
+    def list_memories(self, user_id):
+        rows = self._conn().execute(
+            "SELECT data FROM memories WHERE user_id = ?", (str(user_id),)
+        )
+        return [_loads(row[0]) for row in rows]
+
+    def put_memories(self, user_id, items):
+        with self._write_lock, self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO memories (user_id, id, data) VALUES (?, ?, ?)",
+                [
+                    (str(user_id), str(item.get("id") or uuid.uuid4().hex), _dumps(item))
+                    for item in items
+                ],
+            )
+
+    def add_announcement(self, data):
+        with self._write_lock, self._conn() as conn:
+            conn.execute("INSERT INTO announcements (data) VALUES (?)", (_dumps(data),))
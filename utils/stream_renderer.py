@@ -0,0 +1,137 @@
+import re
+
+# Telegram-safe rendering of model output.
+# clean_output() strips links and escapes stray < > while keeping supported
+# HTML tags. StreamRenderer produces the same result for a growing stream
+# without re-scanning it: text is sanitized up to the last point no link or
+# tag pattern can straddle, and only the tail after that point is re-done on
+# each render.
+
+LINK_PATTERNS = [
+    (re.compile(r"https?://\S+"), "[Link Removed]"),
+    (re.compile(r"\[.+?\]\(.+?\)"), "[Link Removed]"),
+    (re.compile(r"www\.\S+"), "[Link Removed]"),
+    (re.compile(r"\.(com|org|edu|gov|net|io)\S*"), "[Link Removed]"),
+    (re.compile(r"(?i)khanacademy\.org"), "[Link Removed]"),
+    (re.compile(r"(?i)wikipedia\.org"), "[Link Removed]"),
+    (re.compile(r"(?i)youtube\.com"), "[Link Removed]"),
+]
+
+VALID_TAGS = [
+    "b",
+    "strong",
+    "i",
+    "em",
+    "u",
+    "ins",
+    "s",
+    "strike",
+    "del",
+    "code",
+    "pre",
+    "blockquote",
+    "tg-spoiler",
+    "a",
+]
+_TAG_OR_BRACKET = re.compile(
+    r"<(/?(" + "|".join(VALID_TAGS) + r")(?:\s+[^>]*)?)>|[<>]", re.IGNORECASE
+)
+
+
+def strip_links(text):
+    for pattern, replacement in LINK_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _escape_match(match):
+    if match.group(1):
+        return match.group(0)
+    return "&lt;" if match.group(0) == "<" else "&gt;"
+
+
+def escape_html(text):
+    """
+    Smart HTML escaping: Escapes stray < and > characters but preserves
+    supported Telegram HTML tags.
+    """
+    return _TAG_OR_BRACKET.sub(_escape_match, text.replace("&", "&amp;"))
+
+
+def clean_output(text, escape=True):
+    text = strip_links(text)
+    if escape:
+        return escape_html(text).strip()
+    return text.strip()
+
+
+def _safe_cut(text, line_tainted):
+    """
+    Returns (cut, stripped): the length of the longest prefix of `text` that
+    can be sanitized on its own, and that prefix with links stripped.
+    Link matches never cross a newline; apart from markdown links (which
+    need a "[", possibly one left by the http replacement) they never cross
+    whitespace either. A tag match can't cross a point with no unclosed "<"
+    before it (checked after stripping, which can eat a ">").
+    """
+    cut = len(text)
+    while True:
+        newline = text.rfind("\n", 0, cut)
+        space = max(text.rfind(" ", 0, cut), text.rfind("\t", 0, cut))
+        if space > newline and not _tainted(text, newline, space, line_tainted):
+            cut = space + 1
+        elif newline >= 0:
+            cut = newline + 1
+        else:
+            return 0, ""
+        stripped = strip_links(text[:cut])
+        if stripped.rfind("<") <= stripped.rfind(">"):
+            return cut, stripped
+        cut = text.rfind("<", 0, cut)
+
+
+def _tainted(text, newline, space, line_tainted):
+    """True if the line up to `space` could start a markdown link match."""
+    line = text[newline + 1 : space]
+    if newline < 0 and line_tainted:
+        return True
+    return "[" in line or "http" in line
+
+
+class StreamRenderer:
+    def __init__(self, escape=True):
+        self.escape = escape
+        self._parts = []  # raw chunks, joined on demand
+        self._done = []  # sanitized output of the settled prefix
+        self._tail = ""  # raw text after the last safe cut
+        self._line_tainted = False  # the settled part of the current line has "[" or "http"
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        tail = self._tail + chunk
+        cut, stripped = _safe_cut(tail, self._line_tainted)
+        if cut:
+            settled = tail[:cut]
+            self._done.append(escape_html(stripped) if self.escape else stripped)
+            newline = settled.rfind("\n")
+            line = settled[newline + 1 :]
+            tainted = "[" in line or "http" in line
+            self._line_tainted = tainted or (newline < 0 and self._line_tainted)
+            tail = tail[cut:]
+        self._tail = tail
+
+    def _sanitize(self, text):
+        text = strip_links(text)
+        return escape_html(text) if self.escape else text
+
+    def render(self):
+        """Same as clean_output(self.text, self.escape)."""
+        if len(self._done) > 1:
+            self._done = ["".join(self._done)]
+        return ("".join(self._done) + self._sanitize(self._tail)).strip()
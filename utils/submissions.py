@@ -1,6 +1,5 @@
 import os
 import datetime
-import httpx
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -11,7 +10,7 @@ from telegram.ext import (
     CallbackQueryHandler,
     filters,
 )
-from utils import firebase_db, ai_moderator
+from utils import firebase_db_aio, ai_moderator, http_clients
 
 logger = logging.getLogger(__name__)
 
@@ -193,7 +192,7 @@ async def process_submission(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return ConversationHandler.END
 
     # Assign IDs and save to database
-    post_id = firebase_db.get_next_post_id()
+    post_id = await firebase_db_aio.get_next_post_id()
     dest_id = os.getenv("DESTINATION_GROUP_ID")
     bot_token = os.getenv("API_KEY")
 
@@ -227,29 +226,29 @@ async def process_submission(update: Update, context: ContextTypes.DEFAULT_TYPE)
     error_message = None
 
     try:
-        async with httpx.AsyncClient() as client:
-            if photo_path and photo_path.lower().endswith((".jpg", ".png", ".jpeg")):
-                url = f"https://api.telegram.org/bot{bot_token}/sendPhoto"
-                files = {"photo": open(photo_path, "rb")}
-                data = {
-                    "chat_id": dest_id,
-                    "caption": mimi_caption,
-                    "parse_mode": "HTML",
-                }
-                response = await client.post(url, files=files, data=data)
-            else:
-                url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-                data = {"chat_id": dest_id, "text": mimi_caption, "parse_mode": "HTML"}
-                response = await client.post(url, data=data)
-
-            if response.status_code == 200:
-                dest_msg_id = response.json()["result"]["message_id"]
-                send_success = True
-            else:
-                error_message = response.text
-                logger.error(
-                    f"Telegram API error: {response.status_code} - {response.text}"
-                )
+        client = http_clients.get_client("https://api.telegram.org")
+        if photo_path and photo_path.lower().endswith((".jpg", ".png", ".jpeg")):
+            url = f"https://api.telegram.org/bot{bot_token}/sendPhoto"
+            files = {"photo": open(photo_path, "rb")}
+            data = {
+                "chat_id": dest_id,
+                "caption": mimi_caption,
+                "parse_mode": "HTML",
+            }
+            response = await client.post(url, files=files, data=data)
+        else:
+            url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+            data = {"chat_id": dest_id, "text": mimi_caption, "parse_mode": "HTML"}
+            response = await client.post(url, data=data)
+
+        if response.status_code == 200:
+            dest_msg_id = response.json()["result"]["message_id"]
+            send_success = True
+        else:
+            error_message = response.text
+            logger.error(
+                f"Telegram API error: {response.status_code} - {response.text}"
+            )
     except Exception as e:
         error_message = str(e)
         logger.error(f"Error forwarding user post: {e}", exc_info=True)
@@ -269,7 +268,7 @@ async def process_submission(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "source_type": "user_submission",
             "timestamp": datetime.datetime.now().isoformat(),
         }
-        firebase_db.save_aggregated_post(post_data)
+        await firebase_db_aio.save_aggregated_post(post_data)
 
         await query.message.reply_text(
             f"✅ <b>Post Successful!</b>\nYour post is live as <b>#{post_id}</b>.",
@@ -319,7 +318,7 @@ async def handle_direct_reply(
 ):
     """Handles direct /post reply ID content."""
     try:
-        parent_post = firebase_db.get_post_by_id(post_id)
+        parent_post = await firebase_db_aio.get_post_by_id(post_id)
         if not parent_post:
             logger.warning(f"🔍 Post #{post_id} not found in DB")
             await update.message.reply_text(f"❌ Could not find post #{post_id}")
@@ -404,15 +403,15 @@ async def handle_direct_reply(
                 "parse_mode": "HTML",
             }
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json=payload)
+        client = http_clients.get_client(url)
+        resp = await client.post(url, json=payload)
 
         if resp.status_code != 200:
             logger.error(f"❌ Telegram API Error: {resp.status_code} - {resp.text}")
             await update.message.reply_text(f"❌ Failed to update Telegram message: {resp.text}")
             return ConversationHandler.END
 
-        firebase_db.save_aggregated_post(
+        await firebase_db_aio.save_aggregated_post(
             {"doc_id": parent_post.id, "editorial_content": new_editorial}
         )
 
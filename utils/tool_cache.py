@@ -0,0 +1,224 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Shared cache for web tool results (tools.web_search / tools.web_fetch).
+# Keys are the normalized query or canonical URL, so the same page asked for
+# by twenty students is fetched once per TTL. Memory is an LRU bounded by
+# bytes; TOOL_CACHE_DIR adds an on-disk tier that survives restarts.
+# Identical calls already in flight wait for the first one instead of
+# going upstream themselves (single-flight).
+TTLS = {
+    "web_search": float(os.getenv("TOOL_CACHE_SEARCH_TTL", 1800)),
+    "web_fetch": float(os.getenv("TOOL_CACHE_FETCH_TTL", 3600)),
+}
+MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+DISK_DIR = os.getenv("TOOL_CACHE_DIR", "")
+INFLIGHT_WAIT = 60.0
+
+_entries = OrderedDict()  # {key: (expires_at, value, size)}
+_bytes = 0
+_inflight = {}  # {key: threading.Event}
+_lock = threading.Lock()
+
+stats = {
+    "hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "stores": 0,
+    "evictions": 0,
+}
+
+
+# --- Keys ---
+
+
+def normalize_query(query):
+    return " ".join(str(query or "").lower().split())
+
+
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "ref_src")
+
+
+def canonical_url(url):
+    """Lowercase scheme/host, no fragment, default port or tracking params; sorted query."""
+    parts = urlsplit(str(url or "").strip())
+    host = (parts.hostname or "").lower()
+    if parts.port and (parts.scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(_TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), host, path, urlencode(query), ""))
+
+
+# --- Memory + disk tiers ---
+
+
+def _disk_path(key):
+    return os.path.join(DISK_DIR, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def _read_disk(key):
+    if not DISK_DIR:
+        return None
+    path = _disk_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get("key") != key or record.get("expires_at", 0) <= time.time():
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    return record
+
+
+def _write_disk(key, value, expires_at):
+    if not DISK_DIR:
+        return
+    try:
+        os.makedirs(DISK_DIR, exist_ok=True)
+        path = _disk_path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "expires_at": expires_at, "value": value}, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Tool cache disk write failed: {e}")
+
+
+def _remember(key, value, monotonic_expiry):
+    global _bytes
+    size = len(value.encode("utf-8"))
+    if size > MAX_BYTES:
+        return
+    with _lock:
+        old = _entries.pop(key, None)
+        if old:
+            _bytes -= old[2]
+        _entries[key] = (monotonic_expiry, value, size)
+        _bytes += size
+        while _bytes > MAX_BYTES and _entries:
+            _, (_, _, evicted_size) = _entries.popitem(last=False)
+            _bytes -= evicted_size
+            stats["evictions"] += 1
+
+
+def get(key, count=True):
+    """Cached value for `key`, or None. Checks memory, then disk."""
+    global _bytes
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _entries.move_to_end(key)
+                if count:
+                    stats["hits"] += 1
+                return entry[1]
+            del _entries[key]
+            _bytes -= entry[2]
+    record = _read_disk(key)
+    if record is None:
+        return None
+    _remember(key, record["value"], now + (record["expires_at"] - time.time()))
+    if count:
+        with _lock:
+            stats["disk_hits"] += 1
+    return record["value"]
+
+
+def put(key, value, ttl):
+    _remember(key, value, time.monotonic() + ttl)
+    _write_disk(key, value, time.time() + ttl)
+    with _lock:
+        stats["stores"] += 1
+
+
+def clear():
+    global _bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+
+
+# --- Decorator ---
+
+
+def cached(tool, key_fn, cacheable=lambda result: True):
+    """
+    Wraps a one-argument tool function with the cache and single-flight.
+    Results for which `cacheable(result)` is False (errors) are returned but
+    not stored.
+    """
+
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(arg):
+            key = f"{tool}:{key_fn(arg)}"
+            value = get(key)
+            if value is not None:
+                return value
+            with _lock:
+                waiting = _inflight.get(key)
+                if waiting is None:
+                    _inflight[key] = threading.Event()
+                    stats["misses"] += 1
+                else:
+                    stats["coalesced"] += 1
+            if waiting is not None:
+                # Someone else is fetching this; use their result (or go
+                # upstream ourselves if theirs failed or is taking too long)
+                waiting.wait(INFLIGHT_WAIT)
+                value = get(key, count=False)
+                return value if value is not None else fn(arg)
+
+            try:
+                value = fn(arg)
+                if isinstance(value, str) and cacheable(value):
+                    put(key, value, TTLS.get(tool, 600))
+                return value
+            finally:
+                with _lock:
+                    _inflight.pop(key).set()
+
+        return inner
+
+    return wrap
+
+
+def get_stats():
+    with _lock:
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"] + stats["coalesced"]
+        served = stats["hits"] + stats["disk_hits"] + stats["coalesced"]
+        return {
+            **stats,
+            "entries": len(_entries),
+            "bytes": _bytes,
+            "hit_rate": served / lookups if lookups else 0.0,
+        }
+
+
+def format_stats():
+    s = get_stats()
+    return (
+        f"Tool cache: {s['hit_rate']:.0%} hit rate "
+        f"({s['hits']} memory, {s['disk_hits']} disk, {s['coalesced']} shared in-flight, "
+        f"{s['misses']} upstream), {s['entries']} entries, {s['bytes'] // 1024} KiB"
+    )
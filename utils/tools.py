@@ -1,4 +1,3 @@
-import requests
 from duckduckgo_search import DDGS
 from bs4 import BeautifulSoup
 import io
@@ -6,7 +5,7 @@ import pypdf
 import logging
 import concurrent.futures
 from typing import List, Tuple
-from utils import memory_sync, validator, visualizer
+from utils import http_clients, memory_sync, tool_cache, validator, visualizer
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +24,15 @@ def execute_visualize_math(
         return f"Error generating visualization: {e}"
 
 
+def _search_ok(result):
+    return not result.startswith(("Search error", "No relevant results"))
+
+
+def _fetch_ok(result):
+    return not result.startswith(("Fetch error", "Error parsing PDF"))
+
+
+@tool_cache.cached("web_search", tool_cache.normalize_query, _search_ok)
 def web_search(query: str) -> str:
     try:
         logger.info(f"Searching for: {query}")
@@ -119,12 +127,13 @@ def web_batch_search(queries: List[str]) -> str:
     return "\n\n".join(results)
 
 
+@tool_cache.cached("web_fetch", tool_cache.canonical_url, _fetch_ok)
 def web_fetch(url: str) -> str:
     try:
         headers = {
             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         }
-        res = requests.get(url, headers=headers, timeout=10)
+        res = http_clients.get_session().get(url, headers=headers, timeout=10)
         res.raise_for_status()
 
         content_type = res.headers.get("Content-Type", "").lower()
@@ -0,0 +1,108 @@
+import datetime
+import logging
+from utils import firebase_db, firebase_db_aio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAVOURABILITY = 50
+
+
+def _clamp(value):
+    return max(0, min(100, value))
+
+
+class UserStateSession:
+    """
+    One user's users/{id} document for the length of a single reply.
+
+    The document is read once when the turn starts. Debate state,
+    favourability and profile fields are changed in memory, and commit()
+    writes them back as one merged set. The bond delta is sent as an
+    increment so concurrent turns do not overwrite each other.
+    """
+
+    def __init__(self, telegram_id, data=None):
+        self.telegram_id = str(telegram_id)
+        self.data = data or {}
+        self._updates = {}
+        self._bond_delta = 0
+
+    @classmethod
+    def load(cls, telegram_id):
+        return cls(telegram_id, firebase_db.get_user_profile(telegram_id))
+
+    @classmethod
+    async def aload(cls, telegram_id):
+        return cls(telegram_id, await firebase_db_aio.get_user_profile(telegram_id))
+
+    @property
+    def favourability(self):
+        base = self.data.get("favourability", DEFAULT_FAVOURABILITY)
+        return _clamp(base + self._bond_delta)
+
+    @property
+    def debate_state(self):
+        state = self._updates.get("debate_state", self.data.get("debate_state"))
+        return dict(state or {})
+
+    def set_debate_state(self, state):
+        self._updates["debate_state"] = dict(state)
+
+    def adjust_favourability(self, delta):
+        """Applies a bond change, clamped to 0-100 against the loaded value."""
+        current = self.favourability
+        new_val = _clamp(current + delta)
+        self._bond_delta += new_val - current
+        if new_val != current:
+            print(
+                f"DEBUG: Updated Favourability for {self.telegram_id}: {current} -> {new_val}"
+            )
+
+    def touch(self, **profile):
+        """Marks the user active, optionally refreshing profile fields (name, username)."""
+        self._updates.update({k: v for k, v in profile.items() if v is not None})
+        self._updates["last_active"] = datetime.datetime.now()
+
+    def build_update(self):
+        """
+        Returns (fields, increments) for users/{id}; both empty if nothing changed.
+        """
+        fields = dict(self._updates)
+        increments = {}
+        if self._bond_delta:
+            if "favourability" in self.data:
+                increments["favourability"] = self._bond_delta
+            else:
+                # Increment on a missing field would start from 0, not the neutral 50
+                fields["favourability"] = self.favourability
+        return fields, increments
+
+    def commit(self):
+        fields, increments = self.build_update()
+        if not fields and not increments:
+            return
+        try:
+            firebase_db.update_user_state(self.telegram_id, fields, increments)
+        except Exception as e:
+            logger.error(f"User state commit failed for {self.telegram_id}: {e}")
+            return
+        self._mark_committed(fields)
+
+    async def acommit(self):
+        fields, increments = self.build_update()
+        if not fields and not increments:
+            return
+        try:
+            await firebase_db_aio.update_user_state(
+                self.telegram_id, fields, increments
+            )
+        except Exception as e:
+            logger.error(f"User state commit failed for {self.telegram_id}: {e}")
+            return
+        self._mark_committed(fields)
+
+    def _mark_committed(self, fields):
+        self.data.update({k: v for k, v in fields.items() if k != "favourability"})
+        self.data["favourability"] = self.favourability
+        self._updates = {}
+        self._bond_delta = 0
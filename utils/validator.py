@@ -1,8 +1,7 @@
 import os
-import requests
 import json
 import logging
-from utils import memory_sync
+from utils import http_clients, memory_sync
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +44,7 @@ def validate_memory(content: str) -> str:
     }
 
     try:
-        res = requests.post(
+        res = http_clients.get_session().post(
             "https://openrouter.ai/api/v1/chat/completions",
             headers={"Authorization": f"Bearer {api_key}"},
             json=payload,
@@ -1,5 +1,4 @@
 import os
-import requests
 import base64
 import json
 import re
@@ -9,6 +8,7 @@ from telegram.ext import ContextTypes
 import asyncio
 from . import ai_agent
 from . import tools
+from . import http_clients
 import io
 import pypdf
 
@@ -200,7 +200,9 @@ def call_vision_ai(base64_img, prompt):
         "temperature": 0.1,
     }
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=35)
+        resp = http_clients.get_session().post(
+            url, headers=headers, json=payload, timeout=35
+        )
         if resp.status_code == 200:
             return resp.json()["choices"][0]["message"]["content"]
         else: